@@ -0,0 +1,160 @@
+"""
+Times get_frequent_sets_from_DB, get_explanations_ordered_list and CreateTuningConfigurations on synthetic drift logs
+of several sizes, for every mining backend, and reports the wall time, the number of DB queries and the peak traced
+memory (tracemalloc, measured in a second run as it slows the planner down).
+
+example:
+python Benchmarks/PlannerBenchmarks.py --sizes 10000,100000,1000000 --backends sql,numpy,cube --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'TuningPlanner'))
+
+import ExplanationsExtractor
+import TuningPlanner
+from SyntheticDriftLog import SyntheticDriftLogConfig, SQLitePool, generate_drift_log
+
+BENCHMARKED_FUNCTIONS = ('get_frequent_sets_from_DB', 'get_explanations_ordered_list', 'CreateTuningConfigurations')
+
+ATTRIBUTES = ['weather', 'location', 'id', 'model_type']
+GENERAL_DB_FILTER_QUERY = "date <= '2020-02-01' "
+OUTLINERS_SQL_FILTER_QUERY = "signal_1or2 = 1"
+
+# the backends whose counterfactual drift can't be kept in the DB (their source doesn't follow the counter_drift
+# column), CreateTuningConfigurations is benchmarked with the in_memory mode for them.
+IN_MEMORY_ONLY_BACKENDS = (ExplanationsExtractor.SUMMARY_BACKEND, ExplanationsExtractor.PARQUET_BACKEND)
+
+
+def reset_planner_state(work_dir: str):
+    """
+    Drops everything the planner keeps between calls, so every measured call starts cold.
+    """
+    ExplanationsExtractor.clear_columnar_drift_logs()
+    ExplanationsExtractor._drift_log_summaries.clear()
+    ExplanationsExtractor.SUMMARY_STORE_PATH = os.path.join(work_dir, 'summary.sqlite')
+    if os.path.exists(ExplanationsExtractor.SUMMARY_STORE_PATH):
+        os.remove(ExplanationsExtractor.SUMMARY_STORE_PATH)
+
+
+def get_benchmarked_call(function_name: str, backend: str, counter_factual: str):
+    thresholds = TuningPlanner.explanations_thresholds
+
+    if function_name == 'get_frequent_sets_from_DB':
+        return lambda: ExplanationsExtractor.get_frequent_sets_from_DB(
+            ATTRIBUTES, thresholds['min_occurrences'], thresholds['min_support'], thresholds['min_confidence'],
+            thresholds['min_risk'], OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY, thresholds['max_length'],
+            debug_print=False, backend=backend)
+
+    if function_name == 'get_explanations_ordered_list':
+        return lambda: ExplanationsExtractor.get_explanations_ordered_list(
+            ATTRIBUTES, outliners_sql_filter_query=OUTLINERS_SQL_FILTER_QUERY,
+            general_db_filter_query=GENERAL_DB_FILTER_QUERY, debug_print=False, backend=backend, **thresholds)
+
+    TuningPlanner.general_db_filter_query = GENERAL_DB_FILTER_QUERY
+    TuningPlanner.drift_outliners_sql_filter_query = OUTLINERS_SQL_FILTER_QUERY
+    return lambda: TuningPlanner.CreateTuningConfigurations(ATTRIBUTES, backend=backend,
+                                                           counter_factual=counter_factual)
+
+
+def measure(call, pool: SQLitePool, work_dir: str, trace_memory: bool = True) -> dict:
+    reset_planner_state(work_dir)
+    queries_count = pool.queries_count
+    start_time = time.perf_counter()
+    result = call()
+    res = {'wall_seconds': time.perf_counter() - start_time, 'queries': pool.queries_count - queries_count,
+           'results': len(result)}
+
+    if trace_memory:
+        reset_planner_state(work_dir)
+        tracemalloc.start()
+        try:
+            call()
+            res['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        finally:
+            tracemalloc.stop()
+
+    return res
+
+
+def run_benchmarks(sizes: list[int], backends: list[str], functions: list[str], counter_factual: str,
+                   work_dir: str, trace_memory: bool = True, regenerate: bool = False, seed: int = 0) -> list[dict]:
+    results = []
+    for rows in sizes:
+        path = os.path.join(work_dir, f'drift_log_{rows}_{seed}.sqlite')
+        if regenerate or not os.path.exists(path):
+            generate_drift_log(path, SyntheticDriftLogConfig(rows=rows, seed=seed))
+
+        pool = SQLitePool(path, ExplanationsExtractor.schema_name)
+        ExplanationsExtractor.table_name = 'drift_log_flex'
+        ExplanationsExtractor.configure_db_pool(pool=pool)
+
+        try:
+            for function_name in functions:
+                for backend in backends:
+                    res = {'rows': rows, 'function': function_name, 'backend': backend}
+                    backend_counter_factual = counter_factual
+                    if function_name == 'CreateTuningConfigurations':
+                        if (backend in IN_MEMORY_ONLY_BACKENDS and
+                                counter_factual == TuningPlanner.DB_COUNTER_FACTUAL_MODE):
+                            backend_counter_factual = TuningPlanner.IN_MEMORY_COUNTER_FACTUAL_MODE
+                        res['counter_factual'] = backend_counter_factual
+                    try:
+                        res.update(measure(get_benchmarked_call(function_name, backend, backend_counter_factual), pool,
+                                           work_dir, trace_memory))
+                    except Exception as e:
+                        # one failing combination doesn't lose the results of the others.
+                        res['error'] = repr(e)
+                    print_result(res)
+                    results.append(res)
+        finally:
+            ExplanationsExtractor.close_db_pool()
+
+    return results
+
+
+def print_result(res: dict):
+    backend = res['backend'] + ('/' + res['counter_factual'] if 'counter_factual' in res else '')
+    if 'error' in res:
+        print(f"{res['rows']:>11} {res['function']:<30} {backend:<20} failed: {res['error']}", flush=True)
+        return
+    memory = f"{res['peak_memory_mb']:10.1f} MB" if 'peak_memory_mb' in res else ''
+    print(f"{res['rows']:>11} {res['function']:<30} {backend:<20} {res['wall_seconds']:10.3f} s "
+          f"{res['queries']:6} queries {memory}", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000', help='comma separated numbers of rows, e.g. 10000,100000000')
+    # the parquet backend reads exports, not the generated SQLite drift logs.
+    parser.add_argument('--backends', default=','.join(backend for backend in ExplanationsExtractor.MINING_BACKENDS
+                                                       if backend != ExplanationsExtractor.PARQUET_BACKEND))
+    parser.add_argument('--functions', default=','.join(BENCHMARKED_FUNCTIONS))
+    parser.add_argument('--counter-factual', default=TuningPlanner.DB_COUNTER_FACTUAL_MODE,
+                        choices=TuningPlanner.COUNTER_FACTUAL_MODES)
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'nazar_benchmarks'),
+                        help='where the generated SQLite files are kept and reused')
+    parser.add_argument('--regenerate', action='store_true', help='regenerate the SQLite files even if they exist')
+    parser.add_argument('--no-memory', action='store_true', help="don't measure the peak memory")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=ExplanationsExtractor.COUNTING_PROCESSES,
+                        help='worker processes of the in-memory counts (ExplanationsExtractor.COUNTING_PROCESSES)')
+    parser.add_argument('--json', help='also save the results to this JSON file')
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    ExplanationsExtractor.COUNTING_PROCESSES = args.processes
+    benchmark_results = run_benchmarks([int(size) for size in args.sizes.split(',')], args.backends.split(','),
+                                       args.functions.split(','), args.counter_factual, args.work_dir,
+                                       trace_memory=not args.no_memory, regenerate=args.regenerate, seed=args.seed)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(benchmark_results, f, indent=2)
+
+    ExplanationsExtractor.close_counting_pool()
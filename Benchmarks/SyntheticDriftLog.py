@@ -0,0 +1,179 @@
+"""
+Synthetic drift_log_flex tables in a local SQLite file, and a connection pool over it that stands in for the MySQL pool
+of ExplanationsExtractor (see configure_db_pool), so the planner can be measured without the RDS host.
+Values are named after their attribute (weather_0, location_3 ...), and planted subgroups drift with their own rate
+on top of the base drift rate.
+"""
+from dataclasses import dataclass, field
+import datetime
+import os
+import random
+import sqlite3
+import threading
+import zlib
+import numpy as np
+
+DEFAULT_CARDINALITIES = {'weather': 4, 'location': 6, 'id': 1000, 'model_type': 3}
+
+# (values of the subgroup, drift rate of its rows)
+DEFAULT_PLANTED_SUBGROUPS = [
+    ({'weather': 'weather_1', 'location': 'location_2'}, 0.9),
+    ({'location': 'location_3'}, 0.6),
+    ({'id': 'id_7'}, 0.7),
+]
+
+ROWS_PER_INSERT = 100000
+
+
+@dataclass
+class SyntheticDriftLogConfig:
+    rows: int = 10000
+    cardinalities: dict = field(default_factory=lambda: dict(DEFAULT_CARDINALITIES))
+    drift_rate: float = 0.05
+    planted_subgroups: list = field(default_factory=lambda: list(DEFAULT_PLANTED_SUBGROUPS))
+    first_date: datetime.date = datetime.date(2020, 1, 1)
+    days: int = 60
+    seed: int = 0
+
+
+def generate_drift_log(path: str, config: SyntheticDriftLogConfig, table_name: str = 'drift_log_flex'):
+    """
+    Creates (or replaces) the table in the SQLite file, with the drift_log_flex columns used by the planner: the
+    attributes, signal_1or2 (the logged drift), counter_drift (equal to signal_1or2) and an ISO date.
+    Rows are generated and inserted in chunks, so the table may be larger than the memory.
+    """
+    rng = np.random.default_rng(config.seed)
+    attributes = list(config.cardinalities)
+    dates = [str(config.first_date + datetime.timedelta(days=day)) for day in range(config.days)]
+
+    cnx = sqlite3.connect(path)
+    try:
+        cnx.execute("DROP TABLE IF EXISTS " + table_name)
+        cnx.execute("CREATE TABLE " + table_name + " (" + ', '.join(attr + " TEXT" for attr in attributes) +
+                    ", signal_1or2 INTEGER, counter_drift INTEGER, date TEXT)")
+
+        insert_query = "INSERT INTO " + table_name + " VALUES (" + ', '.join('?' * (len(attributes) + 3)) + ")"
+        for chunk_start in range(0, config.rows, ROWS_PER_INSERT):
+            chunk_rows = min(ROWS_PER_INSERT, config.rows - chunk_start)
+            codes = {attr: rng.integers(0, cardinality, chunk_rows)
+                     for attr, cardinality in config.cardinalities.items()}
+
+            drift_probability = np.full(chunk_rows, config.drift_rate)
+            for subgroup, subgroup_drift_rate in config.planted_subgroups:
+                in_subgroup = np.ones(chunk_rows, dtype=bool)
+                for attr, val in subgroup.items():
+                    in_subgroup &= codes[attr] == int(val.rsplit('_', 1)[1])
+                drift_probability[in_subgroup] = subgroup_drift_rate
+            signal = (rng.random(chunk_rows) < drift_probability).astype(int).tolist()
+
+            columns = [[attr + '_' + str(code) for code in codes[attr].tolist()] for attr in attributes]
+            row_dates = [dates[day] for day in rng.integers(0, config.days, chunk_rows).tolist()]
+            cnx.executemany(insert_query, zip(*columns, signal, signal, row_dates))
+            cnx.commit()
+
+        cnx.execute("CREATE INDEX " + table_name + "_date ON " + table_name + " (date)")
+        cnx.commit()
+    finally:
+        cnx.close()
+
+
+class BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+
+def concat_ws(separator, *values):
+    return separator.join(str(value) for value in values if value is not None)
+
+
+class SQLiteCursor:
+    """
+    The subset of the mysql.connector cursor API used by ExplanationsExtractor, with %s parameters and the MySQL NULL-safe
+    equality <=> (IS in SQLite).
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.cnx.cursor()
+        self.description = None
+
+    def execute(self, query: str, params=None):
+        self.connection.pool.count_query()
+        self._cursor.execute(query.replace('%s', '?').replace('<=>', 'IS'), tuple(params or ()))
+        self.description = self._cursor.description
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+
+    def __init__(self, pool, cnx: sqlite3.Connection):
+        self.pool = pool
+        self.cnx = cnx
+
+    def start_transaction(self):
+        # sqlite3 begins a transaction before the first write on its own.
+        pass
+
+    def cursor(self):
+        return SQLiteCursor(self)
+
+    def commit(self):
+        self.cnx.commit()
+
+    def rollback(self):
+        self.cnx.rollback()
+
+    def close(self):
+        self.pool.return_connection(self.cnx)
+
+
+class SQLitePool:
+    """
+    Stands in for MySQLConnectionPool. The SQLite file is attached under schema_name, so the planner's
+    schema_name.table_name queries run unchanged, and the MySQL functions used by the planner are registered.
+    :param path: the SQLite file, as written by generate_drift_log
+    """
+
+    def __init__(self, path: str, schema_name: str = 'local_schema'):
+        self.path = path
+        self.schema_name = schema_name
+        self.queries_count = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        cnx = sqlite3.connect(self.path, check_same_thread=False)
+        cnx.execute("ATTACH DATABASE ? AS " + self.schema_name, (os.path.abspath(self.path),))
+        cnx.create_function('CRC32', 1, lambda value: zlib.crc32(str(value).encode()), deterministic=True)
+        cnx.create_function('CONCAT_WS', -1, concat_ws, deterministic=True)
+        cnx.create_aggregate('BIT_XOR', 1, BitXor)
+        cnx.create_function('RAND', 0, random.random)
+        return cnx
+
+    def count_query(self):
+        with self._lock:
+            self.queries_count += 1
+
+    def get_connection(self) -> SQLiteConnection:
+        with self._lock:
+            cnx = self._idle.pop() if self._idle else None
+        return SQLiteConnection(self, cnx if cnx is not None else self._connect())
+
+    def return_connection(self, cnx: sqlite3.Connection):
+        with self._lock:
+            self._idle.append(cnx)
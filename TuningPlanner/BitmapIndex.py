@@ -0,0 +1,243 @@
+"""
+Bitmap index over the filtered drift log rows: one compressed row set per (attribute, value), plus bitsets of the
+outliner predicate and of the counterfactual drift (counter_drift).
+Any item set's outliners and in-liners counts are then popcounts of bitwise ANDs, with no DB queries. The index can
+be saved to disk, so repeated planner runs over the same date window skip building it.
+"""
+import json
+import numpy as np
+from ColumnarDriftLog import ColumnarDriftLog
+
+# number of set bits of every byte value.
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int64)
+
+# row sets with fewer rows than total_rows / SPARSE_DENSITY_RATIO are stored as sorted row numbers instead of bits.
+SPARSE_DENSITY_RATIO = 32
+
+
+def popcount(bits: np.ndarray) -> int:
+    return int(_POPCOUNT[bits].sum())
+
+
+def bits_at(bits: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    :return: boolean array, whether the bit of every provided row number is set.
+    """
+    return ((bits[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+
+
+class RowSet:
+    """
+    A compressed set of row numbers: packed bits (np.packbits) when dense, sorted row numbers when sparse.
+    """
+    __slots__ = ('size', 'bits', 'rows')
+
+    def __init__(self, size: int, bits: np.ndarray = None, rows: np.ndarray = None):
+        self.size = size
+        self.bits = bits
+        self.rows = rows
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray, size: int):
+        """
+        :param rows: sorted row numbers
+        :param size: the total number of rows
+        """
+        if len(rows) * SPARSE_DENSITY_RATIO < size:
+            return cls(size, rows=rows.astype(np.int64))
+
+        mask = np.zeros(size, dtype=bool)
+        mask[rows] = True
+        return cls(size, bits=np.packbits(mask))
+
+    def to_bits(self) -> np.ndarray:
+        if self.bits is not None:
+            return self.bits
+
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.rows] = True
+        return np.packbits(mask)
+
+    def count(self, bits: np.ndarray = None) -> int:
+        """
+        :return: the number of rows in the set, or in its intersection with the provided packed bits.
+        """
+        if self.rows is not None:
+            return len(self.rows) if bits is None else int(np.count_nonzero(bits_at(bits, self.rows)))
+        return popcount(self.bits) if bits is None else popcount(self.bits & bits)
+
+    def __and__(self, other):
+        if self.rows is not None and other.rows is not None:
+            return RowSet(self.size, rows=np.intersect1d(self.rows, other.rows, assume_unique=True))
+        if self.rows is not None:
+            return RowSet(self.size, rows=self.rows[bits_at(other.bits, self.rows)])
+        if other.rows is not None:
+            return RowSet(self.size, rows=other.rows[bits_at(self.bits, other.rows)])
+        return RowSet(self.size, bits=self.bits & other.bits)
+
+
+class BitmapIndex:
+    """
+    Exposes the same counting methods as ColumnarDriftLog, so the miner and the planner's counterfactual analysis can
+    use either one. The counts always use the counterfactual drift bitsets, which start equal to the outliner
+    predicate ones and change only through set_out_liners_to_zero.
+    """
+
+    def __init__(self, dictionaries: dict[str, list], row_sets: dict[str, list[RowSet]], total_rows: int,
+                 out_liners: np.ndarray, in_liners: np.ndarray):
+        self.dictionaries = dictionaries
+        self.row_sets = row_sets
+        self.total_rows = total_rows
+        self.out_liners = out_liners
+        self.in_liners = in_liners
+        self.counter_drift_out_liners = out_liners.copy()
+        self.counter_drift_in_liners = in_liners.copy()
+        self._value_codes = {}
+
+    @classmethod
+    def from_drift_log(cls, drift_log: ColumnarDriftLog):
+        row_sets = {}
+        for attr, codes in drift_log.codes.items():
+            rows_by_code = np.argsort(codes, kind='stable')
+            ends = np.cumsum(np.bincount(codes, minlength=len(drift_log.dictionaries[attr])))
+            starts = ends - np.bincount(codes, minlength=len(drift_log.dictionaries[attr]))
+            row_sets[attr] = [RowSet.from_rows(rows_by_code[start:end], drift_log.total_rows)
+                              for start, end in zip(starts, ends)]
+
+        return cls(drift_log.dictionaries, row_sets, drift_log.total_rows, np.packbits(drift_log.is_out_liner),
+                   np.packbits(drift_log.is_in_liner))
+
+    def save(self, path: str):
+        """
+        Saves the arrays of the index in a .npz file, with the attributes, their dictionaries and the rows count as a
+        JSON string - the file is loaded without unpickling anything. The row sets of every attribute are saved as
+        the packed bits of its dense ones and the concatenated row numbers of its sparse ones.
+        :raises TypeError: if a dictionary has a value JSON can't represent (e.g. a date), before writing anything.
+        """
+        attributes = list(self.row_sets)
+        metadata = json.dumps({'attributes': attributes,
+                               'dictionaries': [self.dictionaries[attr] for attr in attributes],
+                               'total_rows': self.total_rows})
+        arrays = {'metadata': np.array(metadata), 'out_liners': self.out_liners, 'in_liners': self.in_liners}
+        bits_size = (self.total_rows + 7) // 8
+        for i, attr in enumerate(attributes):
+            row_sets = self.row_sets[attr]
+            dense_bits = [row_set.bits for row_set in row_sets if row_set.bits is not None]
+            sparse_rows = [row_set.rows for row_set in row_sets if row_set.bits is None]
+            arrays[f'dense_{i}'] = np.array([row_set.bits is not None for row_set in row_sets], dtype=bool)
+            arrays[f'bits_{i}'] = np.array(dense_bits, dtype=np.uint8).reshape(len(dense_bits), bits_size)
+            arrays[f'rows_{i}'] = np.concatenate(sparse_rows) if sparse_rows else np.zeros(0, dtype=np.int64)
+            arrays[f'rows_ends_{i}'] = np.cumsum([len(rows) for rows in sparse_rows], dtype=np.int64)
+
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @staticmethod
+    def load(path: str):
+        with np.load(path, allow_pickle=False) as arrays:
+            metadata = json.loads(str(arrays['metadata']))
+            row_sets = {}
+            for i, attr in enumerate(metadata['attributes']):
+                dense_bits = iter(arrays[f'bits_{i}'])
+                sparse_rows = iter(np.split(arrays[f'rows_{i}'], arrays[f'rows_ends_{i}'][:-1]))
+                row_sets[attr] = [RowSet(metadata['total_rows'], bits=next(dense_bits)) if dense else
+                                  RowSet(metadata['total_rows'], rows=next(sparse_rows))
+                                  for dense in arrays[f'dense_{i}']]
+
+            return BitmapIndex(dict(zip(metadata['attributes'], metadata['dictionaries'])), row_sets,
+                               metadata['total_rows'], arrays['out_liners'], arrays['in_liners'])
+
+    def copy(self):
+        """
+        :return: an index sharing the (read only) row sets, with its counterfactual drift reset to the outliners.
+        """
+        return BitmapIndex(self.dictionaries, self.row_sets, self.total_rows, self.out_liners, self.in_liners)
+
+    @property
+    def total_out_liners(self) -> int:
+        return popcount(self.counter_drift_out_liners)
+
+    def code_of(self, attribute: str, value):
+        if attribute not in self._value_codes:
+            self._value_codes[attribute] = {val: code for code, val in enumerate(self.dictionaries[attribute])}
+        return self._value_codes[attribute].get(value)
+
+    def rows_matching(self, attribute_values: list[tuple]) -> RowSet:
+        """
+        :return: the rows that have all the provided (attribute, value) pairs, all the rows for no pairs.
+        """
+        row_sets = []
+        for attr, val in attribute_values:
+            code = self.code_of(attr, val)
+            if code is None:
+                return RowSet(self.total_rows, rows=np.zeros(0, dtype=np.int64))
+            row_sets.append(self.row_sets[attr][code])
+
+        if not row_sets:
+            return RowSet(self.total_rows, bits=np.packbits(np.ones(self.total_rows, dtype=bool)))
+
+        # the sparsest row set first keeps the intersections small.
+        row_sets.sort(key=lambda row_set: row_set.bits is not None)
+        rows = row_sets[0]
+        for row_set in row_sets[1:]:
+            rows = rows & row_set
+
+        return rows
+
+    def rows_matching_any(self, attribute_values: list[tuple]) -> np.ndarray:
+        """
+        :return: packed bits of the rows that have at-least one of the provided (attribute, value) pairs.
+        """
+        bits = np.zeros((self.total_rows + 7) // 8, dtype=np.uint8)
+        for attr, val in attribute_values:
+            bits |= self.rows_matching([(attr, val)]).to_bits()
+
+        return bits
+
+    def count_out_liners(self, attribute_values: list[tuple]) -> int:
+        return self.rows_matching(attribute_values).count(self.counter_drift_out_liners)
+
+    def count_explanations(self, explanations: list[list[tuple]], rows: np.ndarray = None) -> list[tuple]:
+        """
+        The bitmap equivalent of GetCountsOfExplanations.
+        :param rows: packed bits to count only some of the rows, all the rows if None.
+        """
+        out_liners = self.counter_drift_out_liners if rows is None else self.counter_drift_out_liners & rows
+        in_liners = self.counter_drift_in_liners if rows is None else self.counter_drift_in_liners & rows
+
+        res = []
+        for explanation in explanations:
+            matching = self.rows_matching(explanation)
+            res.append((matching.count(out_liners), matching.count(in_liners),
+                        matching.count() if rows is None else matching.count(rows)))
+
+        return res
+
+    def count_groups(self, attributes_to_group_by, candidate_values: list[tuple] = None,
+                     min_out_liners_count: float = 0) -> list[tuple]:
+        """
+        The bitmap equivalent of GetOutLinersAndInLinersCountGroupedByProvidedAttributes.
+        :param candidate_values: the values tuples to count, all the values combinations if None.
+        """
+        attributes_to_group_by = list(attributes_to_group_by)
+        if candidate_values is None:
+            candidate_values = [()]
+            for attr in attributes_to_group_by:
+                candidate_values = [values + (val,) for values in candidate_values for val in self.dictionaries[attr]]
+
+        res = []
+        for values in candidate_values:
+            rows = self.rows_matching(list(zip(attributes_to_group_by, values)))
+            out_liners_count = rows.count(self.counter_drift_out_liners)
+            if out_liners_count > min_out_liners_count:
+                res.append((out_liners_count, rows.count(self.counter_drift_in_liners), *values))
+
+        return res
+
+    def set_out_liners_to_zero(self, attribute: str, value):
+        """
+        The bitmap equivalent of set_counter_drift_to_zero, the matching rows become in-liners.
+        """
+        rows = self.rows_matching([(attribute, value)]).to_bits()
+        self.counter_drift_out_liners &= ~rows
+        self.counter_drift_in_liners |= rows
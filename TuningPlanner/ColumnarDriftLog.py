@@ -0,0 +1,219 @@
+"""
+In-memory columnar copy of the filtered drift log, an alternative backend to the SQL group by queries.
+The needed columns are loaded once, every attribute is dictionary encoded to integer codes and all the group counts
+are computed with vectorized numpy operations (bincount / unique) instead of DB round trips.
+"""
+import numpy as np
+
+# above this many possible value combinations the group keys are compacted with np.unique instead of a dense bincount.
+DENSE_GROUPS_LIMIT = 1 << 22
+
+
+def encode_column(values) -> tuple[np.ndarray, list]:
+    """
+    Dictionary encodes a column.
+    :param values: the column values, in row order
+    :return: the integer code of every row and the dictionary (list of the distinct values, indexed by code).
+    """
+    dictionary = {}
+    codes = np.fromiter((dictionary.setdefault(val, len(dictionary)) for val in values), dtype=np.int64,
+                        count=len(values))
+    return codes, list(dictionary)
+
+
+class ColumnarDriftLog:
+    """
+    The filtered drift log rows, stored column by column as integer codes.
+    is_out_liner / is_in_liner follow the SQL semantics of the outliners filter - a row where the filter evaluates to
+    NULL is neither an outliner nor an in-liner, but it is still counted in total_rows.
+    """
+
+    def __init__(self, codes: dict[str, np.ndarray], dictionaries: dict[str, list], is_out_liner: np.ndarray,
+                 is_in_liner: np.ndarray):
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.is_out_liner = is_out_liner
+        self.is_in_liner = is_in_liner
+        self._value_codes = {}
+
+    @classmethod
+    def from_rows(cls, attributes: list[str], rows: list[tuple]):
+        """
+        :param attributes: the attribute names, in the order of their columns in rows
+        :param rows: tuples of (outliner flag, *attribute values), the flag is 1, 0 or None (NULL).
+        """
+        codes = {}
+        dictionaries = {}
+        columns = list(zip(*rows)) if rows else [()] * (len(attributes) + 1)
+
+        for attr, values in zip(attributes, columns[1:]):
+            codes[attr], dictionaries[attr] = encode_column(values)
+
+        flags = columns[0]
+        is_out_liner = np.fromiter((flag is not None and flag == 1 for flag in flags), dtype=bool, count=len(flags))
+        is_in_liner = np.fromiter((flag is not None and flag == 0 for flag in flags), dtype=bool, count=len(flags))
+
+        return cls(codes, dictionaries, is_out_liner, is_in_liner)
+
+    @property
+    def stored_rows(self) -> int:
+        """
+        :return: the number of rows the masks are over.
+        """
+        return len(self.is_out_liner)
+
+    @property
+    def total_rows(self) -> int:
+        return self.stored_rows
+
+    @property
+    def total_out_liners(self) -> int:
+        return int(np.count_nonzero(self.is_out_liner))
+
+    def copy(self):
+        """
+        :return: a log sharing the (read only) attribute columns, with its own copy of the outliners flags.
+        """
+        return ColumnarDriftLog(self.codes, self.dictionaries, self.is_out_liner.copy(), self.is_in_liner.copy())
+
+    def code_of(self, attribute: str, value):
+        """
+        :return: the integer code of value in the attribute's dictionary, None if no filtered row has this value.
+        """
+        if attribute not in self._value_codes:
+            self._value_codes[attribute] = {val: code for code, val in enumerate(self.dictionaries[attribute])}
+        return self._value_codes[attribute].get(value)
+
+    def rows_matching(self, attribute_values: list[tuple]) -> np.ndarray:
+        """
+        :param attribute_values: (attribute, value) pairs, example: [('weather', 'rain'), ('location', 'New York')]
+        :return: boolean mask of the rows that have all the provided values.
+        """
+        mask = np.ones(self.stored_rows, dtype=bool)
+        for attr, val in attribute_values:
+            code = self.code_of(attr, val)
+            if code is None:
+                return np.zeros(self.stored_rows, dtype=bool)
+            mask &= self.codes[attr] == code
+
+        return mask
+
+    def count_out_liners(self, attribute_values: list[tuple]) -> int:
+        return int(np.count_nonzero(self.is_out_liner & self.rows_matching(attribute_values)))
+
+    def count_explanations(self, explanations: list[list[tuple]], rows: np.ndarray = None) -> list[tuple]:
+        """
+        The numpy equivalent of GetCountsOfExplanations.
+        :param explanations: every explanation is a list of (attribute, value) pairs
+        :param rows: boolean mask to count only some of the rows, all the rows if None.
+        :return: for every explanation, a tuple of its outliners count, in-liners count and total rows count.
+        """
+        res = []
+        for explanation in explanations:
+            matching = self.rows_matching(explanation)
+            if rows is not None:
+                matching &= rows
+            res.append((int(np.count_nonzero(matching & self.is_out_liner)),
+                        int(np.count_nonzero(matching & self.is_in_liner)),
+                        int(np.count_nonzero(matching))))
+
+        return res
+
+    def rows_matching_any(self, attribute_values: list[tuple]) -> np.ndarray:
+        """
+        :return: boolean mask of the rows that have at-least one of the provided (attribute, value) pairs.
+        """
+        mask = np.zeros(self.stored_rows, dtype=bool)
+        for attr, val in attribute_values:
+            mask |= self.rows_matching([(attr, val)])
+
+        return mask
+
+    def set_out_liners_to_zero(self, attribute: str, value):
+        """
+        The in-memory equivalent of set_counter_drift_to_zero, the matching rows become in-liners.
+        """
+        rows = self.rows_matching([(attribute, value)])
+        self.is_out_liner[rows] = False
+        self.is_in_liner[rows] = True
+
+    def _group_keys(self, attributes_to_group_by: list[str], cardinalities: list[int]) -> np.ndarray:
+        """
+        :return: a group key per row, the mixed radix number of the attribute codes (decoded back with divmod).
+        """
+        keys = np.zeros(self.stored_rows, dtype=np.int64)
+        for attr, cardinality in zip(attributes_to_group_by, cardinalities):
+            keys = keys * cardinality + self.codes[attr]
+
+        return keys
+
+    def _group_counts(self, keys: np.ndarray, is_out_liner: np.ndarray, is_in_liner: np.ndarray,
+                      number_of_keys: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the outliners and in-liners counts of every group key, among the rows of the masks.
+        """
+        return (np.bincount(keys[is_out_liner], minlength=number_of_keys),
+                np.bincount(keys[is_in_liner], minlength=number_of_keys))
+
+    def rows_with_candidate_values(self, attributes_to_group_by: list[str], candidate_values: list[tuple]) -> np.ndarray:
+        """
+        :return: boolean mask of the rows whose value of every attribute appears in the candidates at its position.
+        """
+        mask = np.ones(self.stored_rows, dtype=bool)
+        for i, attr in enumerate(attributes_to_group_by):
+            codes = [self.code_of(attr, values[i]) for values in candidate_values]
+            mask &= np.isin(self.codes[attr], [code for code in codes if code is not None])
+
+        return mask
+
+    def count_groups(self, attributes_to_group_by, candidate_values: list[tuple] = None,
+                     min_out_liners_count: float = 0) -> list[tuple]:
+        """
+        The numpy equivalent of GetOutLinersAndInLinersCountGroupedByProvidedAttributes.
+        :param attributes_to_group_by:
+        :param candidate_values: if provided, only rows with these values (per attribute) are counted.
+        :param min_out_liners_count: only groups with more outliners than this are returned.
+        :return: list of tuples, each with the outliners count, the in-liners count and the values of the attributes.
+        """
+        attributes_to_group_by = list(attributes_to_group_by)
+        cardinalities = [max(len(self.dictionaries[attr]), 1) for attr in attributes_to_group_by]
+
+        is_out_liner = self.is_out_liner
+        is_in_liner = self.is_in_liner
+        if candidate_values is not None:
+            candidate_rows = self.rows_with_candidate_values(attributes_to_group_by, candidate_values)
+            is_out_liner = is_out_liner & candidate_rows
+            is_in_liner = is_in_liner & candidate_rows
+
+        number_of_keys = int(np.prod(cardinalities, dtype=float))
+
+        if number_of_keys <= DENSE_GROUPS_LIMIT:
+            keys = self._group_keys(attributes_to_group_by, cardinalities)
+            out_counts, in_counts = self._group_counts(keys, is_out_liner, is_in_liner, number_of_keys)
+            groups = np.flatnonzero(out_counts > min_out_liners_count)
+            group_codes = []
+            remaining = groups
+            for cardinality in reversed(cardinalities):
+                remaining, code = np.divmod(remaining, cardinality)
+                group_codes.append(code)
+            group_codes.reverse()
+            out_counts = out_counts[groups]
+            in_counts = in_counts[groups]
+        else:
+            # too many combinations for a dense count array (e.g. id with other attributes), compact the keys first.
+            stacked_codes = np.stack([self.codes[attr] for attr in attributes_to_group_by], axis=1)
+            unique_codes, inverse = np.unique(stacked_codes, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            out_counts, in_counts = self._group_counts(inverse, is_out_liner, is_in_liner, len(unique_codes))
+            groups = np.flatnonzero(out_counts > min_out_liners_count)
+            group_codes = [unique_codes[groups, i] for i in range(len(attributes_to_group_by))]
+            out_counts = out_counts[groups]
+            in_counts = in_counts[groups]
+
+        dictionaries = [self.dictionaries[attr] for attr in attributes_to_group_by]
+        res = []
+        for g in range(len(out_counts)):
+            values = [dictionary[codes[g]] for dictionary, codes in zip(dictionaries, group_codes)]
+            res.append((int(out_counts[g]), int(in_counts[g]), *values))
+
+        return res
@@ -0,0 +1,99 @@
+"""
+Count cube of the filtered drift log, fetched with a single aggregation query.
+MySQL has no GROUPING SETS / CUBE (and WITH ROLLUP only rolls up prefixes of the group by list), so the DB returns
+the base cuboid - one cell per distinct combination of all the attributes values, with its outliners, in-liners and
+rows counts - and the counts of every attribute subset are rolled up from the cells client-side.
+"""
+import numpy as np
+from ColumnarDriftLog import ColumnarDriftLog, encode_column
+
+
+class CountCube(ColumnarDriftLog):
+    """
+    A ColumnarDriftLog whose rows are the cube cells, every cell weighted by its counts. A cell is all-or-nothing for
+    any (attribute, value) pair, so all the counting methods stay exact.
+    """
+
+    def __init__(self, codes: dict[str, np.ndarray], dictionaries: dict[str, list], out_liners_counts: np.ndarray,
+                 in_liners_counts: np.ndarray, rows_counts: np.ndarray):
+        super().__init__(codes, dictionaries, out_liners_counts > 0, in_liners_counts > 0)
+        self.out_liners_counts = out_liners_counts
+        self.in_liners_counts = in_liners_counts
+        self.rows_counts = rows_counts
+
+    @classmethod
+    def from_rows(cls, attributes: list[str], rows: list[tuple]):
+        """
+        :param attributes: the attribute names, in the order of their columns in rows
+        :param rows: tuples of (outliners count, in-liners count, rows count, *attribute values), one per cell.
+        """
+        codes = {}
+        dictionaries = {}
+        columns = list(zip(*rows)) if rows else [()] * (len(attributes) + 3)
+
+        for attr, values in zip(attributes, columns[3:]):
+            codes[attr], dictionaries[attr] = encode_column(values)
+
+        out_liners_counts, in_liners_counts, rows_counts = (np.array(column, dtype=np.int64) for column in columns[:3])
+        return cls(codes, dictionaries, out_liners_counts, in_liners_counts, rows_counts)
+
+    @property
+    def total_rows(self) -> int:
+        return int(self.rows_counts.sum())
+
+    @property
+    def total_out_liners(self) -> int:
+        return int(self.out_liners_counts.sum())
+
+    def copy(self):
+        return CountCube(self.codes, self.dictionaries, self.out_liners_counts.copy(), self.in_liners_counts.copy(),
+                         self.rows_counts)
+
+    def count_out_liners(self, attribute_values: list[tuple]) -> int:
+        return int(self.out_liners_counts[self.rows_matching(attribute_values)].sum())
+
+    def count_explanations(self, explanations: list[list[tuple]], rows: np.ndarray = None) -> list[tuple]:
+        res = []
+        for explanation in explanations:
+            matching = self.rows_matching(explanation)
+            if rows is not None:
+                matching &= rows
+            res.append((int(self.out_liners_counts[matching].sum()), int(self.in_liners_counts[matching].sum()),
+                        int(self.rows_counts[matching].sum())))
+
+        return res
+
+    def set_out_liners_to_zero(self, attribute: str, value):
+        rows = self.rows_matching([(attribute, value)])
+        self.in_liners_counts[rows] += self.out_liners_counts[rows]
+        self.out_liners_counts[rows] = 0
+        self.is_out_liner = self.out_liners_counts > 0
+        self.is_in_liner = self.in_liners_counts > 0
+
+    def roll_up(self, attributes: list[str], cells: np.ndarray = None):
+        """
+        :param cells: boolean mask of the cells to keep, all of them if None.
+        :return: the cube of the kept cells over the provided attributes, the cells that only differ by the dropped
+        attributes merged into one (the dictionaries are shared, so they may have values no cell has anymore).
+        """
+        if cells is None:
+            cells = np.ones(self.stored_rows, dtype=bool)
+
+        stacked_codes = np.stack([self.codes[attr][cells] for attr in attributes], axis=1)
+        unique_codes, inverse = np.unique(stacked_codes, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        def merged(counts: np.ndarray) -> np.ndarray:
+            return np.bincount(inverse, weights=counts[cells], minlength=len(unique_codes)).astype(np.int64)
+
+        return CountCube({attr: unique_codes[:, i] for i, attr in enumerate(attributes)},
+                         {attr: self.dictionaries[attr] for attr in attributes}, merged(self.out_liners_counts),
+                         merged(self.in_liners_counts), merged(self.rows_counts))
+
+    def _group_counts(self, keys: np.ndarray, is_out_liner: np.ndarray, is_in_liner: np.ndarray,
+                      number_of_keys: int) -> tuple[np.ndarray, np.ndarray]:
+        out_counts = np.bincount(keys[is_out_liner], weights=self.out_liners_counts[is_out_liner],
+                                 minlength=number_of_keys)
+        in_counts = np.bincount(keys[is_in_liner], weights=self.in_liners_counts[is_in_liner],
+                                minlength=number_of_keys)
+        return out_counts.astype(np.int64), in_counts.astype(np.int64)
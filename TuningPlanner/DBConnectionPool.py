@@ -0,0 +1,91 @@
+"""
+The pool of open MySQL connections the ExplanationsExtractor helpers borrow from.
+Borrowing a connection costs no round trip to the server: it is only pinged (and reconnected if the server dropped it,
+e.g. after wait_timeout or an idle timeout between the planner and RDS) when it was idle in the pool for longer than
+ping_idle_seconds, or when the previous borrower lost it. The connections are in autocommit mode, so a borrower never
+inherits an open transaction (and its snapshot) from the previous one without a reset of the session - transactions
+are started explicitly (see ExplanationsExtractor.run_transaction).
+"""
+import threading
+import time
+import mysql.connector
+
+
+class PooledConnection:
+    """
+    A borrowed connection, close() gives it back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool: 'DBConnectionPool', cnx):
+        self.pool = pool
+        self.cnx = cnx
+        # set by the borrower when the connection failed, the pool then pings it before lending it again.
+        self.lost = False
+
+    def cursor(self):
+        return self.cnx.cursor()
+
+    def start_transaction(self):
+        self.cnx.start_transaction()
+
+    def commit(self):
+        self.cnx.commit()
+
+    def rollback(self):
+        self.cnx.rollback()
+
+    def close(self):
+        if self.cnx is not None:
+            self.pool.return_connection(self.cnx, self.lost)
+            self.cnx = None
+
+
+class DBConnectionPool:
+    """
+    :param pool_size: the number of idle connections kept open, the ones returned while the pool is full are closed.
+    The pool doesn't limit the number of borrowed connections (ExplanationsExtractor.db_connection does).
+    :param ping_idle_seconds: connections idle for longer than this are pinged before they are lent.
+    :param connect: creates a new connection, defaults to mysql.connector.connect with connection_config.
+    """
+
+    def __init__(self, pool_size: int, ping_idle_seconds: float, reconnect_attempts: int = 1, reconnect_delay: int = 0,
+                 connect=None, **connection_config):
+        self.pool_size = pool_size
+        self.ping_idle_seconds = ping_idle_seconds
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self._connect = connect if connect is not None else \
+            lambda: mysql.connector.connect(autocommit=True, **connection_config)
+        # (connection, when it was returned or None if it was lost) pairs, the most recently returned last.
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get_connection(self) -> PooledConnection:
+        with self._lock:
+            cnx, returned_time = self._idle.pop() if self._idle else (None, None)
+
+        if cnx is None:
+            cnx = self._connect()
+        elif returned_time is None or time.monotonic() - returned_time > self.ping_idle_seconds:
+            cnx.ping(reconnect=True, attempts=self.reconnect_attempts, delay=self.reconnect_delay)
+
+        return PooledConnection(self, cnx)
+
+    def return_connection(self, cnx, lost: bool = False):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((cnx, None if lost else time.monotonic()))
+                return
+
+        cnx.close()
+
+    def close(self):
+        """
+        Closes the idle connections, the borrowed ones are closed when they are returned.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.pool_size = 0
+
+        for cnx, _ in idle:
+            cnx.close()
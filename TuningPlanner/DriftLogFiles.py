@@ -0,0 +1,337 @@
+"""
+The drift log read from a directory of date partitioned Parquet (or Arrow IPC) exports instead of the DB, so the
+planner can run offline and over historical archives.
+Every partition holds the rows of one date and is named like a hive partition: a directory date=2020-01-01 of files,
+or a single file date=2020-01-01.parquet (.arrow / .feather / .ipc for Arrow IPC files).
+Only the attributes and the columns the filters use are read, the files are memory mapped, and the partitions the
+date conditions of the general filter rule out are never opened.
+The filters are a subset of SQL - conditions joined by AND, each one of:
+column = / != / <> / < / <= / > / >= literal, column [NOT] IN (literals), column IS [NOT] NULL,
+column BETWEEN literal AND literal.
+The conditions on the date column are evaluated on the partitions dates, and date literals are either ISO
+(2020-02-01) or month/day/year (2/1/2020).
+"""
+import datetime
+import operator
+import os
+import re
+import numpy as np
+from ColumnarDriftLog import ColumnarDriftLog
+
+# pyarrow is only needed by this backend, and takes a noticeable part of the planner's import time - it is imported by
+# the first DriftLogFiles (see import_pyarrow).
+pyarrow = None
+
+PARQUET_EXTENSIONS = ('.parquet', '.parq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+_COMPARISONS = {'=': operator.eq, '!=': operator.ne, '<>': operator.ne, '<': operator.lt, '<=': operator.le,
+                '>': operator.gt, '>=': operator.ge}
+
+_COMPARISON_RE = re.compile(r"^(\w+)\s*(<=|>=|<>|!=|=|<|>)\s*(.+)$", re.S)
+_IN_RE = re.compile(r"^(\w+)\s+(NOT\s+)?IN\s*\((.*)\)$", re.I | re.S)
+_IS_NULL_RE = re.compile(r"^(\w+)\s+IS\s+(NOT\s+)?NULL$", re.I)
+_BETWEEN_RE = re.compile(r"^(\w+)\s+BETWEEN\s+(.+)\s+AND\s+(.+)$", re.I | re.S)
+_BETWEEN_START_RE = re.compile(r"^(\w+)\s+BETWEEN\s", re.I)
+_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S')
+
+
+def split_top_level(sql: str, separator_re: str) -> list[str]:
+    """
+    Splits sql on the separator, except inside quoted strings and parentheses.
+    """
+    separator = re.compile(separator_re, re.I)
+    parts = []
+    start = 0
+    depth = 0
+    quote = None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0:
+            match = separator.match(sql, i)
+            if match:
+                parts.append(sql[start:i])
+                i = start = match.end()
+                continue
+        i += 1
+
+    parts.append(sql[start:])
+    return [part.strip() for part in parts]
+
+
+def is_parenthesized(sql: str) -> bool:
+    """
+    :return: whether the whole of sql is in one pair of parentheses.
+    """
+    if not (sql.startswith('(') and sql.endswith(')')):
+        return False
+    depth = 0
+    quote = None
+    for i, char in enumerate(sql):
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i == len(sql) - 1
+    return False
+
+
+def parse_literal(sql: str):
+    sql = sql.strip()
+    if len(sql) >= 2 and sql[0] == sql[-1] and sql[0] in "'\"":
+        return sql[1:-1].replace(sql[0] * 2, sql[0])
+    if sql.upper() == 'NULL':
+        return None
+    try:
+        return int(sql)
+    except ValueError:
+        pass
+    try:
+        return float(sql)
+    except ValueError:
+        raise ValueError(f"unsupported literal in a drift log files filter: {sql}")
+
+
+def parse_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"unsupported date: {value}")
+
+
+def parse_filter(sql_filter: str) -> list[tuple]:
+    """
+    :return: the AND-ed conditions of the filter, as (column, operator, literal) where the operator is one of the
+    _COMPARISONS, 'in', 'not in' (with a list literal), 'is null' or 'is not null' (with a None literal).
+    """
+    terms = split_top_level(sql_filter, r"\bAND\b")
+    # the AND of BETWEEN ... AND ... isn't a conjunction.
+    merged_terms = []
+    for term in terms:
+        if merged_terms and _BETWEEN_START_RE.match(merged_terms[-1]) and not _BETWEEN_RE.match(merged_terms[-1]):
+            merged_terms[-1] += ' AND ' + term
+        else:
+            merged_terms.append(term)
+
+    conditions = []
+    for term in merged_terms:
+        while is_parenthesized(term):
+            term = term[1:-1].strip()
+        if len(split_top_level(term, r"\bOR\b")) > 1:
+            raise ValueError(f"OR isn't supported in drift log files filters: {term}")
+
+        if match := _BETWEEN_RE.match(term):
+            conditions.append((match.group(1), '>=', parse_literal(match.group(2))))
+            conditions.append((match.group(1), '<=', parse_literal(match.group(3))))
+        elif match := _IN_RE.match(term):
+            values = [parse_literal(value) for value in split_top_level(match.group(3), r",")]
+            conditions.append((match.group(1), 'not in' if match.group(2) else 'in', values))
+        elif match := _IS_NULL_RE.match(term):
+            conditions.append((match.group(1), 'is not null' if match.group(2) else 'is null', None))
+        elif match := _COMPARISON_RE.match(term):
+            conditions.append((match.group(1), match.group(2), parse_literal(match.group(3))))
+        else:
+            raise ValueError(f"unsupported condition in a drift log files filter: {term}")
+
+    return conditions
+
+
+def date_matches(date: datetime.date, conditions: list[tuple]) -> bool:
+    """
+    :return: whether a partition of this date may have rows that pass the conditions on its date column.
+    """
+    for _, op, literal in conditions:
+        if op == 'is null':
+            return False
+        if op == 'is not null':
+            continue
+        if op in ('in', 'not in'):
+            is_in = date in {parse_date(value) for value in literal if value is not None}
+            if is_in != (op == 'in'):
+                return False
+        elif literal is None or not _COMPARISONS[op](date, parse_date(literal)):
+            return False
+
+    return True
+
+
+def evaluate_conditions(table, conditions: list[tuple]):
+    """
+    :return: BooleanArray, the AND of the conditions on every row of the table with the SQL NULL semantics (a
+    condition on a NULL value is NULL, not false).
+    """
+    compute = pyarrow.compute
+    res = pyarrow.array(np.ones(table.num_rows, dtype=bool))
+    for column, op, literal in conditions:
+        values = table.column(column).combine_chunks()
+        if op == 'is null':
+            condition = compute.is_null(values)
+        elif op == 'is not null':
+            condition = compute.is_valid(values)
+        elif op in ('in', 'not in'):
+            value_set = [value for value in literal if value is not None]
+            condition = compute.is_in(values, value_set=pyarrow.array(value_set, type=values.type))
+            if op == 'not in':
+                condition = compute.invert(condition)
+            # x IN (..) is NULL for a NULL x, and x NOT IN (.., NULL) is never true.
+            condition = compute.if_else(compute.is_valid(values), condition, pyarrow.scalar(None, pyarrow.bool_()))
+            if op == 'not in' and len(value_set) < len(literal):
+                condition = compute.if_else(condition, pyarrow.scalar(None, pyarrow.bool_()), condition)
+        elif literal is None:
+            # a comparison with NULL is NULL.
+            condition = pyarrow.nulls(table.num_rows, pyarrow.bool_())
+        else:
+            condition = getattr(compute, {'=': 'equal', '!=': 'not_equal', '<>': 'not_equal', '<': 'less',
+                                          '<=': 'less_equal', '>': 'greater', '>=': 'greater_equal'}[op])(
+                values, pyarrow.scalar(literal).cast(values.type))
+        res = compute.and_kleene(res, condition)
+
+    return res
+
+
+def encode_arrow_column(values) -> tuple[np.ndarray, list]:
+    """
+    The Arrow equivalent of encode_column: the integer code of every row and the dictionary (NULL is a value too).
+    """
+    values = values.combine_chunks()
+    if pyarrow.types.is_dictionary(values.type):
+        values = values.cast(values.type.value_type)
+    encoded = pyarrow.compute.dictionary_encode(values, null_encoding='encode')
+    return encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64), encoded.dictionary.to_pylist()
+
+
+def import_pyarrow():
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("reading the drift log from Parquet / Arrow files needs pyarrow (pip install pyarrow).")
+
+
+class DriftLogFiles:
+    """
+    :param path: the directory of the partitions
+    :param date_column: the partitioning column
+    """
+
+    def __init__(self, path: str, date_column: str = 'date'):
+        import_pyarrow()
+
+        self.path = path
+        self.date_column = date_column
+
+    def partitions(self) -> list[tuple[datetime.date, list[str]]]:
+        """
+        :return: (date, files) of every partition, by date.
+        """
+        partition_re = re.compile(re.escape(self.date_column) + r"=(\d{4}-\d{2}-\d{2})(\.\w+)?$")
+        res = []
+        for name in sorted(os.listdir(self.path)):
+            match = partition_re.match(name)
+            if match is None:
+                continue
+
+            partition_path = os.path.join(self.path, name)
+            if os.path.isdir(partition_path):
+                files = [os.path.join(partition_path, file_name) for file_name in sorted(os.listdir(partition_path))
+                         if file_name.endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS)]
+            elif name.endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS):
+                files = [partition_path]
+            else:
+                continue
+            res.append((datetime.date.fromisoformat(match.group(1)), files))
+
+        res.sort(key=lambda partition: partition[0])
+        return res
+
+    def files_to_read(self, general_db_filter_query: str) -> list[str]:
+        """
+        :return: the files of the partitions whose date may pass the general filter.
+        """
+        date_conditions = [condition for condition in parse_filter(general_db_filter_query)
+                           if condition[0] == self.date_column]
+        return [file_path for date, files in self.partitions() if date_matches(date, date_conditions)
+                for file_path in files]
+
+    def fingerprint(self, general_db_filter_query: str) -> tuple:
+        """
+        :return: the name, size and modification time of every file the filter reads, changed by any rewritten,
+        added or deleted partition.
+        """
+        res = []
+        for file_path in self.files_to_read(general_db_filter_query):
+            stat = os.stat(file_path)
+            res.append((os.path.relpath(file_path, self.path), stat.st_size, stat.st_mtime_ns))
+        return tuple(res)
+
+    @staticmethod
+    def read_file(file_path: str, columns: list[str]):
+        if file_path.endswith(PARQUET_EXTENSIONS):
+            return pyarrow.parquet.read_table(file_path, columns=columns, memory_map=True)
+
+        # record batches read from a memory map are zero copy.
+        return pyarrow.ipc.open_file(pyarrow.memory_map(file_path)).read_all().select(columns)
+
+    def load(self, attributes: list[str], outliners_sql_filter_query: str,
+             general_db_filter_query: str) -> ColumnarDriftLog:
+        """
+        The equivalent of the GetColumnarDriftLog query over the files.
+        """
+        outliners_conditions = parse_filter(outliners_sql_filter_query)
+        row_conditions = [condition for condition in parse_filter(general_db_filter_query)
+                          if condition[0] != self.date_column]
+        columns = list(dict.fromkeys(list(attributes) + [column for column, _, _ in
+                                                         row_conditions + outliners_conditions]))
+        if self.date_column in columns:
+            raise ValueError("the date column is the partitioning, the outliners filter and the attributes can't "
+                             "use it.")
+
+        tables = []
+        for file_path in self.files_to_read(general_db_filter_query):
+            table = self.read_file(file_path, columns)
+            if row_conditions:
+                # a NULL condition drops the row, like in a where clause.
+                table = table.filter(pyarrow.compute.fill_null(evaluate_conditions(table, row_conditions), False))
+            tables.append(table)
+
+        if not tables:
+            return ColumnarDriftLog.from_rows(attributes, [])
+
+        table = pyarrow.concat_tables(tables)
+        codes = {}
+        dictionaries = {}
+        for attr in attributes:
+            codes[attr], dictionaries[attr] = encode_arrow_column(table.column(attr))
+
+        is_out_liner_condition = evaluate_conditions(table, outliners_conditions)
+        is_out_liner = pyarrow.compute.fill_null(is_out_liner_condition, False).to_numpy(zero_copy_only=False)
+        is_in_liner = pyarrow.compute.fill_null(pyarrow.compute.invert(is_out_liner_condition),
+                                                False).to_numpy(zero_copy_only=False)
+
+        return ColumnarDriftLog(codes, dictionaries, is_out_liner, is_in_liner)
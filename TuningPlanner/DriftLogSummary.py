@@ -0,0 +1,110 @@
+"""
+Incrementally maintained summary of an append-only drift log, in a local SQLite file.
+The summary keeps the outliners, in-liners and rows counts of every (date, attributes values) group. Every update only
+re-aggregates the rows from the last summarized date on (the high-water mark, whose group may have grown since), so
+the planner reads a number of groups that grows with the distinct dates and values instead of the logged inferences.
+Dates are compared once parsed (see parse_date), the date column may hold month/day/year strings that don't sort as
+dates.
+The general filter is applied to the summary, so it may only use the date and the summarized attributes.
+"""
+import datetime
+import hashlib
+import sqlite3
+from CountCube import CountCube
+from DriftLogFiles import parse_date
+
+
+def summary_value(value):
+    # sqlite3 has no (non deprecated) adapter for dates, store them as their ISO strings.
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return str(value)
+    return value
+
+
+class DriftLogSummary:
+    """
+    :param path: the SQLite file the summary is kept in, shared by the summaries of different attributes.
+    :param source_name: the summarized table and the host it is on, example: localhost/local_schema.drift_log
+    :param attributes: the summarized attributes
+    :param outliners_sql_filter_query: defines the outliners, it must only read columns that are never updated
+    (example: signal_1or2 = 1, but not counter_drift = 1) as the rows before the high-water mark are never re-read.
+    :param date_column: the column that orders the appended rows.
+    """
+
+    def __init__(self, path: str, source_name: str, attributes: list[str], outliners_sql_filter_query: str,
+                 date_column: str = 'date'):
+        self.path = path
+        self.attributes = list(attributes)
+        self.date_column = date_column
+        key = repr((source_name, tuple(attributes), outliners_sql_filter_query, date_column))
+        self.summary_table = 'summary_' + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+        with self._connect() as cnx:
+            cnx.execute("CREATE TABLE IF NOT EXISTS " + self.summary_table + " (" + ', '.join(
+                [date_column] + self.attributes + ['out_liners_count', 'in_liners_count', 'rows_count']) + ")")
+            cnx.execute("CREATE TABLE IF NOT EXISTS high_water_marks (summary_table TEXT PRIMARY KEY, mark)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def high_water_mark(self) -> datetime.date:
+        """
+        :return: the last summarized date, None if nothing was summarized yet.
+        """
+        with self._connect() as cnx:
+            res = cnx.execute("SELECT mark FROM high_water_marks WHERE summary_table = ?",
+                              (self.summary_table,)).fetchone()
+        return None if res is None else parse_date(res[0])
+
+    def update(self, fetch_groups, fetch_dates) -> int:
+        """
+        Re-aggregates the rows from the high-water mark on.
+        :param fetch_groups: called with the date values to read (None for all the rows with a date), returns the
+        (outliners count, in-liners count, rows count, date, *attributes values) of every group of their rows.
+        :param fetch_dates: returns the distinct date values of the drift log, the ones from the high-water mark on
+        are re-read.
+        :return: the number of fetched groups.
+        """
+        mark = self.high_water_mark()
+        dates = None
+        if mark is not None:
+            dates = [date for date in fetch_dates() if date is not None and parse_date(date) >= mark]
+            if not dates:
+                return 0
+        groups = [tuple(map(summary_value, group)) for group in fetch_groups(dates)]
+        if not groups:
+            return 0
+
+        columns = [self.date_column] + self.attributes + ['out_liners_count', 'in_liners_count', 'rows_count']
+        with self._connect() as cnx:
+            # one transaction, a failed update leaves the previous summary and mark.
+            if mark is not None:
+                summarized_dates = [row[0] for row in cnx.execute(
+                    "SELECT DISTINCT " + self.date_column + " FROM " + self.summary_table).fetchall()]
+                cnx.executemany("DELETE FROM " + self.summary_table + " WHERE " + self.date_column + " = ?",
+                                [(date,) for date in summarized_dates if parse_date(date) >= mark])
+            cnx.executemany("INSERT INTO " + self.summary_table + " (" + ', '.join(columns) + ") VALUES (" +
+                            ', '.join('?' * len(columns)) + ")",
+                            [group[3:] + group[:3] for group in groups])
+            cnx.execute("INSERT OR REPLACE INTO high_water_marks VALUES (?, ?)",
+                        (self.summary_table, str(max(parse_date(group[3]) for group in groups))))
+
+        return len(groups)
+
+    def count_cube(self, general_db_filter_query: str, by_date: bool = False) -> CountCube:
+        """
+        :param by_date: whether to keep the counts of every date apart, the date is then the first attribute of the cube.
+        :return: the counts of every attributes values combination among the summarized rows that pass the filter.
+        """
+        cube_attributes = ([self.date_column] if by_date else []) + self.attributes
+        attr_sql_str = ', '.join(cube_attributes)
+        with self._connect() as cnx:
+            rows = cnx.execute(
+                "SELECT SUM(out_liners_count), SUM(in_liners_count), SUM(rows_count), " + attr_sql_str + " FROM " + self.summary_table + " where " + general_db_filter_query + " group by " + attr_sql_str).fetchall()
+
+        return CountCube.from_rows(cube_attributes, rows)
+
+    def clear(self):
+        with self._connect() as cnx:
+            cnx.execute("DELETE FROM " + self.summary_table)
+            cnx.execute("DELETE FROM high_water_marks WHERE summary_table = ?", (self.summary_table,))
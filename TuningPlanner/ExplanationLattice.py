@@ -0,0 +1,56 @@
+"""
+Subset lattice over an ordered list of explanations (values tuples, or tuples of (attribute, value)
+pairs, from the highest risk to the lowest).
+Every explanation is hash indexed with its rank in the list, and linked to the explanations of the list that are its
+proper subsets (its coarser ancestors), so the planner's "coarsest ranked ancestor" and "has a coarser surviving
+ancestor" checks don't scan the list.
+"""
+from itertools import combinations
+
+
+def proper_subsets(explanation: tuple):
+    """
+    proper_subsets((1, 2, 3)) --> (1,) (2,) (3,) (1, 2) (1, 3) (2, 3)
+    """
+    for r in range(1, len(explanation)):
+        yield from combinations(explanation, r)
+
+
+class ExplanationLattice:
+
+    def __init__(self, explanations: list[tuple]):
+        self.rank = {}
+        for explanation in explanations:
+            self.rank.setdefault(explanation, len(self.rank))
+
+        self.ancestors = {}
+        for explanation in self.rank:
+            ancestors = [subset for subset in proper_subsets(explanation) if subset in self.rank]
+            # coarsest first, then by rank.
+            ancestors.sort(key=lambda subset: (len(subset), self.rank[subset]))
+            self.ancestors[explanation] = ancestors
+
+    def get_ancestors(self, explanation: tuple) -> list[tuple]:
+        """
+        :return: the explanations of the lattice that are proper subsets of the provided one, coarsest first.
+        """
+        if explanation in self.ancestors:
+            return self.ancestors[explanation]
+        return sorted((subset for subset in proper_subsets(explanation) if subset in self.rank),
+                      key=lambda subset: (len(subset), self.rank[subset]))
+
+    def get_coarsest_ancestor(self, explanation: tuple) -> tuple:
+        """
+        :return: the coarsest (then highest ranked) ancestor of the explanation, or the explanation itself if the
+        lattice has no proper subset of it.
+        """
+        ancestors = self.get_ancestors(explanation)
+        return ancestors[0] if ancestors else explanation
+
+    def has_ancestor_in(self, explanation: tuple, explanations: set) -> bool:
+        """
+        :return: whether one of the provided explanations is a coarser form (proper subset) of this one.
+        """
+        if explanation in self.ancestors:
+            return any(ancestor in explanations for ancestor in self.ancestors[explanation])
+        return any(subset in explanations for subset in proper_subsets(explanation))
@@ -0,0 +1,71 @@
+"""
+Incremental counterfactual counts for the tuning planner.
+Instead of re-mining the whole DB every time a group's counter_drift is zeroed, the planner keeps the outliners and
+in-liners counts of the explanations it already found, subtracts the rows covered by the zeroed group and re-evaluates
+the support, confidence and risk of every explanation from the updated counts.
+"""
+from ExplanationsExtractor import remove_duplicate_item_sets, create_frequent_item_set
+
+
+class ExplanationsCounts:
+    """
+    :param explanations: the tracked explanations, mapped to their (attribute, value) pairs
+    :param counts: the (outliners count, in-liners count, total rows count) of all the filtered rows, followed by the
+    counts of every tracked explanation, in the order of explanations (as returned by GetCountsOfExplanations).
+    """
+
+    def __init__(self, explanations: dict[tuple, list[tuple]], counts: list[tuple]):
+        self.explanations = explanations
+        self.total_number_of_out_liners = counts[0][0]
+        self.total_number_of_rows = counts[0][2]
+        self.out_liners_counts = {explanation: c[0] for explanation, c in zip(explanations, counts[1:])}
+        self.in_liners_counts = {explanation: c[1] for explanation, c in zip(explanations, counts[1:])}
+
+    def get_explanations_to_count(self) -> list[list[tuple]]:
+        """
+        :return: the explanations to pass to GetCountsOfExplanations, the empty first one counts all the rows.
+        """
+        return [[]] + list(self.explanations.values())
+
+    def subtract_covered_rows(self, covered_counts: list[tuple]):
+        """
+        Updates the counts after zeroing counter_drift, all the covered rows become in-liners.
+        :param covered_counts: the counts of the rows covered by the zeroed group, before zeroing it, for the
+        explanations of get_explanations_to_count.
+        """
+        self.total_number_of_out_liners -= covered_counts[0][0]
+        for explanation, (out_liners, in_liners, rows) in zip(self.explanations, covered_counts[1:]):
+            self.out_liners_counts[explanation] -= out_liners
+            self.in_liners_counts[explanation] += rows - in_liners
+
+    def get_surviving_explanations(self, attributes: list[str], min_occurrences: float, min_support: float,
+                                   min_confidence: float, min_risk: float, max_length: int = 8) -> set[tuple]:
+        """
+        :return: the tracked explanations that get_explanations_ordered_list would still return on the current counts,
+        with the same thresholds and the same removal of duplicates.
+        """
+        if self.total_number_of_out_liners < 1:
+            return set()
+
+        min_num_of_outliners = max(self.total_number_of_rows * min_occurrences,
+                                   self.total_number_of_out_liners * min_support)
+
+        surviving_item_sets = []
+        for explanation, attribute_values in self.explanations.items():
+            curr_out_liners_count = self.out_liners_counts[explanation]
+            if len(explanation) > max_length or curr_out_liners_count <= min_num_of_outliners:
+                continue
+
+            item_set = create_frequent_item_set(attributes, [attr for attr, _ in attribute_values],
+                                                [val for _, val in attribute_values], curr_out_liners_count,
+                                                self.in_liners_counts[explanation], self.total_number_of_rows,
+                                                self.total_number_of_out_liners, min_confidence, min_risk)
+            if item_set is not None:
+                surviving_item_sets.append((explanation, item_set))
+
+        surviving_item_sets.sort(key=lambda explanation_item_set: explanation_item_set[1].risk_ratio)
+        item_sets = [item_set for _, item_set in surviving_item_sets]
+        remove_duplicate_item_sets(item_sets)
+
+        kept = set(map(id, item_sets))
+        return {explanation for explanation, item_set in surviving_item_sets if id(item_set) in kept}
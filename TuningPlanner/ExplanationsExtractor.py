@@ -2,9 +2,35 @@
 Implementation of the Apriori algorithm over a SQL DB. 
 The association rule is provided by outliners_sql_filter_query
 General SQL filter is also supported - then the item set mining is only ran on the filtered rows.
+The counting can also run over an in-memory copy of the filtered rows, with the same Apriori loop or with FP-Growth.
 """
-import mysql.connector
-from FrequentItemSetDataClass import FrequentItemSet
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+import datetime
+import getpass
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+import sqlite3
+from statistics import NormalDist
+import tempfile
+import threading
+import time
+from mysql.connector import errors
+import numpy as np
+from FrequentItemSetDataClass import FrequentItemSet, FrequentItemSets
+from ColumnarDriftLog import ColumnarDriftLog
+from BitmapIndex import BitmapIndex
+from CountCube import CountCube
+from DriftLogSummary import DriftLogSummary
+from DriftLogFiles import DriftLogFiles, parse_date
+from FPGrowth import mine_frequent_item_sets
+from MiningCache import MiningCache
+from DBConnectionPool import DBConnectionPool, PooledConnection
+from ShardedCounting import ShardedCounter
+import PlannerTrace
 
 # needed if we want to parse the data class to JSON-able object, if so we do:
 # jsonsable_result = JSONSerializer.serialize(final_items)
@@ -28,6 +54,95 @@ if USE_REMOTE_DB:
     schema_name = "drift_log_schema"
     table_name = 'drift_log_flex'
 
+db_password = 'nadernader'
+
+# all the helpers below borrow their connections from one shared pool, which lives for the whole process (or until
+# configure_db_pool / close_db_pool are called), so a planner run pays the TCP/TLS/auth handshake only DB_POOL_SIZE times.
+DB_POOL_SIZE = 5
+# health check: a borrowed connection that was idle in the pool for longer than this (or that failed while borrowed)
+# is pinged before use, and reconnected if RDS dropped it - the others are used without a round trip.
+DB_PING_IDLE_SECONDS = 60
+DB_RECONNECT_ATTEMPTS = 3
+DB_RECONNECT_DELAY = 1
+
+_db_pool = None
+# db_connection waits on this semaphore instead of failing when all the pooled connections are borrowed.
+_db_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+_db_pool_lock = threading.Lock()
+
+# the group by queries of one Apriori level are independent, so the SQL backend runs up to this many of them at once,
+# each on its own pooled connection (so at most DB_POOL_SIZE), and merges the results in the candidates order.
+# 1 runs them one after the other.
+MAX_CONCURRENT_QUERIES = 4
+
+# the mining backends of get_frequent_sets_from_DB: group by queries on the DB, or counts over an in-memory numpy
+# copy of the filtered rows (loaded once per attributes/filters and dropped whenever the planner writes to the DB).
+# FP_GROWTH_BACKEND mines the same in-memory copy with FP-Growth instead of the level by level Apriori loop, and
+# BITMAP_BACKEND counts with popcounts over a BitmapIndex built from it. CUBE_BACKEND loads the counts of every
+# distinct attributes values combination with one group by query (a CountCube) and rolls them up in memory.
+# SUMMARY_BACKEND rolls up the same counts from a DriftLogSummary, which only reads the rows appended since its last
+# update. PARQUET_BACKEND counts like NUMPY_BACKEND, over a copy read from the Parquet / Arrow exports in
+# DRIFT_LOG_FILES_DIR instead of the DB (see DriftLogFiles).
+SQL_BACKEND = 'sql'
+NUMPY_BACKEND = 'numpy'
+FP_GROWTH_BACKEND = 'fp_growth'
+BITMAP_BACKEND = 'bitmap'
+CUBE_BACKEND = 'cube'
+SUMMARY_BACKEND = 'summary'
+PARQUET_BACKEND = 'parquet'
+MINING_BACKENDS = (SQL_BACKEND, NUMPY_BACKEND, FP_GROWTH_BACKEND, BITMAP_BACKEND, CUBE_BACKEND, SUMMARY_BACKEND,
+                   PARQUET_BACKEND)
+
+# the Apriori counts of the in-memory copies (NUMPY_BACKEND, PARQUET_BACKEND and the in-memory counter factual copies)
+# are split into up to this many shards of at least MIN_ROWS_PER_SHARD rows, counted by as many worker processes over
+# shared memory (see ShardedCounting). 1 counts everything in this process.
+COUNTING_PROCESSES = 1
+MIN_ROWS_PER_SHARD = 200000
+
+_counting_pool = None
+
+_columnar_drift_logs = {}
+_bitmap_indexes = {}
+_count_cubes = {}
+_drift_log_summaries = {}
+_parquet_drift_logs = {}
+# the fingerprint the in-memory copies of every key were last checked against, see invalidate_stale_drift_logs.
+_drift_log_fingerprints = {}
+
+# the summaries of SUMMARY_BACKEND are kept in this SQLite file, by (date, attributes values) - rows with a NULL date
+# aren't summarized. The drift log must be append only along DRIFT_LOG_DATE_COLUMN.
+SUMMARY_STORE_PATH = os.path.join(tempfile.gettempdir(), 'nazar_drift_log_summary.sqlite')
+DRIFT_LOG_DATE_COLUMN = 'date'
+
+# the directory of the date partitioned exports of the drift log read by PARQUET_BACKEND, partitioned on
+# DRIFT_LOG_DATE_COLUMN (example: exports/date=2020-01-01/part-0.parquet).
+DRIFT_LOG_FILES_DIR = None
+
+# when set, bitmap indexes are also saved in this directory and loaded by the next runs with the same attributes and
+# filters (e.g. a fixed historical date window), as long as the GetDriftLogFingerprint of the filtered rows is the
+# same.
+BITMAP_INDEX_DIR = None
+
+# every explanation adds 3 columns to the GetCountsOfExplanations query, so long lists are split into several queries.
+EXPLANATIONS_PER_COUNT_QUERY = 300
+
+# the approximate mode of get_frequent_sets_from_DB (sample_error) screens the item sets on a sample of at least this
+# many outliners and in-liners, even when sample_error asks for fewer.
+MIN_SAMPLE_SIZE = 100
+# when set, the approximate mode takes the rows, outliners and in-liners counts it sizes the sample with from the
+# DriftLogSummary of the dates (see GetSummaryStrataCounts) instead of counting them in the DB, whenever the filters
+# allow it - the drift log must then be append only along DRIFT_LOG_DATE_COLUMN, like for SUMMARY_BACKEND.
+SAMPLE_STRATA_FROM_SUMMARY = True
+
+# results of get_explanations_ordered_list(use_cache=True), keyed on its arguments (the backend included) and on
+# GetDriftLogFingerprint, so repeated runs over an unchanged date window skip mining. Set MINING_CACHE_DIR to None to keep them only in memory.
+MINING_CACHE_SIZE = 64
+# the directory is per user (see MiningCache).
+MINING_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'nazar_mining_cache_' + (
+    str(os.getuid()) if hasattr(os, 'getuid') else getpass.getuser()))
+
+_mining_cache = None
+
 
 def get_set_to_delete(items1: FrequentItemSet, items2: FrequentItemSet):
     count1 = 0
@@ -54,80 +169,967 @@ def get_set_to_delete(items1: FrequentItemSet, items2: FrequentItemSet):
             return items2
 
 
+def GetDBPool():
+    """
+    :return: the shared connection pool, created on first use with DB_POOL_SIZE connections.
+    """
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = DBConnectionPool(DB_POOL_SIZE, DB_PING_IDLE_SECONDS, DB_RECONNECT_ATTEMPTS, DB_RECONNECT_DELAY,
+                                        user=db_user, password=db_password, host=host_name, database=schema_name)
+    return _db_pool
+
+
+def configure_db_pool(pool_size: int = None, pool=None):
+    """
+    Replaces the shared connection pool, e.g. to resize it for a planner run.
+    :param pool_size: the number of connections the new pool keeps open, defaults to DB_POOL_SIZE.
+    :param pool: an already built pool to use instead of creating a MySQL one, it only needs get_connection() and
+    connections that support cursor(), start_transaction(), commit(), rollback() and close().
+    """
+    global _db_pool, _db_pool_slots, DB_POOL_SIZE
+    close_db_pool()
+    if pool_size is not None:
+        DB_POOL_SIZE = pool_size
+    _db_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+    _db_pool = pool
+
+
+def close_db_pool():
+    """
+    Closes the idle connections of the shared pool, the next DB call creates a new pool.
+    """
+    global _db_pool
+    if isinstance(_db_pool, DBConnectionPool):
+        _db_pool.close()
+    _db_pool = None
+
+
 # TODO: change this to connect to AWS MySQL DB - If needed change schema name and table name accordingly.
 def GetDBContext():
-    return mysql.connector.connect(user=db_user, password='nadernader', host=host_name, database=schema_name)
+    """
+    :return: a connection borrowed from the shared pool, calling close() on it returns it to the pool.
+    """
+    return GetDBPool().get_connection()
 
 
-def GetTotalRowsCount(general_db_filter_query):
-    cnx = GetDBContext()
-    cursor = cnx.cursor()
-    cursor.execute("SELECT Count(*) FROM " + schema_name + "." + table_name + " where " + general_db_filter_query)
-    res = cursor.fetchone()
+@contextmanager
+def db_connection():
+    """
+    Context manager over GetDBContext, the connection goes back to the pool on exit even if the query failed.
+    Blocks while all the pooled connections are borrowed by other threads.
+    """
+    with _db_pool_slots:
+        cnx = GetDBContext()
+        try:
+            yield cnx
+        except (errors.OperationalError, errors.InterfaceError):
+            # the server may have dropped the connection, the pool pings it before lending it again.
+            if isinstance(cnx, PooledConnection):
+                cnx.lost = True
+            raise
+        finally:
+            cnx.close()
+
+
+def run_concurrently(func, args_list: list[tuple], max_workers: int) -> list:
+    """
+    :return: func(*args) for every args tuple, in the order of args_list, running up to max_workers calls at once.
+    """
+    if max_workers <= 1 or len(args_list) <= 1:
+        return [func(*args) for args in args_list]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(args_list))) as executor:
+        return list(executor.map(lambda args: func(*args), args_list))
+
+
+def GetCountingPool() -> ProcessPoolExecutor:
+    """
+    The worker processes of the sharded counts, started once and reused by the next planner runs. They are spawned
+    rather than forked, the planner process has the DB pool and query threads.
+    """
+    global _counting_pool
+    if _counting_pool is None:
+        _counting_pool = ProcessPoolExecutor(max_workers=COUNTING_PROCESSES,
+                                             mp_context=multiprocessing.get_context('spawn'))
+    return _counting_pool
+
+
+def close_counting_pool():
+    global _counting_pool
+    if _counting_pool is not None:
+        _counting_pool.shutdown()
+        _counting_pool = None
+
+
+def execute_statement(cursor, query: str, params=None, fetch_one: bool = False):
+    """
+    :param params: the values of the %s placeholders of the query, bound by the driver (never concatenated).
+    :return: the fetched row(s), or an empty list for statements that return no rows.
+    """
+    trace = PlannerTrace.get_current_trace()
+    start_time = time.perf_counter() if trace is not None else None
+
+    if params is None:
+        cursor.execute(query)
+    else:
+        cursor.execute(query, tuple(params))
+    if cursor.description is None:
+        res = []
+    else:
+        res = cursor.fetchone() if fetch_one else cursor.fetchall()
+
+    if trace is not None:
+        rows = (1 if res else 0) if fetch_one else len(res)
+        trace.record_query(query, time.perf_counter() - start_time, rows)
+
+    return res
+
+
+def run_query(query: str, fetch_one: bool = False, commit: bool = False, params=None):
+    """
+    Runs a single statement on a pooled connection.
+    :param query: the SQL statement to run
+    :param fetch_one: whether to return only the first row of the result
+    :param commit: whether the statement writes and needs to be committed
+    :param params: the values of the %s placeholders of the query
+    :return: the fetched row(s), or an empty list for statements that return no rows.
+    """
+    with db_connection() as cnx:
+        cursor = cnx.cursor()
+        try:
+            res = execute_statement(cursor, query, params, fetch_one)
+            if commit:
+                cnx.commit()
+        finally:
+            cursor.close()
+
+    return res
+
+
+def run_transaction(statements: list[tuple[str, list]]) -> list:
+    """
+    Runs the statements one after the other on one pooled connection and commits them together, nothing is committed
+    if one of them fails.
+    :param statements: (query, the values of its %s placeholders or None) pairs
+    :return: the fetched rows of every statement, an empty list for the ones that return no rows.
+    """
+    with db_connection() as cnx:
+        cnx.start_transaction()
+        cursor = cnx.cursor()
+        try:
+            res = [execute_statement(cursor, query, params) for query, params in statements]
+            cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cursor.close()
 
-    cursor.close()
-    cnx.close()
+    return res
+
+
+def GetTotalRowsCount(general_db_filter_query):
+    res = run_query("SELECT Count(*) FROM " + schema_name + "." + table_name + " where " + general_db_filter_query,
+                    fetch_one=True)
 
     return res[0]
 
 
 def GetTotalOutLinersCount(outliners_sql_filter_query, general_db_filter_query):
-    cnx = GetDBContext()
-    cursor = cnx.cursor()
-    cursor.execute(
-        "SELECT Count(*) FROM " + schema_name + "." + table_name + " where " + general_db_filter_query + " AND " + outliners_sql_filter_query)
-    res = cursor.fetchone()
-
-    cursor.close()
-    cnx.close()
+    res = run_query(
+        "SELECT Count(*) FROM " + schema_name + "." + table_name + " where " + general_db_filter_query + " AND " + outliners_sql_filter_query,
+        fetch_one=True)
 
     return res[0]
 
 
-def GetOutLinersCountGroupedByProvidedAttributes(attributes_to_group_by, outliners_sql_filter_query: str,
-                                                 general_db_filter_query: str) -> list[tuple]:
+def GetOutLinersAndInLinersCountGroupedByProvidedAttributes(attributes_to_group_by, outliners_sql_filter_query: str,
+                                                            general_db_filter_query: str,
+                                                            candidate_values: list[tuple] = None,
+                                                            min_out_liners_count: float = 0) -> list[tuple]:
     """
-    Queries the DB grouping yb the provided attributes where drift exists.
+    Queries the DB grouping by the provided attributes, counting the outliners and the in-liners of every group in
+    the same pass (conditional aggregation).
     :param attributes_to_group_by:
-    :return: list of tuples, each with the count of the group and the values of the attributes, example:
-    [(1060, 'New South Wales'), (963, 'California'), (1052, 'New York'), (1054, 'Quebec'), (1065, 'Beijing')]
+    :param candidate_values: if provided, only rows with these values tuples (in the order of attributes_to_group_by)
+    can qualify, they are pushed into the query as an IN (...) list of bound values per attribute.
+    :param min_out_liners_count: only groups with more outliners than this are returned (pushed as HAVING).
+    :return: list of tuples, each with the outliners count, the in-liners count and the values of the attributes:
+    [(1060, 310, 'New South Wales'), (963, 402, 'California'), (1052, 95, 'New York')]
     """
-    cnx = GetDBContext()
-    cursor = cnx.cursor()
+    attributes_to_group_by = list(attributes_to_group_by)
     attr_sql_str = ', '.join(attributes_to_group_by)
-    cursor.execute(
-        "SELECT COUNT(*)," + attr_sql_str + " FROM " + schema_name + "." + table_name + " where " + general_db_filter_query + " AND " + outliners_sql_filter_query + " group by " + attr_sql_str)
-    res = cursor.fetchall()
+    out_liners_count_sql = "COUNT(CASE WHEN " + outliners_sql_filter_query + " THEN 1 END)"
+    in_liners_count_sql = "COUNT(CASE WHEN NOT " + outliners_sql_filter_query + " THEN 1 END)"
+
+    candidates_sql = ""
+    params = []
+    if candidate_values is not None:
+        for i, attr in enumerate(attributes_to_group_by):
+            attr_values = dict.fromkeys(values[i] for values in candidate_values)
+            # NULL never matches an IN list, it is a value like any other for the group by.
+            attr_conditions = [attr + " IS NULL"] if None in attr_values else []
+            attr_values.pop(None, None)
+            if attr_values:
+                attr_conditions.append(attr + " IN (" + ', '.join(['%s'] * len(attr_values)) + ")")
+                params += attr_values
+            candidates_sql += " AND (" + " OR ".join(attr_conditions) + ")"
+
+    res = run_query(
+        "SELECT " + out_liners_count_sql + ", " + in_liners_count_sql + ", " + attr_sql_str + " FROM " + schema_name + "." + table_name + " where " + general_db_filter_query + candidates_sql + " group by " + attr_sql_str + " having " + out_liners_count_sql + " > %s",
+        params=params + [min_out_liners_count])
+
+    return res
 
-    cursor.close()
-    cnx.close()
+
+def explanation_sql(attribute_values: list[tuple], separator: str = ' AND ') -> tuple[str, list]:
+    """
+    :param attribute_values: (attribute, value) pairs, example: [('weather', 'rain'), ('location', 'NY')]
+    :return: the condition on the pairs with %s placeholders for the values (example: "weather <=> %s AND location <=>
+    %s"), and the values to bind to them. The comparison is NULL-safe, a None value matches the NULL rows like
+    ColumnarDriftLog.rows_matching.
+    """
+    return separator.join(attr + " <=> %s" for attr, _ in attribute_values), [val for _, val in attribute_values]
+
+
+def GetCountsOfExplanationsQueries(explanations: list[list[tuple]], outliners_sql_filter_query: str,
+                                   general_db_filter_query: str, general_db_filter_params: list = ()) -> list[tuple]:
+    """
+    :return: the (query, params) pairs of GetCountsOfExplanations, one per EXPLANATIONS_PER_COUNT_QUERY explanations.
+    """
+    queries = []
+    for first in range(0, len(explanations), EXPLANATIONS_PER_COUNT_QUERY):
+        counts_sql = []
+        params = []
+        for explanation in explanations[first:first + EXPLANATIONS_PER_COUNT_QUERY]:
+            explanation_condition, explanation_params = explanation_sql(explanation)
+            explanation_condition = explanation_condition or "1 = 1"
+            counts_sql.append("COUNT(CASE WHEN " + explanation_condition + " AND " + outliners_sql_filter_query + " THEN 1 END)")
+            counts_sql.append("COUNT(CASE WHEN " + explanation_condition + " AND NOT " + outliners_sql_filter_query + " THEN 1 END)")
+            counts_sql.append("COUNT(CASE WHEN " + explanation_condition + " THEN 1 END)")
+            params += explanation_params * 3
+
+        queries.append(("SELECT " + ', '.join(counts_sql) + " FROM " + schema_name + "." + table_name + " where " + general_db_filter_query,
+                        params + list(general_db_filter_params)))
+
+    return queries
+
+
+def parse_explanations_counts(row: tuple) -> list[tuple]:
+    return [(int(row[i]), int(row[i + 1]), int(row[i + 2])) for i in range(0, len(row), 3)]
+
+
+def GetCountsOfExplanations(explanations: list[list[tuple]], outliners_sql_filter_query: str,
+                            general_db_filter_query: str, general_db_filter_params: list = ()) -> list[tuple]:
+    """
+    Counts the rows of every explanation in a single scan, with one set of conditional counts per explanation.
+    :param explanations: every explanation is a list of (attribute, value) pairs, example: [('weather', 'rain')]
+    :param general_db_filter_params: the values of the %s placeholders of general_db_filter_query
+    :return: for every explanation, a tuple of its outliners count, in-liners count and total rows count.
+    """
+    res = []
+    for query, params in GetCountsOfExplanationsQueries(explanations, outliners_sql_filter_query,
+                                                        general_db_filter_query, general_db_filter_params):
+        res += parse_explanations_counts(run_query(query, fetch_one=True, params=params))
 
     return res
 
 
-def GetCountInLinersProvidedAttributes(attribute_names: list[str], attribute_values: list[str],
-                                       outliners_sql_filter_query: str, general_db_filter_query: str) -> int:
+def GetExplanationOutLinersCounts(attribute_values: list[tuple], outliners_sql_filter_query: str,
+                                  general_db_filter_query: str) -> tuple[int, int]:
     """
-    Queries the DB grouping yb the provided attributes where drift exists.
-    :param attribute_values:
-    :param attribute_names:
-    :return: in_liners_count, out_liners_count
+    :param attribute_values: the (attribute, value) pairs of the explanation
+    :return: the outliners count of the filtered rows and the outliners count of the explanation's rows, in one scan.
     """
-    cnx = GetDBContext()
-    cursor = cnx.cursor()
-    attr_sql_conditions = []
-    for i in range(len(attribute_values)):
-        attr_sql_conditions.append(attribute_names[i] + " = '" + attribute_values[i] + "'")
+    explanation_condition, params = explanation_sql(attribute_values)
+    res = run_query(
+        "SELECT COUNT(*), COUNT(CASE WHEN " + (explanation_condition or "1 = 1") + " THEN 1 END) FROM " + schema_name + "." + table_name + " where " + general_db_filter_query + " AND " + outliners_sql_filter_query,
+        fetch_one=True, params=params)
 
-    attr_sql_str = ' AND '.join(attr_sql_conditions)
-    cursor.execute(
-        "SELECT COUNT(*) FROM " + schema_name + "." + table_name + " where " + attr_sql_str + " AND " + general_db_filter_query + " AND NOT " + outliners_sql_filter_query)
-    res = cursor.fetchone()
+    return int(res[0]), int(res[1])
 
-    cursor.close()
-    cnx.close()
 
-    return res[0]
+def GetColumnarDriftLog(attributes: list[str], outliners_sql_filter_query: str,
+                        general_db_filter_query: str) -> ColumnarDriftLog:
+    """
+    Loads the attributes columns and the outliners flag of the filtered rows in one query, and keeps them in memory
+    for the next calls with the same arguments.
+    """
+    key = (tuple(attributes), outliners_sql_filter_query, general_db_filter_query)
+    if key not in _columnar_drift_logs:
+        out_liner_flag_sql = "CASE WHEN " + outliners_sql_filter_query + " THEN 1 WHEN NOT " + outliners_sql_filter_query + " THEN 0 END"
+        rows = run_query(
+            "SELECT " + out_liner_flag_sql + ", " + ', '.join(attributes) + " FROM " + schema_name + "." + table_name + " where " + general_db_filter_query)
+        _columnar_drift_logs[key] = ColumnarDriftLog.from_rows(attributes, rows)
+
+    return _columnar_drift_logs[key]
+
+
+def GetStrataCounts(outliners_sql_filter_query: str, general_db_filter_query: str) -> tuple[int, int, int]:
+    """
+    :return: the rows count, the outliners count and the in-liners count of the filtered rows, in one scan.
+    """
+    res = run_query(
+        "SELECT COUNT(*), COUNT(CASE WHEN " + outliners_sql_filter_query + " THEN 1 END), COUNT(CASE WHEN NOT " + outliners_sql_filter_query + " THEN 1 END) FROM " + schema_name + "." + table_name + " where " + general_db_filter_query,
+        fetch_one=True)
+
+    return int(res[0]), int(res[1]), int(res[2])
+
+
+def GetSummaryStrataCounts(outliners_sql_filter_query: str, general_db_filter_query: str) -> tuple[int, int, int]:
+    """
+    GetStrataCounts from the DriftLogSummary of the dates alone (no attributes), updated with the rows appended since
+    its last update - only the dates from its high-water mark on are read from the DB.
+    The general filter may only use the date, and the rows with a NULL date aren't counted.
+    """
+    date_counts = GetUpdatedDriftLogSummary([], outliners_sql_filter_query).count_cube(general_db_filter_query,
+                                                                                       by_date=True)
+    return date_counts.total_rows, date_counts.total_out_liners, int(date_counts.in_liners_counts.sum())
+
+
+def GetStratifiedSample(attributes: list[str], outliners_sql_filter_query: str, general_db_filter_query: str,
+                        out_liners_rate: float, in_liners_rate: float) -> ColumnarDriftLog:
+    """
+    Loads a random sample of the filtered rows like GetColumnarDriftLog, every outliner is kept with probability
+    out_liners_rate and every in-liner with probability in_liners_rate (rows with a NULL outliners flag are dropped).
+    """
+    out_liner_flag_sql = "CASE WHEN " + outliners_sql_filter_query + " THEN 1 WHEN NOT " + outliners_sql_filter_query + " THEN 0 END"
+    sample_sql = "((" + outliners_sql_filter_query + ") AND RAND() < " + repr(out_liners_rate) + ") OR (NOT (" + outliners_sql_filter_query + ") AND RAND() < " + repr(in_liners_rate) + ")"
+    rows = run_query(
+        "SELECT " + out_liner_flag_sql + ", " + ', '.join(attributes) + " FROM " + schema_name + "." + table_name + " where " + general_db_filter_query + " AND (" + sample_sql + ")")
+
+    return ColumnarDriftLog.from_rows(attributes, rows)
+
+
+def GetBitmapIndex(attributes: list[str], outliners_sql_filter_query: str,
+                   general_db_filter_query: str) -> BitmapIndex:
+    """
+    Builds the bitmap index of the filtered rows from their ColumnarDriftLog, or loads it from BITMAP_INDEX_DIR,
+    and keeps it in memory for the next calls with the same arguments.
+    """
+    key = (tuple(attributes), outliners_sql_filter_query, general_db_filter_query)
+    if key not in _bitmap_indexes:
+        path = None
+        if BITMAP_INDEX_DIR is not None:
+            # the saved index of rows that changed since is never loaded, and is replaced by the new one.
+            key_hash = hashlib.sha1(repr((host_name, schema_name, table_name) + key).encode()).hexdigest()
+            fingerprint_hash = hashlib.sha1(repr(GetDriftLogFingerprint(*key)).encode()).hexdigest()
+            path = os.path.join(BITMAP_INDEX_DIR, key_hash + '_' + fingerprint_hash + '.npz')
+
+        if path is not None and os.path.exists(path):
+            _bitmap_indexes[key] = BitmapIndex.load(path)
+        else:
+            _bitmap_indexes[key] = BitmapIndex.from_drift_log(
+                GetColumnarDriftLog(attributes, outliners_sql_filter_query, general_db_filter_query))
+            if path is not None:
+                os.makedirs(BITMAP_INDEX_DIR, exist_ok=True)
+                # the pickled indexes of the previous versions (.bitmap) are removed too, they are never loaded.
+                for file_name in os.listdir(BITMAP_INDEX_DIR):
+                    if file_name.startswith(key_hash + '_') and file_name.endswith(('.npz', '.bitmap')):
+                        os.remove(os.path.join(BITMAP_INDEX_DIR, file_name))
+                try:
+                    _bitmap_indexes[key].save(path)
+                except TypeError:
+                    # attribute values JSON can't represent, the index is only kept in memory.
+                    pass
+
+    return _bitmap_indexes[key]
+
+
+def GetCountCube(attributes: list[str], outliners_sql_filter_query: str,
+                 general_db_filter_query: str) -> CountCube:
+    """
+    Loads the outliners, in-liners and rows counts of every distinct combination of the attributes values among the
+    filtered rows in one group by query, and keeps them in memory for the next calls with the same arguments.
+    """
+    key = (tuple(attributes), outliners_sql_filter_query, general_db_filter_query)
+    if key not in _count_cubes:
+        attr_sql_str = ', '.join(attributes)
+        rows = run_query(
+            "SELECT COUNT(CASE WHEN " + outliners_sql_filter_query + " THEN 1 END), COUNT(CASE WHEN NOT " + outliners_sql_filter_query + " THEN 1 END), COUNT(*), " + attr_sql_str + " FROM " + schema_name + "." + table_name + " where " + general_db_filter_query + " group by " + attr_sql_str)
+        _count_cubes[key] = CountCube.from_rows(attributes, rows)
+
+    return _count_cubes[key]
+
+
+def GetDriftLogSummaryGroups(attributes: list[str], outliners_sql_filter_query: str, dates=None) -> list[tuple]:
+    """
+    :param dates: only count the rows of these date values, all the rows with a date if None.
+    :return: the outliners, in-liners and rows counts of every (date, attributes values) group, as
+    (outliners count, in-liners count, rows count, date, *attribute values).
+    """
+    if dates is None:
+        date_filter = DRIFT_LOG_DATE_COLUMN + " IS NOT NULL"
+        params = []
+    else:
+        params = list(dates)
+        date_filter = DRIFT_LOG_DATE_COLUMN + " IN (" + ', '.join(['%s'] * len(params)) + ")"
+
+    attr_sql_str = ', '.join([DRIFT_LOG_DATE_COLUMN] + list(attributes))
+    res = run_query(
+        "SELECT COUNT(CASE WHEN " + outliners_sql_filter_query + " THEN 1 END), COUNT(CASE WHEN NOT " + outliners_sql_filter_query + " THEN 1 END), COUNT(*), " + attr_sql_str + " FROM " + schema_name + "." + table_name + " where " + date_filter + " group by " + attr_sql_str,
+        params=params)
+
+    return res
+
+
+def GetSummaryCountCube(attributes: list[str], outliners_sql_filter_query: str,
+                        general_db_filter_query: str) -> CountCube:
+    """
+    Updates the DriftLogSummary of the attributes with the rows appended since its last update, and rolls up the
+    summarized rows that pass the general filter (which may only use the date and the attributes).
+    """
+    return GetUpdatedDriftLogSummary(attributes, outliners_sql_filter_query).count_cube(general_db_filter_query)
+
+
+def GetUpdatedDriftLogSummary(attributes: list[str], outliners_sql_filter_query: str) -> DriftLogSummary:
+    """
+    :return: the DriftLogSummary of the attributes, updated with the rows appended since its last update.
+    """
+    if re.search(r"\bcounter_drift\b", outliners_sql_filter_query, re.I):
+        # only the rows from the high-water mark on are re-read, updates of older rows would never be seen.
+        raise ValueError("a DriftLogSummary can't summarize the counterfactual drift (counter_drift), which the "
+                         "planner updates.")
+    key = (host_name, schema_name, table_name, tuple(attributes), outliners_sql_filter_query)
+    if key not in _drift_log_summaries:
+        _drift_log_summaries[key] = DriftLogSummary(SUMMARY_STORE_PATH,
+                                                    host_name + "/" + schema_name + "." + table_name, attributes,
+                                                    outliners_sql_filter_query, DRIFT_LOG_DATE_COLUMN)
+
+    summary = _drift_log_summaries[key]
+    summary.update(lambda dates: GetDriftLogSummaryGroups(attributes, outliners_sql_filter_query, dates),
+                   lambda: [row[0] for row in get_distinct_values_of_field(DRIFT_LOG_DATE_COLUMN)])
+    return summary
+
+
+def GetDateBucketsCountCube(attributes: list[str], outliners_sql_filter_query: str) -> CountCube:
+    """
+    :return: the counts of every (date, attributes values) combination of the updated DriftLogSummary, with
+    DRIFT_LOG_DATE_COLUMN as the first attribute - the date buckets get_window_count_cube combines.
+    """
+    return GetUpdatedDriftLogSummary(attributes, outliners_sql_filter_query).count_cube("1 = 1", by_date=True)
+
+
+def get_window_count_cube(date_buckets: CountCube, attributes: list[str], first_date=None,
+                          last_date=None) -> CountCube:
+    """
+    Adds up the date buckets of a window, without any DB query.
+    :param date_buckets: a GetDateBucketsCountCube result
+    :param first_date: the first date of the window (inclusive), unbounded if None. A date or a string like the
+    general filters use (ISO or month/day/year)
+    :param last_date: the last date of the window (inclusive), unbounded if None.
+    :return: the counts of every attributes values combination among the rows of the window.
+    """
+    first_date = None if first_date is None else parse_date(first_date)
+    last_date = None if last_date is None else parse_date(last_date)
+    window_dates = [(DRIFT_LOG_DATE_COLUMN, date) for date in date_buckets.dictionaries[DRIFT_LOG_DATE_COLUMN]
+                    if (first_date is None or parse_date(date) >= first_date) and
+                    (last_date is None or parse_date(date) <= last_date)]
+
+    return date_buckets.roll_up(attributes, date_buckets.rows_matching_any(window_dates))
+
+
+def GetDriftLogFiles() -> DriftLogFiles:
+    if DRIFT_LOG_FILES_DIR is None:
+        raise ValueError("PARQUET_BACKEND reads the drift log from DRIFT_LOG_FILES_DIR, which isn't set.")
+    return DriftLogFiles(DRIFT_LOG_FILES_DIR, DRIFT_LOG_DATE_COLUMN)
+
+
+def GetParquetDriftLog(attributes: list[str], outliners_sql_filter_query: str,
+                       general_db_filter_query: str) -> ColumnarDriftLog:
+    """
+    The GetColumnarDriftLog of the exports in DRIFT_LOG_FILES_DIR, kept in memory for the next calls with the same
+    arguments. Only the partitions the general filter's date conditions allow are read.
+    """
+    key = (DRIFT_LOG_FILES_DIR, tuple(attributes), outliners_sql_filter_query, general_db_filter_query)
+    if key not in _parquet_drift_logs:
+        _parquet_drift_logs[key] = GetDriftLogFiles().load(attributes, outliners_sql_filter_query,
+                                                           general_db_filter_query)
+
+    return _parquet_drift_logs[key]
+
+
+def clear_columnar_drift_logs():
+    """
+    Drops the in-memory copies of the drift log, the count cubes and the bitmap indexes, called after every write to
+    the DB so they are never stale. The indexes saved in BITMAP_INDEX_DIR are kept, they are keyed on the fingerprint
+    of their rows.
+    """
+    _columnar_drift_logs.clear()
+    _parquet_drift_logs.clear()
+    _count_cubes.clear()
+    _bitmap_indexes.clear()
+    _drift_log_fingerprints.clear()
+
+
+def invalidate_stale_drift_logs(key: tuple, fingerprint: tuple):
+    """
+    Drops the in-memory copies of the key's rows unless they were already checked against this fingerprint, so the
+    rows another writer changed since they were loaded are read again. The copies loaded before the first check are
+    dropped too, as the fingerprint of their rows isn't known.
+    :param key: the key of GetColumnarDriftLog, GetCountCube and GetBitmapIndex, or of GetParquetDriftLog.
+    :param fingerprint: the GetDriftLogFingerprint of the key's rows, or the DriftLogFiles.fingerprint of the exports.
+    """
+    if _drift_log_fingerprints.get(key) == fingerprint:
+        return
+
+    for drift_logs in (_columnar_drift_logs, _count_cubes, _bitmap_indexes, _parquet_drift_logs):
+        drift_logs.pop(key, None)
+    _drift_log_fingerprints[key] = fingerprint
+
+
+def GetMiningCache() -> MiningCache:
+    global _mining_cache
+    if _mining_cache is None:
+        _mining_cache = MiningCache(MINING_CACHE_SIZE, MINING_CACHE_DIR)
+    return _mining_cache
+
+
+def GetDriftLogFingerprint(attributes: list[str], outliners_sql_filter_query: str,
+                           general_db_filter_query: str) -> tuple:
+    """
+    :return: (rows count, checksum) of the filtered rows, over the attributes and the outliners flag - any insert,
+    delete or update that can change the mining result changes it, for the price of one aggregate query.
+    """
+    out_liner_flag_sql = "CASE WHEN " + outliners_sql_filter_query + " THEN 1 WHEN NOT " + outliners_sql_filter_query + " THEN 0 END"
+    row_sql = "CONCAT_WS('|', " + out_liner_flag_sql + ", " + ', '.join(attributes) + ")"
+    res = run_query(
+        "SELECT COUNT(*), SUM(CRC32(" + row_sql + ")), BIT_XOR(CRC32(" + row_sql + ")) FROM " + schema_name + "." + table_name + " where " + general_db_filter_query,
+        fetch_one=True)
+
+    return tuple(str(val) for val in res)
+
+
+def group_values_sort_key(group_counts: tuple):
+    # groups come back in an arbitrary order from the DB, ordering them by their values makes the ties in risk of
+    # the final items identical for every backend.
+    return tuple(str(val) for val in group_counts[2:])
+
+
+def create_frequent_item_set(attributes: list[str], item_attributes, item_values, curr_out_liners_count: int,
+                             curr_in_liners_count: int, total_number_of_rows: int, total_number_of_out_liners: int,
+                             min_confidence: float, min_risk: float, raise_on_infinite_risk: bool = False):
+    """
+    Applies the confidence and risk checks to an item set that already passed the support check.
+    :param item_attributes: the attributes of the item set, item_values has their values in the same order
+    :param raise_on_infinite_risk: whether an item set covering all the outliners is an error or just skipped
+    :return: the FrequentItemSet, where the attributes that aren't part of the item set have the value '-',
+    or None if one of the checks failed.
+    """
+    # this is the min confidence check:
+    curr_confidence = (curr_out_liners_count / (curr_in_liners_count + curr_out_liners_count))
+    if curr_confidence < min_confidence:
+        return None
+
+    b_o = total_number_of_out_liners - curr_out_liners_count
+
+    # to prevent dividing by 0 in case b_o == 0
+    if b_o == 0:
+        if raise_on_infinite_risk:
+            raise Exception("support not added for inf risk - shouldn't happen")
+        return None
+
+    total_in_liners_count = total_number_of_rows - total_number_of_out_liners
+    b_i = total_in_liners_count - curr_in_liners_count
+    curr_risk = curr_confidence / (b_o / (b_o + b_i))
+    # this is the min risk check:
+    if curr_risk < min_risk:
+        return None
+
+    item_attrs = dict(zip(item_attributes, item_values))
+    final_attrs = {attribute: item_attrs.get(attribute, '-') for attribute in attributes}
+
+    return FrequentItemSet(risk_ratio=curr_risk,
+                           occurrence_ratio=(curr_out_liners_count / total_number_of_rows),
+                           support_ratio=(curr_out_liners_count / total_number_of_out_liners),
+                           confidence=curr_confidence,
+                           attributes=final_attrs)
+
+
+def generate_candidates(frequent_item_sets: list[tuple], attributes: list[str]) -> dict[tuple, list[tuple]]:
+    """
+    Apriori candidate generation at the value level: joins every two frequent item sets of size k-1 that share their
+    first k-2 (attribute, value) pairs, and prunes the candidates that have an infrequent subset of size k-1
+    (downward closure) - so the DB is only asked about values combinations that can still be frequent.
+    :param frequent_item_sets: (attributes tuple, values tuple) pairs of size k-1, the attributes ordered as in
+    `attributes`
+    :return: the candidates of size k, their values tuples grouped by their attributes tuple.
+    """
+    position = {attr: i for i, attr in enumerate(attributes)}
+    frequent = set(frequent_item_sets)
+
+    last_items_by_prefix = {}
+    for item_attributes, item_values in frequent_item_sets:
+        last_items_by_prefix.setdefault((item_attributes[:-1], item_values[:-1]), []).append(
+            (item_attributes[-1], item_values[-1]))
+
+    candidates = {}
+    for (prefix_attributes, prefix_values), last_items in last_items_by_prefix.items():
+        last_items.sort(key=lambda last_item: position[last_item[0]])
+        for i in range(len(last_items)):
+            for j in range(i + 1, len(last_items)):
+                if last_items[i][0] == last_items[j][0]:
+                    continue
+
+                candidate_attributes = prefix_attributes + (last_items[i][0], last_items[j][0])
+                candidate_values = prefix_values + (last_items[i][1], last_items[j][1])
+
+                # the two subsets without one of the last items are the joined item sets, check all the others.
+                if all((candidate_attributes[:m] + candidate_attributes[m + 1:],
+                        candidate_values[:m] + candidate_values[m + 1:]) in frequent
+                       for m in range(len(candidate_attributes) - 2)):
+                    candidates.setdefault(candidate_attributes, []).append(candidate_values)
+
+    return {candidate_attributes: candidates[candidate_attributes]
+            for candidate_attributes in sorted(candidates, key=lambda attrs: [position[attr] for attr in attrs])}
+
+
+def get_min_num_of_outliners(total_number_of_rows: int, total_number_of_out_liners: int, min_occurrences: float,
+                             min_support: float) -> float:
+    """
+    :return: the number of outliners an item set must exceed to pass both the min_occurrences and min_support checks.
+    """
+    min_number_of_outliners_for_occurrence_condition = total_number_of_rows * min_occurrences
+    min_number_of_outliners_for_supp_condition = total_number_of_out_liners * min_support
+
+    return max(min_number_of_outliners_for_supp_condition, min_number_of_outliners_for_occurrence_condition)
+
+
+def count_frequent_groups(attributes: list[str],
+                          min_occurrences: float,
+                          min_support: float,
+                          outliners_sql_filter_query: str,
+                          general_db_filter_query: str,
+                          max_length: int = 8,
+                          backend: str = SQL_BACKEND,
+                          drift_log=None,
+                          min_out_liners_count: float = None) -> tuple[int, int, list[tuple]]:
+    """
+    The counting pass of get_frequent_sets_from_DB: finds every values combination of up to max_length attributes
+    with enough outliners for min_occurrences and min_support, level by level (or with FP-Growth).
+    :param min_out_liners_count: if provided, the groups need more outliners than this instead of the count derived
+    from min_occurrences and min_support.
+    :return: the total rows count, the total outliners count and the frequent groups, as (attributes tuple, values
+    tuple, outliners count, in-liners count) by size, then by the position of the attributes, then by values.
+    """
+    if backend not in MINING_BACKENDS:
+        raise ValueError(f"`backend` must be one of {MINING_BACKENDS}.")
+
+    # FP-Growth mines the rows of a ColumnarDriftLog, the other drift logs (e.g. the BitmapIndex or the CountCube of the
+    # in-memory counterfactual modes) are mined with the Apriori loop, which finds the same groups.
+    use_fp_growth = backend == FP_GROWTH_BACKEND and (drift_log is None or (isinstance(drift_log, ColumnarDriftLog) and
+                                                                            not isinstance(drift_log, CountCube)))
+
+    if drift_log is not None or backend in (NUMPY_BACKEND, FP_GROWTH_BACKEND, BITMAP_BACKEND, CUBE_BACKEND,
+                                            SUMMARY_BACKEND, PARQUET_BACKEND):
+        if drift_log is None and backend == BITMAP_BACKEND:
+            drift_log = GetBitmapIndex(attributes, outliners_sql_filter_query, general_db_filter_query)
+        elif drift_log is None and backend == CUBE_BACKEND:
+            drift_log = GetCountCube(attributes, outliners_sql_filter_query, general_db_filter_query)
+        elif drift_log is None and backend == SUMMARY_BACKEND:
+            drift_log = GetSummaryCountCube(attributes, outliners_sql_filter_query, general_db_filter_query)
+        elif drift_log is None and backend == PARQUET_BACKEND:
+            drift_log = GetParquetDriftLog(attributes, outliners_sql_filter_query, general_db_filter_query)
+        elif drift_log is None:
+            drift_log = GetColumnarDriftLog(attributes, outliners_sql_filter_query, general_db_filter_query)
+        total_number_of_rows = drift_log.total_rows
+        total_number_of_out_liners = drift_log.total_out_liners
+        # in-memory counting is CPU bound, threads wouldn't help it - large copies are split between processes instead.
+        max_concurrent_queries = 1
+        group_counter = drift_log
+        if type(drift_log) is ColumnarDriftLog and not use_fp_growth:
+            shards = min(COUNTING_PROCESSES, drift_log.stored_rows // MIN_ROWS_PER_SHARD)
+            if shards > 1:
+                group_counter = ShardedCounter(drift_log, attributes, GetCountingPool(), shards)
+
+        def count_groups(attributes_to_group_by, candidate_values, min_out_liners_count):
+            return sorted(group_counter.count_groups(attributes_to_group_by, candidate_values, min_out_liners_count),
+                          key=group_values_sort_key)
+    else:
+        max_concurrent_queries = min(MAX_CONCURRENT_QUERIES, DB_POOL_SIZE)
+        total_number_of_rows, total_number_of_out_liners = run_concurrently(
+            lambda count_query, args: count_query(*args),
+            [(GetTotalRowsCount, (general_db_filter_query,)),
+             (GetTotalOutLinersCount, (outliners_sql_filter_query, general_db_filter_query))],
+            max_concurrent_queries)
+
+        def count_groups(attributes_to_group_by, candidate_values, min_out_liners_count):
+            return sorted(GetOutLinersAndInLinersCountGroupedByProvidedAttributes(attributes_to_group_by,
+                                                                                 outliners_sql_filter_query,
+                                                                                 general_db_filter_query,
+                                                                                 candidate_values,
+                                                                                 min_out_liners_count),
+                          key=group_values_sort_key)
+
+    if total_number_of_rows < 1:
+        raise Exception("DB is Empty")
+
+    # no out_liners --> no work needed
+    if total_number_of_out_liners < 1:
+        return total_number_of_rows, total_number_of_out_liners, []
+
+    min_num_of_outliners = get_min_num_of_outliners(total_number_of_rows, total_number_of_out_liners,
+                                                    min_occurrences, min_support)
+    if min_out_liners_count is not None:
+        min_num_of_outliners = min_out_liners_count
+
+    if use_fp_growth:
+        with PlannerTrace.phase('fp_growth'):
+            return total_number_of_rows, total_number_of_out_liners, mine_frequent_item_sets(
+                drift_log, attributes, min_num_of_outliners, min(max_length, len(attributes)))
+
+    frequent_groups = []
+
+    # level 1 queries every attribute, the next levels only the values combinations generated by generate_candidates.
+    candidates = {(attr,): None for attr in attributes}
+    k = 1
+    while candidates:
+        frequent_item_sets = []
+
+        with PlannerTrace.phase('apriori_level', level=k):
+            level_counts = run_concurrently(count_groups,
+                                            [(list(combined_attributes), candidate_values, min_num_of_outliners)
+                                             for combined_attributes, candidate_values in candidates.items()],
+                                            max_concurrent_queries)
+        for combined_attributes, attr_counts in zip(candidates, level_counts):
+            for attr_val in attr_counts:
+                # attr_val looks like: (1060, 310, 'New South Wales', 'rain')
+                curr_out_liners_count = attr_val[0]
+
+                # this is a check for min_supp, min_occurrences
+                if curr_out_liners_count > min_num_of_outliners:
+                    # add to high support items (frequent) for FIM.
+                    frequent_item_sets.append((combined_attributes, tuple(attr_val[2:])))
+                    frequent_groups.append((combined_attributes, tuple(attr_val[2:]), curr_out_liners_count,
+                                            attr_val[1]))
+
+        PlannerTrace.record_level(k, len(candidates), None if k == 1 else sum(map(len, candidates.values())),
+                                  len(frequent_item_sets))
+        k += 1
+        if k > max_length or k > len(attributes):
+            break
+        candidates = generate_candidates(frequent_item_sets, attributes)
+
+    return total_number_of_rows, total_number_of_out_liners, frequent_groups
+
+
+def frequent_groups_to_item_sets(attributes: list[str], frequent_groups: list[tuple], total_number_of_rows: int,
+                                 total_number_of_out_liners: int, min_occurrences: float, min_support: float,
+                                 min_confidence: float, min_risk: float,
+                                 max_length: int = 8) -> FrequentItemSets:
+    """
+    Applies the thresholds to the groups found by count_frequent_groups (with the same or looser min_occurrences,
+    min_support and max_length) - the checks of create_frequent_item_set, on the columns of all the groups at once.
+    :return: the item sets of the groups that pass all the checks, ordered by risk.
+    """
+    min_num_of_outliners = get_min_num_of_outliners(total_number_of_rows, total_number_of_out_liners,
+                                                    min_occurrences, min_support)
+
+    groups = [group for group in frequent_groups
+              if len(group[0]) <= max_length and group[2] > min_num_of_outliners]
+    lengths = np.array([len(group[0]) for group in groups], dtype=np.int64)
+    out_liners_counts = np.array([group[2] for group in groups], dtype=np.int64)
+    in_liners_counts = np.array([group[3] for group in groups], dtype=np.int64)
+
+    confidence = out_liners_counts / (in_liners_counts + out_liners_counts)
+    b_o = total_number_of_out_liners - out_liners_counts
+    b_i = (total_number_of_rows - total_number_of_out_liners) - in_liners_counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        risk = confidence / (b_o / (b_o + b_i))
+
+    passes_confidence = ~(confidence < min_confidence)
+    # an item set covering all the outliners has an infinite risk, which no single attribute value should have.
+    if np.any(passes_confidence & (b_o == 0) & (lengths == 1)):
+        raise Exception("support not added for inf risk - shouldn't happen")
+    passes = passes_confidence & (b_o != 0) & ~(risk < min_risk)
+
+    kept = np.flatnonzero(passes)
+    records = [(groups[i][0], groups[i][1], risk_ratio, occurrence_ratio, support_ratio, curr_confidence, True)
+               for i, risk_ratio, occurrence_ratio, support_ratio, curr_confidence in zip(
+                   kept.tolist(), risk[kept].tolist(), (out_liners_counts[kept] / total_number_of_rows).tolist(),
+                   (out_liners_counts[kept] / total_number_of_out_liners).tolist(), confidence[kept].tolist())]
+
+    final_items = FrequentItemSets.from_records(attributes, records)
+    final_items.sort()
+    return final_items
+
+
+def validate_thresholds(min_occurrences: float, min_support: float, min_confidence: float):
+    if not (isinstance(min_occurrences, float) and (0 <= min_occurrences <= 1)):
+        raise ValueError("`min_occurrences` must be a number between 0 and 1.")
+
+    if not (isinstance(min_support, float) and (0 <= min_support <= 1)):
+        raise ValueError("`min_support` must be a number between 0 and 1.")
+
+    if not (isinstance(min_confidence, float) and (0 <= min_confidence <= 1)):
+        raise ValueError("`min_confidence` must be a number between 0 and 1.")
+
+
+def get_sample_size(sample_error: float, z: float, population_size: int) -> int:
+    """
+    :return: the sample size for which the confidence interval of any proportion is at most sample_error wide on each
+    side (the worst case, a proportion of 0.5), with the finite population correction.
+    """
+    sample_size = max(math.ceil(z * z / (4 * sample_error * sample_error)), MIN_SAMPLE_SIZE)
+    return min(population_size, math.ceil(sample_size / (1 + (sample_size - 1) / max(population_size, 1))))
+
+
+def proportion_interval(count: int, sample_size: int, population_size: int, z: float) -> tuple[float, float]:
+    """
+    :return: the Wilson score interval of the proportion count / sample_size, narrowed by the finite population
+    correction (so it is exact when the whole population was sampled).
+    """
+    if sample_size == 0:
+        return 0.0, 1.0
+
+    proportion = count / sample_size
+    denominator = 1 + z * z / sample_size
+    center = (proportion + z * z / (2 * sample_size)) / denominator
+    half_width = z * math.sqrt(proportion * (1 - proportion) / sample_size +
+                               z * z / (4 * sample_size * sample_size)) / denominator
+    correction = math.sqrt((population_size - sample_size) / (population_size - 1)) if population_size > 1 else 0.0
+
+    return (max(0.0, proportion - (proportion - (center - half_width)) * correction),
+            min(1.0, proportion + (center + half_width - proportion) * correction))
+
+
+def get_risk(out_liners_count: float, in_liners_count: float, total_number_of_out_liners: int,
+             total_in_liners_count: int) -> float:
+    """
+    :return: the risk ratio of create_frequent_item_set, inf when the item set covers all the outliners.
+    """
+    if out_liners_count + in_liners_count == 0:
+        return 0.0
+    b_o = total_number_of_out_liners - out_liners_count
+    if b_o <= 0:
+        return math.inf
+    b_i = total_in_liners_count - in_liners_count
+    return (out_liners_count / (out_liners_count + in_liners_count)) / (b_o / (b_o + b_i))
+
+
+def get_frequent_sets_from_sample(attributes: list[str],
+                                  min_occurrences: float,
+                                  min_support: float,
+                                  min_confidence: float,
+                                  min_risk: float,
+                                  outliners_sql_filter_query: str,
+                                  general_db_filter_query: str,
+                                  max_length: int = 8,
+                                  sample_error: float = 0.01,
+                                  sample_confidence: float = 0.95,
+                                  debug_print: bool = False) -> FrequentItemSets:
+    """
+    The approximate mode of get_frequent_sets_from_DB. The item sets are screened on a sample of the filtered rows,
+    stratified by the outliners flag (sized with the counts of GetSummaryStrataCounts, or of GetStrataCounts when the
+    summary can't be used), with confidence intervals on their outliners and in-liners counts (hence on
+    their support, confidence and risk, which are monotonic in these counts):
+    an item set whose intervals are all on the passing side of the thresholds is kept with its estimated ratios
+    (verified=False), one with an interval on the failing side is dropped, and the ones whose intervals straddle a
+    threshold are counted exactly in the DB (verified=True).
+    The intervals hold with probability sample_confidence for every item set (not for all of them together), and an
+    item set none of whose outliners were sampled is never found.
+    """
+    # the two proportions of an item set must both be in their intervals (Bonferroni).
+    z = NormalDist().inv_cdf(1 - (1 - sample_confidence) / 4)
+
+    strata_counts = None
+    if SAMPLE_STRATA_FROM_SUMMARY:
+        try:
+            strata_counts = GetSummaryStrataCounts(outliners_sql_filter_query, general_db_filter_query)
+        except (ValueError, sqlite3.OperationalError):
+            # outliners the summary can't follow (counter_drift), or a general filter on other columns than the date.
+            pass
+    if strata_counts is None:
+        strata_counts = GetStrataCounts(outliners_sql_filter_query, general_db_filter_query)
+    total_number_of_rows, total_number_of_out_liners, total_in_liners_stratum = strata_counts
+    if total_number_of_rows < 1:
+        raise Exception("DB is Empty")
+    if total_number_of_out_liners < 1:
+        return FrequentItemSets.from_records(attributes, [])
+
+    out_liners_rate = get_sample_size(sample_error, z, total_number_of_out_liners) / total_number_of_out_liners
+    in_liners_rate = get_sample_size(sample_error, z, total_in_liners_stratum) / max(total_in_liners_stratum, 1)
+    sample = GetStratifiedSample(attributes, outliners_sql_filter_query, general_db_filter_query,
+                                 min(1.0, out_liners_rate), min(1.0, in_liners_rate))
+    sampled_out_liners = sample.total_out_liners
+    sampled_in_liners = int(sample.is_in_liner.sum())
+
+    def counts_intervals(sampled_out_liners_count: int, sampled_in_liners_count: int) -> tuple[tuple, tuple]:
+        out_liners_interval = proportion_interval(sampled_out_liners_count, sampled_out_liners,
+                                                  total_number_of_out_liners, z)
+        in_liners_interval = proportion_interval(sampled_in_liners_count, sampled_in_liners,
+                                                 total_in_liners_stratum, z)
+        return (tuple(bound * total_number_of_out_liners for bound in out_liners_interval),
+                tuple(bound * total_in_liners_stratum for bound in in_liners_interval))
+
+    min_num_of_outliners = get_min_num_of_outliners(total_number_of_rows, total_number_of_out_liners,
+                                                    min_occurrences, min_support)
+    # screen with the smallest sampled outliners count whose interval can still pass the support check (support is
+    # monotonic in it, so the Apriori pruning stays valid).
+    low, high = 1, sampled_out_liners + 1
+    while low < high:
+        middle = (low + high) // 2
+        if counts_intervals(middle, 0)[0][1] > min_num_of_outliners:
+            high = middle
+        else:
+            low = middle + 1
+    if low > sampled_out_liners:
+        return FrequentItemSets.from_records(attributes, [])
+
+    _, _, sampled_groups = count_frequent_groups(attributes, min_occurrences, min_support, outliners_sql_filter_query,
+                                                 general_db_filter_query, max_length, NUMPY_BACKEND, sample,
+                                                 min_out_liners_count=low - 1)
+
+    total_in_liners_count = total_number_of_rows - total_number_of_out_liners
+    records = []
+    straddling_groups = []
+    for item_attributes, item_values, sampled_out_liners_count, sampled_in_liners_count in sampled_groups:
+        (out_low, out_high), (in_low, in_high) = counts_intervals(sampled_out_liners_count, sampled_in_liners_count)
+        confidence_low = out_low / (out_low + in_high) if out_low + in_high > 0 else 0.0
+        confidence_high = out_high / (out_high + in_low) if out_high + in_low > 0 else 0.0
+        risk_low = get_risk(out_low, in_high, total_number_of_out_liners, total_in_liners_count)
+        risk_high = get_risk(out_high, in_low, total_number_of_out_liners, total_in_liners_count)
+
+        if out_high <= min_num_of_outliners or confidence_high < min_confidence or risk_high < min_risk:
+            continue
+
+        out_liners_count = sampled_out_liners_count / sampled_out_liners * total_number_of_out_liners
+        in_liners_count = sampled_in_liners_count / sampled_in_liners * total_in_liners_stratum \
+            if sampled_in_liners else 0.0
+        risk = get_risk(out_liners_count, in_liners_count, total_number_of_out_liners, total_in_liners_count)
+        if out_low <= min_num_of_outliners or confidence_low < min_confidence or risk_low < min_risk or \
+                math.isinf(risk):
+            straddling_groups.append((item_attributes, item_values))
+            continue
+
+        records.append((item_attributes, item_values, risk, out_liners_count / total_number_of_rows,
+                        out_liners_count / total_number_of_out_liners,
+                        out_liners_count / (out_liners_count + in_liners_count), False))
+
+    explanations_counts = GetCountsOfExplanations([list(zip(item_attributes, item_values))
+                                                   for item_attributes, item_values in straddling_groups],
+                                                  outliners_sql_filter_query, general_db_filter_query)
+    for (item_attributes, item_values), (out_liners_count, in_liners_count, _) in zip(straddling_groups,
+                                                                                     explanations_counts):
+        if out_liners_count <= min_num_of_outliners:
+            continue
+        item_set = create_frequent_item_set(attributes, item_attributes, item_values, out_liners_count,
+                                            in_liners_count, total_number_of_rows, total_number_of_out_liners,
+                                            min_confidence, min_risk)
+        if item_set is not None:
+            records.append((item_attributes, item_values, item_set.risk_ratio, item_set.occurrence_ratio,
+                            item_set.support_ratio, item_set.confidence, True))
+
+    if debug_print:
+        print(f'sampled {sampled_out_liners} of {total_number_of_out_liners} outliners and {sampled_in_liners} of '
+              f'{total_in_liners_stratum} in-liners, {len(sampled_groups)} item sets screened, '
+              f'{len(straddling_groups)} verified exactly, {sum(not record[-1] for record in records)} estimated')
+
+    final_items = FrequentItemSets.from_records(attributes, records)
+    final_items.sort()
+    return final_items
 
 
 def get_frequent_sets_from_DB(
@@ -139,8 +1141,12 @@ def get_frequent_sets_from_DB(
         outliners_sql_filter_query: str,
         general_db_filter_query: str,
         max_length: int = 8,
-        debug_print: bool = True
-) -> list[FrequentItemSet]:
+        debug_print: bool = True,
+        backend: str = SQL_BACKEND,
+        drift_log=None,
+        sample_error: float = None,
+        sample_confidence: float = 0.95
+) -> FrequentItemSets:
     """
     Compute item sets with at-least min_support from transactions by building the item sets bottom up and
     iterating over the transactions to compute the support repeatedly.
@@ -153,187 +1159,63 @@ def get_frequent_sets_from_DB(
     :param attributes: the attributes to consider for the item sets
     :param max_length: the max length of a frequent set
     :param debug_print: whether to print some debug info while running
-    :return: a list of the FrequentItemSet Data Class, where the attributes that aren't part of the item
-    set have the value '-'.
+    :param backend: SQL_BACKEND to count with group by queries on the DB, NUMPY_BACKEND to load the filtered rows once
+    and count them in memory, FP_GROWTH_BACKEND to mine the loaded rows with FP-Growth, BITMAP_BACKEND to count with
+    a BitmapIndex of the loaded rows, CUBE_BACKEND to roll up a CountCube loaded with one query, SUMMARY_BACKEND to
+    roll up the incrementally updated DriftLogSummary - all return the same item sets.
+    :param drift_log: an already loaded ColumnarDriftLog, CountCube or BitmapIndex to mine (e.g. the planner's
+    in-memory counterfactual drift), its own outliners are used instead of outliners_sql_filter_query.
+    FP_GROWTH_BACKEND mines a ColumnarDriftLog with FP-Growth and the other drift logs with the Apriori loop, any other
+    backend counts with the provided drift_log.
+    :param sample_error: if provided, mine approximately (see get_frequent_sets_from_sample) - the item sets are
+    screened on a sample of the DB rows sized so the confidence intervals of their outliners and in-liners
+    proportions are at most this wide on each side, e.g. 0.01. SQL_BACKEND only.
+    :param sample_confidence: the confidence level of these intervals.
+    :return: the item sets as a FrequentItemSets, a compact sequence of the FrequentItemSet Data Class (built on
+    access), where the attributes that aren't part of the item set have the value '-'. With sample_error, the item
+    sets that weren't counted exactly have verified=False.
     """
-    if not (isinstance(min_occurrences, float) and (0 <= min_occurrences <= 1)):
-        raise ValueError("`min_occurrences` must be a number between 0 and 1.")
-
-    if not (isinstance(min_support, float) and (0 <= min_support <= 1)):
-        raise ValueError("`min_support` must be a number between 0 and 1.")
-
-    if not (isinstance(min_confidence, float) and (0 <= min_confidence <= 1)):
-        raise ValueError("`min_confidence` must be a number between 0 and 1.")
+    validate_thresholds(min_occurrences, min_support, min_confidence)
 
-    total_number_of_rows = GetTotalRowsCount(general_db_filter_query)
-    total_number_of_out_liners = GetTotalOutLinersCount(outliners_sql_filter_query, general_db_filter_query)
+    if sample_error is not None:
+        if backend != SQL_BACKEND or drift_log is not None:
+            raise ValueError("`sample_error` samples the DB rows, it needs the SQL_BACKEND and no drift_log.")
+        if not (0 < sample_error < 1 and 0 < sample_confidence < 1):
+            raise ValueError("`sample_error` and `sample_confidence` must be numbers between 0 and 1.")
 
-    if total_number_of_rows < 1:
-        raise Exception("DB is Empty")
+        return get_frequent_sets_from_sample(attributes, min_occurrences, min_support, min_confidence, min_risk,
+                                             outliners_sql_filter_query, general_db_filter_query, max_length,
+                                             sample_error, sample_confidence, debug_print)
 
-    # no out_liners --> no work needed
-    if total_number_of_out_liners < 1:
-        return []
-
-    min_number_of_outliners_for_occurrence_condition = total_number_of_rows * min_occurrences
-    min_number_of_outliners_for_supp_condition = total_number_of_out_liners * min_support
+    total_number_of_rows, total_number_of_out_liners, frequent_groups = count_frequent_groups(
+        attributes, min_occurrences, min_support, outliners_sql_filter_query, general_db_filter_query, max_length,
+        backend, drift_log)
 
-    min_num_of_outliners = max(min_number_of_outliners_for_supp_condition,
-                               min_number_of_outliners_for_occurrence_condition)
-
-    # example of attr_values_with_high_support_by_set_size (contains only the sets of values with high enough support):
-    # {1: [
-    #   (['weather'], ['clear-day', 'rain']),
-    #   (['location'], ['New South Wales', 'California', 'New York', 'Quebec', 'Beijing', 'Tibet', 'United Kingdom', 'Worst20classes']),
-    #   (['model_type'], ['Resnet50'])
-    #   ]}
-    attr_values_with_high_support_by_set_size = {}
-
-    k = 1
-    attr_values_with_high_support_by_set_size[k] = []
-    final_items = []
-
-    for attr in attributes:
-        attr_counts = GetOutLinersCountGroupedByProvidedAttributes([attr], outliners_sql_filter_query,
-                                                                   general_db_filter_query)
-        curr_attr_vals = []
-        for attr_val in attr_counts:
-            # attr_val looks like: (1060, 'New South Wales')
-
-            curr_out_liners_count = attr_val[0]
-
-            # this is a check for min_occurrences and min_support
-            if curr_out_liners_count > min_num_of_outliners:
-                curr_attr_vals.append([attr_val[1]])
-
-                curr_in_liners_count = GetCountInLinersProvidedAttributes([attr], [attr_val[1]],
-                                                                          outliners_sql_filter_query,
-                                                                          general_db_filter_query)
-
-                # this is the min confidence check:
-                curr_confidence = (curr_out_liners_count / (curr_in_liners_count + curr_out_liners_count))
-                if curr_confidence >= min_confidence:
-
-                    b_o = total_number_of_out_liners - curr_out_liners_count
-
-                    # to prevent dividing by 0 in case b_o == 0, this shouldn't happen
-                    if b_o == 0:
-                        raise Exception("support not added for inf risk - shouldn't happen")
-                    else:
-                        total_in_liners_count = total_number_of_rows - total_number_of_out_liners
-                        b_i = total_in_liners_count - curr_in_liners_count
-                        curr_risk = curr_confidence / (b_o / (b_o + b_i))
-                        # this is the min risk check:
-                        if curr_risk >= min_risk:
-                            # we append the attribute's value
-                            final_attrs = {}
-                            for attribute in attributes:
-                                if attribute == attr:
-                                    final_attrs[attribute] = attr_val[1]
-                                else:
-                                    final_attrs[attribute] = '-'
-
-                            final_items.append(FrequentItemSet(risk_ratio=curr_risk,
-                                                               occurrence_ratio=(
-                                                                       curr_out_liners_count / total_number_of_rows),
-                                                               support_ratio=(
-                                                                       curr_out_liners_count / total_number_of_out_liners),
-                                                               confidence=curr_confidence,
-                                                               attributes=final_attrs))
-
-        if len(curr_attr_vals) > 0:
-            attr_values_with_high_support_by_set_size[k].append(([attr], curr_attr_vals))
-
-    k += 1
-    while k <= max_length and k <= len(attributes):
-        attr_values_with_high_support_by_set_size[k] = []
-        #
-        # for attr_set1 in attr_values_with_high_support_by_set_size[k - 1]:
-        #     for attr_set2 in attr_values_with_high_support_by_set_size[k - 1]:
-        visited = set()
-
-        for i in range(len(attr_values_with_high_support_by_set_size[k - 1])):
-            j = i + 1
-            while j < len(attr_values_with_high_support_by_set_size[k - 1]):
-                attr_set1 = attr_values_with_high_support_by_set_size[k - 1][i]
-                attr_set2 = attr_values_with_high_support_by_set_size[k - 1][j]
-                combined_set_of_attributes = set(attr_set1[0] + attr_set2[0])
-                if len(combined_set_of_attributes) != k or combined_set_of_attributes.__hash__ in visited:
-                    j += 1
-                    continue
-                else:
-                    visited.add(combined_set_of_attributes.__hash__)
-                    # here we know we have two lists of attributes with k-1 common fields.
-                    # TODO: consider query by each supported value and not the attributes and compare performance
-                    attr_counts = GetOutLinersCountGroupedByProvidedAttributes(combined_set_of_attributes,
-                                                                               outliners_sql_filter_query,
-                                                                               general_db_filter_query)
-
-                    curr_attr_vals = []
-                    for attr_val in attr_counts:
-                        # attr_val looks like: (1060, 'New South Wales', 'rain')
-                        curr_out_liners_count = attr_val[0]
-
-                        # this is a check for min_supp, min_occurrences
-                        if curr_out_liners_count > min_num_of_outliners:
-                            # we append the attribute's values
-                            list_of_attribute_vals = list(attr_val)[1:]
-                            list_of_attribute_names = list(combined_set_of_attributes)
-
-                            # add to high support items (frequent) for FIM.
-                            curr_attr_vals.append(list_of_attribute_vals)
-
-                            curr_in_liners_count = GetCountInLinersProvidedAttributes(list_of_attribute_names,
-                                                                                      list_of_attribute_vals,
-                                                                                      outliners_sql_filter_query,
-                                                                                      general_db_filter_query)
-                            # this is the min confidence check:
-                            curr_confidence = (curr_out_liners_count / (curr_in_liners_count + curr_out_liners_count))
-
-                            if curr_confidence >= min_confidence:
-                                b_o = total_number_of_out_liners - curr_out_liners_count
-
-                                # to prevent dividing by 0 in case b_o == 0
-                                if b_o == 0:
-                                    curr_attr_vals.append(list_of_attribute_vals)
-                                else:
-                                    total_in_liners_count = total_number_of_rows - total_number_of_out_liners
-                                    b_i = total_in_liners_count - curr_in_liners_count
-                                    curr_risk = curr_confidence / (b_o / (b_o + b_i))
-                                    # this is the min risk check:
-                                    if curr_risk >= min_risk:
-                                        # we append the attribute's value
-                                        final_attrs = {}
-                                        for i in range(len(list_of_attribute_names)):
-                                            final_attrs[list_of_attribute_names[i]] = list_of_attribute_vals[i]
-                                        for attribute in attributes:
-                                            if attribute not in final_attrs:
-                                                final_attrs[attribute] = '-'
-
-                                        final_items.append(FrequentItemSet(risk_ratio=curr_risk,
-                                                                           occurrence_ratio=(
-                                                                                   curr_out_liners_count / total_number_of_rows),
-                                                                           support_ratio=(
-                                                                                   curr_out_liners_count / total_number_of_out_liners),
-                                                                           confidence=curr_confidence,
-                                                                           attributes=final_attrs))
-
-                    if len(curr_attr_vals) > 0:
-                        attr_values_with_high_support_by_set_size[k].append(
-                            (list(combined_set_of_attributes), curr_attr_vals))
-
-                j += 1
-
-        k += 1
+    final_items = frequent_groups_to_item_sets(attributes, frequent_groups, total_number_of_rows,
+                                               total_number_of_out_liners, min_occurrences, min_support,
+                                               min_confidence, min_risk, max_length)
 
     if debug_print:
+        # example of attr_values_with_high_support_by_set_size (contains only the sets of values with high enough
+        # support):
+        # {1: [
+        #   (['weather'], [['clear-day'], ['rain']]),
+        #   (['location'], [['New South Wales'], ['California'], ['New York'], ['Quebec'], ['Beijing'], ['Tibet']]),
+        #   (['model_type'], [['Resnet50']])
+        #   ]}
+        attr_values_with_high_support_by_set_size = {}
+        for item_attributes, item_values, _, _ in frequent_groups:
+            size_item_sets = attr_values_with_high_support_by_set_size.setdefault(len(item_attributes), [])
+            if not size_item_sets or size_item_sets[-1][0] != list(item_attributes):
+                size_item_sets.append((list(item_attributes), []))
+            size_item_sets[-1][1].append(list(item_values))
+
         print(f'the final frequent item sets in the DB with min occurrences {min_occurrences}:')
         print(attr_values_with_high_support_by_set_size)
         print("------------------------------------------------------------------------------------------")
         print("final items:")
         print(final_items)
 
-    final_items.sort()
     return final_items
 
 
@@ -345,10 +1227,42 @@ def get_explanations_ordered_list(attributes: list[str],
                                   outliners_sql_filter_query: str,
                                   general_db_filter_query: str,
                                   max_length: int = 8,
-                                  debug_print: bool = True) -> list[tuple[str]]:
+                                  debug_print: bool = True,
+                                  backend: str = SQL_BACKEND,
+                                  drift_log=None,
+                                  use_cache: bool = False,
+                                  with_attributes: bool = False) -> list[tuple]:
     """
     This returns exactly what Wei's code expects e_list_ to contain.
+    :param with_attributes: whether every explanation is a tuple of (attribute, value) pairs instead of values - the
+    values alone don't tell which attribute a value that several attributes have (e.g. None) belongs to.
+    :param use_cache: return the cached result of a previous call with the same arguments if the filtered rows didn't
+    change since (see GetDriftLogFingerprint, and DriftLogFiles.fingerprint for PARQUET_BACKEND). Ignored when a
+    drift_log is provided, as its counterfactual drift isn't in the DB.
     """
+    cache_key = None
+    if use_cache and drift_log is None:
+        # the in-memory copies the backend mines are checked against the same fingerprint. The backend is part of the
+        # key all the same, so a source a backend can't check (e.g. an older row updated under the append only
+        # DriftLogSummary) never leaks into the results of the other backends.
+        drift_log_key = (tuple(attributes), outliners_sql_filter_query, general_db_filter_query)
+        if backend == PARQUET_BACKEND:
+            source = (DRIFT_LOG_FILES_DIR,)
+            drift_log_key = source + drift_log_key
+            fingerprint = GetDriftLogFiles().fingerprint(general_db_filter_query)
+        else:
+            source = (schema_name, table_name)
+            fingerprint = GetDriftLogFingerprint(attributes, outliners_sql_filter_query, general_db_filter_query)
+        invalidate_stale_drift_logs(drift_log_key, fingerprint)
+        cache_key = source + (backend, tuple(attributes), min_occurrences, min_support, min_confidence, min_risk,
+                              outliners_sql_filter_query, general_db_filter_query, max_length, DELETE_SMALL_DUPLICATE,
+                              with_attributes, fingerprint)
+        cached_explanations = GetMiningCache().get(cache_key)
+        if cached_explanations is not None:
+            # the pairs come back from JSON as lists.
+            return [tuple(map(tuple, explanation)) if with_attributes else tuple(explanation)
+                    for explanation in cached_explanations]
+
     frequent_outliners_item_sets = get_frequent_sets_from_DB(attributes,
                                                              min_occurrences,
                                                              min_support,
@@ -357,28 +1271,148 @@ def get_explanations_ordered_list(attributes: list[str],
                                                              outliners_sql_filter_query,
                                                              general_db_filter_query,
                                                              max_length,
-                                                             debug_print)
+                                                             debug_print,
+                                                             backend,
+                                                             drift_log)
+
+    remove_duplicate_item_sets(frequent_outliners_item_sets)
+
+    explanations = item_sets_to_explanations(frequent_outliners_item_sets, with_attributes)
+    if cache_key is not None:
+        GetMiningCache().put(cache_key, explanations)
 
-    for i in range(len(frequent_outliners_item_sets)):
-        j = i + 1
-        while j < len(frequent_outliners_item_sets):
-            if frequent_outliners_item_sets[i].confidence == frequent_outliners_item_sets[j].confidence \
-                    and frequent_outliners_item_sets[i].risk_ratio == frequent_outliners_item_sets[j].risk_ratio \
-                    and frequent_outliners_item_sets[i].occurrence_ratio == frequent_outliners_item_sets[
-                j].occurrence_ratio \
-                    and frequent_outliners_item_sets[i].support_ratio == frequent_outliners_item_sets[j].support_ratio:
-                frequent_outliners_item_sets.remove(
-                    get_set_to_delete(frequent_outliners_item_sets[i], frequent_outliners_item_sets[j]))
+    return list(explanations)
 
-            j += 1
+
+def sweep_explanations_ordered_lists(attributes: list[str],
+                                     thresholds_grid: list[dict],
+                                     outliners_sql_filter_query: str,
+                                     general_db_filter_query: str,
+                                     backend: str = SQL_BACKEND,
+                                     drift_log=None,
+                                     with_attributes: bool = False) -> list[list[tuple]]:
+    """
+    get_explanations_ordered_list for every point of a thresholds grid, from a single counting pass with the loosest
+    min_occurrences, min_support and max_length of the grid - every point then only filters the counted groups.
+    :param thresholds_grid: dicts of min_occurrences, min_support, min_confidence, min_risk and optionally max_length
+    (defaults to 8), example: [{'min_occurrences': 0.01, 'min_support': 0.01, 'min_confidence': 0.51, 'min_risk': 1.1}]
+    :param with_attributes: see get_explanations_ordered_list.
+    :return: the explanations list of every grid point, in the grid order.
+    """
+    if not thresholds_grid:
+        return []
+
+    for thresholds in thresholds_grid:
+        validate_thresholds(thresholds['min_occurrences'], thresholds['min_support'], thresholds['min_confidence'])
+
+    total_number_of_rows, total_number_of_out_liners, frequent_groups = count_frequent_groups(
+        attributes,
+        min(thresholds['min_occurrences'] for thresholds in thresholds_grid),
+        min(thresholds['min_support'] for thresholds in thresholds_grid),
+        outliners_sql_filter_query,
+        general_db_filter_query,
+        max(thresholds.get('max_length', 8) for thresholds in thresholds_grid),
+        backend,
+        drift_log)
+
+    explanations_lists = []
+    for thresholds in thresholds_grid:
+        frequent_outliners_item_sets = frequent_groups_to_item_sets(attributes, frequent_groups, total_number_of_rows,
+                                                                    total_number_of_out_liners,
+                                                                    thresholds['min_occurrences'],
+                                                                    thresholds['min_support'],
+                                                                    thresholds['min_confidence'],
+                                                                    thresholds['min_risk'],
+                                                                    thresholds.get('max_length', 8))
+        remove_duplicate_item_sets(frequent_outliners_item_sets)
+        explanations_lists.append(item_sets_to_explanations(frequent_outliners_item_sets, with_attributes))
+
+    return explanations_lists
+
+
+def rolling_windows(first_date, last_date, window_days: int, step_days: int = 1) -> list[tuple]:
+    """
+    :return: the (first date, last date) of every window of window_days days, starting every step_days days from
+    first_date, until a window would end after last_date.
+    """
+    first_date = parse_date(first_date)
+    last_date = parse_date(last_date)
+    windows = []
+    while first_date + datetime.timedelta(days=window_days - 1) <= last_date:
+        windows.append((first_date, first_date + datetime.timedelta(days=window_days - 1)))
+        first_date += datetime.timedelta(days=step_days)
+
+    return windows
+
+
+def rolling_explanations_ordered_lists(attributes: list[str],
+                                       windows: list[tuple],
+                                       min_occurrences: float,
+                                       min_support: float,
+                                       min_confidence: float,
+                                       min_risk: float,
+                                       outliners_sql_filter_query: str,
+                                       max_length: int = 8) -> list[list[tuple[str]]]:
+    """
+    get_explanations_ordered_list for every date window, instead of a general_db_filter_query. The counts per
+    (date, attributes values) are loaded once (see GetDateBucketsCountCube) and every window adds up its dates, so N
+    windows cost one (incremental) scan of the drift log and N in-memory minings.
+    :param windows: (first date, last date) pairs, both inclusive and None for unbounded, see rolling_windows.
+    :return: the explanations list of every window, in the windows order.
+    """
+    date_buckets = GetDateBucketsCountCube(attributes, outliners_sql_filter_query)
+
+    explanations_lists = []
+    for first_date, last_date in windows:
+        explanations_lists.append(get_explanations_ordered_list(
+            attributes, min_occurrences, min_support, min_confidence, min_risk, outliners_sql_filter_query,
+            general_db_filter_query="1 = 1", max_length=max_length, debug_print=False, backend=CUBE_BACKEND,
+            drift_log=get_window_count_cube(date_buckets, attributes, first_date, last_date)))
+
+    return explanations_lists
+
+
+def remove_duplicate_item_sets(frequent_outliners_item_sets):
+    """
+    Removes (in place) item sets with the same metrics, keeping the one chosen by get_set_to_delete.
+    Item sets are bucketed by their (confidence, risk, occurrence, support) tuple, and the survivor of every bucket is
+    chosen by applying get_set_to_delete to the current survivor and each next item set of the bucket, in list order -
+    so this runs in linear time and the result doesn't depend on removals shifting the list.
+    :param frequent_outliners_item_sets: a list of FrequentItemSet or a FrequentItemSets.
+    """
+    if isinstance(frequent_outliners_item_sets, FrequentItemSets):
+        frequent_outliners_item_sets.remove_duplicates(DELETE_SMALL_DUPLICATE)
+        return
+
+    survivors = {}
+    for item_set in frequent_outliners_item_sets:
+        metrics = (item_set.confidence, item_set.risk_ratio, item_set.occurrence_ratio, item_set.support_ratio)
+        survivor = survivors.get(metrics)
+        if survivor is None:
+            survivors[metrics] = item_set
+        elif get_set_to_delete(survivor, item_set) is survivor:
+            survivors[metrics] = item_set
+
+    kept = set(map(id, survivors.values()))
+    frequent_outliners_item_sets[:] = [item_set for item_set in frequent_outliners_item_sets if id(item_set) in kept]
+
+
+def item_sets_to_explanations(frequent_outliners_item_sets, with_attributes: bool = False) -> list[tuple]:
+    """
+    :param frequent_outliners_item_sets: a list of FrequentItemSet or a FrequentItemSets, ordered by risk.
+    :param with_attributes: whether to return the (attribute, value) pairs of every item set instead of its values.
+    :return: the values tuple of every item set, from the highest risk to the lowest.
+    """
+    if isinstance(frequent_outliners_item_sets, FrequentItemSets):
+        return frequent_outliners_item_sets.explanations(with_attributes)
 
     explanations_list = []
 
     for frequent_item_set in frequent_outliners_item_sets:
         vals_list = []
-        for val in frequent_item_set.attributes.values():
+        for attr, val in frequent_item_set.attributes.items():
             if val != '-':
-                vals_list.append(val)
+                vals_list.append((attr, val) if with_attributes else val)
 
         explanations_list.append(tuple(vals_list))
 
@@ -387,55 +1421,61 @@ def get_explanations_ordered_list(attributes: list[str],
 
 
 def get_distinct_values_of_field(att: str):
-    cnx = GetDBContext()
-    cursor = cnx.cursor()
-    cursor.execute(
-        "SELECT DISTINCT " + att + " FROM " + schema_name + "." + table_name)
-    res = cursor.fetchall()
-
-    cursor.close()
-    cnx.close()
+    res = run_query("SELECT DISTINCT " + att + " FROM " + schema_name + "." + table_name)
     return res
 
 
 def reset_counter_factual_drift_col():
-    cnx = GetDBContext()
-    cursor = cnx.cursor()
-    cursor.execute("UPDATE " + schema_name + "." + table_name + " SET counter_drift = signal_1or2")
-    res = cursor.fetchall()
-
-    cnx.commit()
-    cursor.close()
-    cnx.close()
+    res = run_query("UPDATE " + schema_name + "." + table_name + " SET counter_drift = signal_1or2", commit=True)
+    clear_columnar_drift_logs()
     return res
 
 
 def set_counter_drift_to_zero(attribute_name, attribute_value):
-    cnx = GetDBContext()
-    cursor = cnx.cursor()
-    cursor.execute(
-        "UPDATE " + schema_name + "." + table_name + " SET counter_drift = '0' WHERE " + attribute_name + " = '" + attribute_value + "'")
-    res = cursor.fetchall()
-
-    cnx.commit()
-    cursor.close()
-    cnx.close()
+    res = run_query(
+        "UPDATE " + schema_name + "." + table_name + " SET counter_drift = 0 WHERE " + attribute_name + " <=> %s",
+        commit=True, params=[attribute_value])
+    clear_columnar_drift_logs()
     return res
 
 
-def get_attributes_values(attributes: list[str]):
+def set_explanation_counter_drift_to_zero(attribute_values: list[tuple], outliners_sql_filter_query: str,
+                                          general_db_filter_query: str,
+                                          covered_explanations_to_count: list[list[tuple]] = None,
+                                          explanations_to_count: list[list[tuple]] = None) -> tuple[list, list]:
     """
-    :return: a mapping from each possible value in the DB to it's attribute
-    for example, rain --> weather
+    Zeroes counter_drift of the rows set_counter_drift_to_zero would zero for any of the (attribute, value) pairs with
+    a single UPDATE, in one transaction with the counts the planner needs around it.
+    :param outliners_sql_filter_query: the counterfactual drift, example: "counter_drift = 1"
+    :param covered_explanations_to_count: explanations counted on the rows the update covers, before it
+    :param explanations_to_count: explanations counted on the filtered rows, after the update
+    :return: the counts (as returned by GetCountsOfExplanations) of covered_explanations_to_count and of
+    explanations_to_count, None for the ones not provided.
     """
-    mappings = {}
-
-    for attr in attributes:
-        vals = get_distinct_values_of_field(attr)
-        for val in vals:
-            mappings[val[0]] = attr
-
-    return mappings
+    covered_condition, covered_params = explanation_sql(attribute_values, ' OR ')
+
+    statements = []
+    if covered_explanations_to_count is not None:
+        statements += GetCountsOfExplanationsQueries(covered_explanations_to_count, outliners_sql_filter_query,
+                                                     general_db_filter_query + " AND (" + covered_condition + ")",
+                                                     covered_params)
+    covered_statements = len(statements)
+    statements.append(("UPDATE " + schema_name + "." + table_name + " SET counter_drift = 0 WHERE " + covered_condition,
+                       covered_params))
+    if explanations_to_count is not None:
+        statements += GetCountsOfExplanationsQueries(explanations_to_count, outliners_sql_filter_query,
+                                                     general_db_filter_query)
+
+    res = run_transaction(statements)
+    clear_columnar_drift_logs()
+
+    covered_counts = None
+    if covered_explanations_to_count is not None:
+        covered_counts = [counts for rows in res[:covered_statements] for counts in parse_explanations_counts(rows[0])]
+    counts = None
+    if explanations_to_count is not None:
+        counts = [counts for rows in res[covered_statements + 1:] for counts in parse_explanations_counts(rows[0])]
+    return covered_counts, counts
 
 
 if __name__ == '__main__':
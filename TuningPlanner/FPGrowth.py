@@ -0,0 +1,165 @@
+"""
+FP-Growth mining engine over a ColumnarDriftLog, selectable instead of the level by level Apriori loop.
+The outliner rows are compressed into a prefix tree (FP-tree) in one scan, all the item sets up to max_length are
+mined from that tree, and the in-liners counts of the mined item sets are read from a second FP-tree of the
+in-liner rows. An item is an (attribute position, value code) pair.
+"""
+import numpy as np
+from ColumnarDriftLog import ColumnarDriftLog
+
+
+class FPNode:
+    __slots__ = ('item', 'count', 'parent', 'children', 'next')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+        self.next = None
+
+
+class FPTree:
+    """
+    :param item_rank: the position of every item in the transactions, items missing from it are dropped.
+    """
+
+    def __init__(self, item_rank: dict):
+        self.item_rank = item_rank
+        self.root = FPNode(None, None)
+        self.header = {}
+        self.item_counts = {}
+
+    def insert(self, items, count: int):
+        """
+        :param items: the transaction's items, already ordered by item_rank
+        :param count: the number of identical transactions
+        """
+        node = self.root
+        for item in items:
+            child = node.children.get(item)
+            if child is None:
+                child = FPNode(item, node)
+                node.children[item] = child
+                child.next = self.header.get(item)
+                self.header[item] = child
+            child.count += count
+            self.item_counts[item] = self.item_counts.get(item, 0) + count
+            node = child
+
+    def prefix_paths(self, item):
+        """
+        :return: (path, count) for every node of the item, the path is the items above it from the root down.
+        """
+        node = self.header.get(item)
+        while node is not None:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            path.reverse()
+            yield path, node.count
+            node = node.next
+
+    def count(self, items) -> int:
+        """
+        :return: the number of transactions that contain all the items.
+        """
+        items = sorted(items, key=self.item_rank.__getitem__)
+        others = set(items[:-1])
+        total = 0
+        for path, count in self.prefix_paths(items[-1]):
+            if others.issubset(path):
+                total += count
+
+        return total
+
+
+def build_fp_tree(transactions: np.ndarray, counts: np.ndarray, item_rank: dict) -> FPTree:
+    """
+    :param transactions: one row of attribute codes per distinct transaction
+    :param counts: the number of rows of every distinct transaction
+    """
+    tree = FPTree(item_rank)
+    for transaction, count in zip(transactions.tolist(), counts.tolist()):
+        items = [item for item in enumerate(transaction) if item in item_rank]
+        items.sort(key=item_rank.__getitem__)
+        tree.insert(items, count)
+
+    return tree
+
+
+def distinct_transactions(drift_log: ColumnarDriftLog, attributes: list[str], rows: np.ndarray):
+    """
+    :return: the distinct attribute codes rows among the selected rows, and how many times each one appears.
+    """
+    stacked_codes = np.stack([drift_log.codes[attr][rows] for attr in attributes], axis=1)
+    if len(stacked_codes) == 0:
+        return stacked_codes, np.zeros(0, dtype=np.int64)
+    return np.unique(stacked_codes, axis=0, return_counts=True)
+
+
+def mine_tree(tree: FPTree, suffix: tuple, min_out_liners_count: float, max_length: int, results: list):
+    # least frequent items first, every conditional tree keeps the global item order.
+    for item in sorted(tree.item_counts, key=tree.item_rank.__getitem__, reverse=True):
+        count = tree.item_counts[item]
+        if count <= min_out_liners_count:
+            continue
+
+        item_set = (item,) + suffix
+        results.append((item_set, count))
+        if len(item_set) >= max_length:
+            continue
+
+        conditional_counts = {}
+        paths = list(tree.prefix_paths(item))
+        for path, path_count in paths:
+            for path_item in path:
+                conditional_counts[path_item] = conditional_counts.get(path_item, 0) + path_count
+
+        conditional_rank = {path_item: tree.item_rank[path_item] for path_item, path_item_count
+                            in conditional_counts.items() if path_item_count > min_out_liners_count}
+        if not conditional_rank:
+            continue
+
+        conditional_tree = FPTree(conditional_rank)
+        for path, path_count in paths:
+            conditional_tree.insert([path_item for path_item in path if path_item in conditional_rank], path_count)
+        mine_tree(conditional_tree, item_set, min_out_liners_count, max_length, results)
+
+
+def mine_frequent_item_sets(drift_log: ColumnarDriftLog, attributes: list[str], min_out_liners_count: float,
+                            max_length: int) -> list[tuple]:
+    """
+    :return: every item set with more outliners than min_out_liners_count and at most max_length attributes, as
+    (attributes tuple, values tuple, outliners count, in-liners count) in the order the Apriori loop finds them:
+    by size, then by the position of the attributes in `attributes`, then by values.
+    """
+    out_liners_transactions, out_liners_counts = distinct_transactions(drift_log, attributes, drift_log.is_out_liner)
+
+    item_counts = {}
+    for transaction, count in zip(out_liners_transactions.tolist(), out_liners_counts.tolist()):
+        for item in enumerate(transaction):
+            item_counts[item] = item_counts.get(item, 0) + count
+
+    frequent_items = sorted((item for item, count in item_counts.items() if count > min_out_liners_count),
+                            key=lambda item: (-item_counts[item], item))
+    item_rank = {item: rank for rank, item in enumerate(frequent_items)}
+
+    mined = []
+    mine_tree(build_fp_tree(out_liners_transactions, out_liners_counts, item_rank), (), min_out_liners_count,
+              max(max_length, 1), mined)
+
+    in_liners_tree = build_fp_tree(*distinct_transactions(drift_log, attributes, drift_log.is_in_liner), item_rank)
+
+    res = []
+    for item_set, out_liners_count in mined:
+        item_set = sorted(item_set)
+        item_attributes = tuple(attributes[position] for position, _ in item_set)
+        item_values = tuple(drift_log.dictionaries[attributes[position]][code] for position, code in item_set)
+        res.append((item_attributes, item_values, out_liners_count, in_liners_tree.count(item_set)))
+
+    res.sort(key=lambda item_set: (len(item_set[0]), [attributes.index(attr) for attr in item_set[0]],
+                                   tuple(str(val) for val in item_set[1])))
+    return res
@@ -1,4 +1,8 @@
 from dataclasses import dataclass
+import numpy as np
+
+# marks the attributes that aren't part of an item set in FrequentItemSets.explanations.
+_ABSENT = object()
 
 
 @dataclass
@@ -8,6 +12,8 @@ class FrequentItemSet:
     occurrence_ratio: float
     support_ratio: float
     confidence: float
+    # False when the ratios are estimated from a sample of the rows (see get_frequent_sets_from_DB's sample_error).
+    verified: bool = True
 
     def __instancecheck__(self, risk, occurrences, supp, conf, attributes):
         self.risk_ratio = risk
@@ -18,3 +24,118 @@ class FrequentItemSet:
 
     def __lt__(self, other):
         return self.risk_ratio < other.risk_ratio
+
+
+class FrequentItemSets:
+    """
+    Compact sequence of item sets: the metrics are columns of a numpy structured array, and the values are integer
+    codes into per-attribute dictionaries (-1 for an attribute that isn't part of the item set) instead of a padded
+    dict per item set. Indexing and iterating build the FrequentItemSet of an item set on demand, slicing returns a
+    FrequentItemSets.
+    """
+
+    METRICS_DTYPE = np.dtype([('risk_ratio', np.float64), ('occurrence_ratio', np.float64),
+                              ('support_ratio', np.float64), ('confidence', np.float64), ('verified', np.bool_)])
+
+    def __init__(self, attributes: list[str], dictionaries: list[list], codes: np.ndarray, metrics: np.ndarray):
+        self.attributes = list(attributes)
+        self.dictionaries = dictionaries
+        self.codes = codes
+        self.metrics = metrics
+
+    @classmethod
+    def from_records(cls, attributes: list[str], records: list[tuple]):
+        """
+        :param records: (item attributes, item values, risk ratio, occurrence ratio, support ratio, confidence,
+        verified) of every item set.
+        """
+        position = {attr: i for i, attr in enumerate(attributes)}
+        value_codes = [{} for _ in attributes]
+        codes = np.full((len(records), len(attributes)), -1, dtype=np.int32)
+        for row, (item_attributes, item_values, *_) in enumerate(records):
+            for attr, val in zip(item_attributes, item_values):
+                i = position[attr]
+                codes[row, i] = value_codes[i].setdefault(val, len(value_codes[i]))
+
+        metrics = np.array([tuple(record[2:]) for record in records], dtype=cls.METRICS_DTYPE)
+        return cls(attributes, [list(dictionary) for dictionary in value_codes], codes, metrics)
+
+    def __len__(self) -> int:
+        return len(self.metrics)
+
+    def __getitem__(self, i):
+        """
+        :return: the FrequentItemSet at an index, or a FrequentItemSets of the item sets of a slice (sharing the
+        dictionaries).
+        """
+        if isinstance(i, slice):
+            return FrequentItemSets(self.attributes, self.dictionaries, self.codes[i], self.metrics[i])
+
+        risk_ratio, occurrence_ratio, support_ratio, confidence, verified = self.metrics[i].item()
+        return FrequentItemSet(risk_ratio=risk_ratio, occurrence_ratio=occurrence_ratio, support_ratio=support_ratio,
+                               confidence=confidence, verified=verified,
+                               attributes={attr: '-' if code < 0 else dictionary[code] for attr, dictionary, code in
+                                           zip(self.attributes, self.dictionaries, self.codes[i].tolist())})
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __eq__(self, other) -> bool:
+        return self.to_list() == list(other)
+
+    def __repr__(self) -> str:
+        return repr(self.to_list())
+
+    def to_list(self) -> list[FrequentItemSet]:
+        return list(self)
+
+    def take(self, indices: np.ndarray):
+        """
+        Keeps (in place) only the item sets at these indices, in their order.
+        """
+        self.codes = self.codes[indices]
+        self.metrics = self.metrics[indices]
+
+    def sort(self):
+        """
+        Sorts (in place) by risk, keeping the order of the item sets with the same risk (like list.sort with
+        FrequentItemSet.__lt__).
+        """
+        self.take(np.argsort(self.metrics['risk_ratio'], kind='stable'))
+
+    def lengths(self) -> np.ndarray:
+        """
+        :return: the number of attributes of every item set.
+        """
+        return np.count_nonzero(self.codes >= 0, axis=1)
+
+    def remove_duplicates(self, delete_small_duplicate: bool = False):
+        """
+        The vectorized remove_duplicate_item_sets: of every group of item sets with the same metrics, keeps the first
+        one with the fewest attributes (or the most, with delete_small_duplicate).
+        """
+        if len(self) == 0:
+            return
+
+        metrics = np.stack([self.metrics[name] for name in
+                            ('confidence', 'risk_ratio', 'occurrence_ratio', 'support_ratio')], axis=1)
+        _, buckets = np.unique(metrics, axis=0, return_inverse=True)
+        lengths = self.lengths()
+        order = np.lexsort((np.arange(len(self)), -lengths if delete_small_duplicate else lengths, buckets.reshape(-1)))
+        sorted_buckets = buckets.reshape(-1)[order]
+        first_of_bucket = np.ones(len(order), dtype=bool)
+        first_of_bucket[1:] = sorted_buckets[1:] != sorted_buckets[:-1]
+        self.take(np.sort(order[first_of_bucket]))
+
+    def explanations(self, with_attributes: bool = False) -> list[tuple]:
+        """
+        :param with_attributes: whether to return the (attribute, value) pairs of every item set instead of its values.
+        :return: the values tuple of every item set, from the last one to the first (the highest risk first once
+        sorted).
+        """
+        value_columns = [[_ABSENT if code < 0 else (attr, dictionary[code]) if with_attributes else dictionary[code]
+                          for code in column]
+                         for attr, dictionary, column in zip(self.attributes, self.dictionaries, self.codes.T.tolist())]
+        explanations_list = [tuple(val for val in values if val is not _ABSENT) for values in zip(*value_columns)]
+        explanations_list.reverse()
+        return explanations_list
@@ -0,0 +1,85 @@
+"""
+Memoization of mining results, in memory with LRU eviction and on local disk.
+Keys must include everything the result depends on - the call parameters and a fingerprint of the filtered rows - so
+a changed table simply produces a new key, and the stale entries are evicted (memory) or left unused (disk).
+Results are saved as JSON (a list of explanations comes back as a list of lists), in a directory only the user can
+access - the files are never unpickled, a file planted in a shared directory can't run code in the planner.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import stat
+
+
+class MiningCache:
+    """
+    :param max_entries: the number of results kept in memory, the least recently used ones are evicted first.
+    :param cache_dir: the directory results are also saved in, None to keep them only in memory. It is created with
+    mode 0o700, and must be owned by the user and not accessible to the others if it already exists.
+    """
+
+    def __init__(self, max_entries: int = 64, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key_hash(key) -> str:
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def _path(self, key_hash: str) -> str:
+        return os.path.join(self.cache_dir, key_hash + '.json')
+
+    def _private_cache_dir(self) -> str:
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        dir_stat = os.stat(self.cache_dir)
+        not_owned = hasattr(os, 'getuid') and dir_stat.st_uid != os.getuid()
+        if not_owned or dir_stat.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            raise PermissionError(f"the mining cache directory {self.cache_dir} isn't private to this user.")
+        return self.cache_dir
+
+    def get(self, key):
+        """
+        :return: the cached result of the key, None if it isn't cached.
+        """
+        key_hash = self.key_hash(key)
+        if key_hash in self._entries:
+            self._entries.move_to_end(key_hash)
+            return self._entries[key_hash]
+
+        if self.cache_dir is not None and self._private_cache_dir() and os.path.exists(self._path(key_hash)):
+            with open(self._path(key_hash)) as f:
+                value = json.load(f)
+            self._remember(key_hash, value)
+            return value
+
+        return None
+
+    def put(self, key, value):
+        key_hash = self.key_hash(key)
+        self._remember(key_hash, value)
+
+        if self.cache_dir is not None:
+            self._private_cache_dir()
+            # write then rename, so a concurrent reader never loads a partial file.
+            tmp_path = self._path(key_hash) + '.' + str(os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self._path(key_hash))
+
+    def _remember(self, key_hash: str, value):
+        self._entries[key_hash] = value
+        self._entries.move_to_end(key_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops the in-memory entries and the files saved in cache_dir.
+        """
+        self._entries.clear()
+        if self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith('.json'):
+                    os.remove(os.path.join(self.cache_dir, file_name))
@@ -0,0 +1,189 @@
+"""
+Tracing of the planner pipeline: every SQL statement (latency, rows returned and the phase it ran in), the candidates
+and survivors of every Apriori level, and the time spent in every planner phase.
+Nothing is recorded unless a trace was started with start_trace, and the trace is exported as a JSON report or as
+Prometheus text format metrics.
+"""
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+
+_current_trace = None
+
+
+class PlannerTrace:
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.queries = []
+        self.levels = []
+        self.phases = []
+        self._phases_stack = []
+        self._lock = threading.Lock()
+
+    def current_phase(self):
+        return self._phases_stack[-1] if self._phases_stack else None
+
+    def record_query(self, query: str, seconds: float, rows: int):
+        with self._lock:
+            self.queries.append({'query': query, 'seconds': seconds, 'rows': rows, 'phase': self.current_phase()})
+
+    def record_level(self, level: int, candidate_combinations: int, candidate_values, survivors: int):
+        """
+        :param candidate_combinations: the number of attribute combinations counted in this level
+        :param candidate_values: the number of values tuples counted, None if all the values were counted
+        :param survivors: the number of groups with enough outliners
+        """
+        with self._lock:
+            self.levels.append({'level': level, 'candidate_combinations': candidate_combinations,
+                                'candidate_values': candidate_values, 'survivors': survivors,
+                                'phase': self.current_phase()})
+
+    @contextmanager
+    def phase(self, name: str, **labels):
+        self._phases_stack.append(name)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            self._phases_stack.pop()
+            with self._lock:
+                self.phases.append({'phase': name, 'seconds': seconds, **labels})
+
+    def summary(self) -> dict:
+        phases = {}
+        for recorded_phase in self.phases:
+            phase_summary = phases.setdefault(recorded_phase['phase'], {'calls': 0, 'seconds': 0.0})
+            phase_summary['calls'] += 1
+            phase_summary['seconds'] += recorded_phase['seconds']
+
+        queries_by_phase = {}
+        for query in self.queries:
+            phase_summary = queries_by_phase.setdefault(query['phase'], {'queries': 0, 'seconds': 0.0, 'rows': 0})
+            phase_summary['queries'] += 1
+            phase_summary['seconds'] += query['seconds']
+            phase_summary['rows'] += query['rows']
+
+        return {'queries': len(self.queries),
+                'queries_seconds': sum(query['seconds'] for query in self.queries),
+                'rows': sum(query['rows'] for query in self.queries),
+                'phases': phases,
+                'queries_by_phase': queries_by_phase,
+                'slowest_queries': sorted(self.queries, key=lambda query: query['seconds'], reverse=True)[:10]}
+
+    def report(self) -> dict:
+        return {'start_time': self.start_time, 'summary': self.summary(), 'phases': self.phases,
+                'levels': self.levels, 'queries': self.queries}
+
+    def to_json(self, path: str = None) -> str:
+        report = json.dumps(self.report(), indent=2, default=str)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(report)
+        return report
+
+    def to_prometheus(self, prefix: str = 'nazar_planner') -> str:
+        """
+        :return: the totals of the trace in the Prometheus text exposition format (the statements themselves are only
+        in the JSON report, they would make an unbounded number of labels).
+        """
+        summary = self.summary()
+        lines = []
+
+        def add_metric(name: str, help_text: str, samples: list[tuple]):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for labels, value in samples:
+                labels_str = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f'{prefix}_{name}{{{labels_str}}} {value}' if labels_str else
+                             f'{prefix}_{name} {value}')
+
+        add_metric('sql_queries_total', 'SQL statements run.',
+                   [({'phase': phase or ''}, val['queries']) for phase, val in summary['queries_by_phase'].items()])
+        add_metric('sql_seconds_total', 'Time spent running SQL statements.',
+                   [({'phase': phase or ''}, val['seconds']) for phase, val in summary['queries_by_phase'].items()])
+        add_metric('sql_rows_total', 'Rows returned by SQL statements.',
+                   [({'phase': phase or ''}, val['rows']) for phase, val in summary['queries_by_phase'].items()])
+        add_metric('phase_calls_total', 'Planner phases run.',
+                   [({'phase': phase}, val['calls']) for phase, val in summary['phases'].items()])
+        add_metric('phase_seconds_total', 'Time spent in planner phases.',
+                   [({'phase': phase}, val['seconds']) for phase, val in summary['phases'].items()])
+
+        candidates = {}
+        survivors = {}
+        for level in self.levels:
+            candidates[level['level']] = candidates.get(level['level'], 0) + level['candidate_combinations']
+            survivors[level['level']] = survivors.get(level['level'], 0) + level['survivors']
+        add_metric('apriori_candidate_combinations_total', 'Attribute combinations counted per Apriori level.',
+                   [({'level': level}, count) for level, count in sorted(candidates.items())])
+        add_metric('apriori_survivors_total', 'Groups with enough outliners per Apriori level.',
+                   [({'level': level}, count) for level, count in sorted(survivors.items())])
+
+        return '\n'.join(lines) + '\n'
+
+
+def start_trace() -> PlannerTrace:
+    """
+    Starts recording into a new trace, until stop_trace is called.
+    """
+    global _current_trace
+    _current_trace = PlannerTrace()
+    return _current_trace
+
+
+def stop_trace() -> PlannerTrace:
+    """
+    :return: the trace that was recorded, None if none was started.
+    """
+    global _current_trace
+    trace = _current_trace
+    _current_trace = None
+    return trace
+
+
+def get_current_trace() -> PlannerTrace:
+    return _current_trace
+
+
+def record_level(level: int, candidate_combinations: int, candidate_values, survivors: int):
+    if _current_trace is not None:
+        _current_trace.record_level(level, candidate_combinations, candidate_values, survivors)
+
+
+@contextmanager
+def phase(name: str, **labels):
+    """
+    Times the enclosed block as a phase of the current trace, does nothing if no trace was started.
+    """
+    trace = _current_trace
+    if trace is None:
+        yield
+        return
+
+    with trace.phase(name, **labels):
+        yield
+
+
+def phase_per_item(name: str, items, label: str = 'item'):
+    """
+    Yields the items, timing the loop body of every one of them as a phase of the current trace (labeled by the item).
+    """
+    for item in items:
+        with phase(name, **{label: item}):
+            yield item
+
+
+def traced(name: str):
+    """
+    Decorator, times every call of the function as a phase of the current trace.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,162 @@
+"""
+Multi-process counting of the groups of a ColumnarDriftLog, for hosts with more cores than the one a planner run uses.
+The attributes columns and the outliners masks are copied once into a shared memory block, the rows are split into
+contiguous shards and a worker process counts the outliners and in-liners of the groups of every shard. The reduce
+step sums the counts of the shards before min_out_liners_count is applied, so the result has the same groups with the
+same counts as ColumnarDriftLog.count_groups (in a different order).
+"""
+from concurrent.futures import Executor
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+from ColumnarDriftLog import ColumnarDriftLog, DENSE_GROUPS_LIMIT
+
+# the group keys are mixed radix int64 numbers, combinations with more possible keys than this are counted in-process.
+MAX_GROUP_KEYS = 1 << 62
+
+
+def view_shared_arrays(memory: shared_memory.SharedMemory, layout: dict, start: int = 0, end: int = None) -> dict:
+    """
+    :param layout: name -> (offset, dtype, length) of every array in the block
+    :return: name -> numpy view of rows start:end of the array, backed by the shared memory (the views must be
+    released before the block is closed).
+    """
+    return {name: np.ndarray((length,), dtype=np.dtype(dtype), buffer=memory.buf, offset=offset)[start:end]
+            for name, (offset, dtype, length) in layout.items()}
+
+
+def count_shard(memory_name: str, layout: dict, start: int, end: int, attributes: list[str], cardinalities: list[int],
+                candidate_codes: list[list[int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs in the worker processes, counts rows start:end of the shared arrays.
+    :return: the group keys with outliners or in-liners in the shard, and their outliners and in-liners counts.
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        return count_shard_rows(view_shared_arrays(memory, layout, start, end), attributes, cardinalities,
+                                candidate_codes)
+    finally:
+        memory.close()
+
+
+def count_shard_rows(arrays: dict, attributes: list[str], cardinalities: list[int],
+                     candidate_codes: list[list[int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    keys = np.zeros(len(arrays['is_out_liner']), dtype=np.int64)
+    for attr, cardinality in zip(attributes, cardinalities):
+        keys = keys * cardinality + arrays[('codes', attr)]
+
+    # a row that is neither an outliner nor an in-liner adds nothing to the counts.
+    counted_rows = arrays['is_out_liner'] | arrays['is_in_liner']
+    if candidate_codes is not None:
+        for attr, codes in zip(attributes, candidate_codes):
+            counted_rows &= np.isin(arrays[('codes', attr)], codes)
+    keys = keys[counted_rows]
+    is_out_liner = arrays['is_out_liner'][counted_rows]
+
+    number_of_keys = int(np.prod(cardinalities, dtype=float))
+    if number_of_keys <= DENSE_GROUPS_LIMIT:
+        out_counts = np.bincount(keys[is_out_liner], minlength=number_of_keys)
+        in_counts = np.bincount(keys[~is_out_liner], minlength=number_of_keys)
+        shard_keys = np.flatnonzero(out_counts + in_counts)
+        return shard_keys, out_counts[shard_keys], in_counts[shard_keys]
+
+    shard_keys, inverse = np.unique(keys, return_inverse=True)
+    out_counts = np.bincount(inverse[is_out_liner], minlength=len(shard_keys))
+    return shard_keys, out_counts, np.bincount(inverse, minlength=len(shard_keys)) - out_counts
+
+
+def merge_shard_counts(shard_counts: list[tuple]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The reduce step.
+    :param shard_counts: the (keys, outliners counts, in-liners counts) of every shard
+    :return: the distinct keys, sorted, and the sums of their counts over the shards.
+    """
+    keys, inverse = np.unique(np.concatenate([counts[0] for counts in shard_counts]), return_inverse=True)
+    out_counts = np.bincount(inverse, weights=np.concatenate([counts[1] for counts in shard_counts]),
+                             minlength=len(keys))
+    in_counts = np.bincount(inverse, weights=np.concatenate([counts[2] for counts in shard_counts]),
+                            minlength=len(keys))
+
+    return keys, out_counts.astype(np.int64), in_counts.astype(np.int64)
+
+
+def release_shared_memory(memory: shared_memory.SharedMemory):
+    memory.close()
+    memory.unlink()
+
+
+class ShardedCounter:
+    """
+    Counts the groups of a ColumnarDriftLog with the worker processes of an executor, one shard of rows per task.
+    The shared memory holds a copy of the attributes columns and of the outliners masks as they were when the counter
+    was created, it is released by close() or when the counter is garbage collected.
+    :param executor: a ProcessPoolExecutor whose workers can import this module
+    :param shards: the number of shards the rows are split into
+    """
+
+    def __init__(self, drift_log: ColumnarDriftLog, attributes: list[str], executor: Executor, shards: int):
+        self.drift_log = drift_log
+        self.executor = executor
+
+        arrays = {('codes', attr): drift_log.codes[attr] for attr in attributes}
+        arrays['is_out_liner'] = drift_log.is_out_liner
+        arrays['is_in_liner'] = drift_log.is_in_liner
+
+        self.layout = {}
+        size = 0
+        for name, array in arrays.items():
+            size = -(-size // 8) * 8
+            self.layout[name] = (size, array.dtype.str, len(array))
+            size += array.nbytes
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, view in view_shared_arrays(self.memory, self.layout).items():
+            view[:] = arrays[name]
+        self._finalizer = weakref.finalize(self, release_shared_memory, self.memory)
+
+        bounds = np.linspace(0, drift_log.stored_rows, shards + 1).astype(int).tolist()
+        self.shards = list(zip(bounds[:-1], bounds[1:]))
+
+    def close(self):
+        self._finalizer()
+
+    def count_groups(self, attributes_to_group_by, candidate_values: list[tuple] = None,
+                     min_out_liners_count: float = 0) -> list[tuple]:
+        """
+        Same as ColumnarDriftLog.count_groups.
+        """
+        attributes_to_group_by = list(attributes_to_group_by)
+        cardinalities = [max(len(self.drift_log.dictionaries[attr]), 1) for attr in attributes_to_group_by]
+
+        if np.prod(cardinalities, dtype=float) >= MAX_GROUP_KEYS or min_out_liners_count < 0:
+            # groups without rows would count, only the dense in-process count returns them.
+            return self.drift_log.count_groups(attributes_to_group_by, candidate_values, min_out_liners_count)
+
+        candidate_codes = None
+        if candidate_values is not None:
+            candidate_codes = []
+            for i, attr in enumerate(attributes_to_group_by):
+                codes = {self.drift_log.code_of(attr, values[i]) for values in candidate_values}
+                candidate_codes.append(sorted(code for code in codes if code is not None))
+
+        futures = [self.executor.submit(count_shard, self.memory.name, self.layout, start, end,
+                                        attributes_to_group_by, cardinalities, candidate_codes)
+                   for start, end in self.shards]
+        keys, out_counts, in_counts = merge_shard_counts([future.result() for future in futures])
+
+        groups = np.flatnonzero(out_counts > min_out_liners_count)
+        group_codes = []
+        remaining = keys[groups]
+        for cardinality in reversed(cardinalities):
+            remaining, code = np.divmod(remaining, cardinality)
+            group_codes.append(code)
+        group_codes.reverse()
+        out_counts = out_counts[groups]
+        in_counts = in_counts[groups]
+
+        dictionaries = [self.drift_log.dictionaries[attr] for attr in attributes_to_group_by]
+        res = []
+        for g in range(len(out_counts)):
+            values = [dictionary[codes[g]] for dictionary, codes in zip(dictionaries, group_codes)]
+            res.append((int(out_counts[g]), int(in_counts[g]), *values))
+
+        return res
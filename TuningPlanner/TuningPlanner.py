@@ -1,85 +1,232 @@
-from ExplanationsExtractor import get_explanations_ordered_list, get_attributes_values, reset_counter_factual_drift_col, \
-    set_counter_drift_to_zero, GetTotalOutLinersCount
+from ExplanationsExtractor import get_explanations_ordered_list, reset_counter_factual_drift_col, \
+    set_explanation_counter_drift_to_zero as set_explanation_counter_drift_to_zero_in_db, explanation_sql, \
+    GetExplanationOutLinersCounts, GetColumnarDriftLog, GetBitmapIndex, GetCountsOfExplanations, \
+    sweep_explanations_ordered_lists, GetParquetDriftLog, GetCountCube, GetSummaryCountCube, GetDateBucketsCountCube, \
+    get_window_count_cube, SQL_BACKEND, CUBE_BACKEND, SUMMARY_BACKEND, PARQUET_BACKEND
+from BitmapIndex import BitmapIndex
+from ExplanationsCounts import ExplanationsCounts
+from ExplanationLattice import ExplanationLattice
+import PlannerTrace
 from collections import OrderedDict
-from itertools import chain, combinations
 import time
 
 
-attributes_mappings = ['weather', 'location', 'model_type']
-vals_attr_mappings = get_attributes_values(attributes_mappings)
+# the planner's explanations are tuples of (attribute, value) pairs, example: (('weather', 'rain'), ('location', 'NY')).
 diff_attributes = ['weather', 'location', 'id', 'model_type']
-
-
+mining_backend = SQL_BACKEND
+# reuse the mined explanations of a previous run when the filtered rows didn't change (see MiningCache).
+use_mining_cache = False
+explanations_thresholds = {
+    'min_occurrences': 0.01,
+    'min_support': 0.01,
+    'min_confidence': 0.51,
+    'min_risk': 1.1,
+    'max_length': 3,
+}
+
+general_db_filter_query = "date <= '2/1/2020' "
+drift_outliners_sql_filter_query = "signal_1or2 = 1"
+counter_factual_outliners_sql_filter_query = "counter_drift = 1"
+
+# DB_COUNTER_FACTUAL_MODE keeps the counterfactual drift in the counter_drift column of the shared table (full table
+# UPDATEs, one planner at a time), IN_MEMORY_COUNTER_FACTUAL_MODE keeps it as a mask over the filtered rows loaded
+# once in this process, so the planner never writes to the DB and several planners can run against the same table.
+# BITMAP_COUNTER_FACTUAL_MODE is the same, with the counterfactual drift as a bitset of a BitmapIndex and all the
+# counts (mining, did_att_survive, zeroing) as popcounts.
+DB_COUNTER_FACTUAL_MODE = 'db'
+IN_MEMORY_COUNTER_FACTUAL_MODE = 'in_memory'
+BITMAP_COUNTER_FACTUAL_MODE = 'bitmap'
+COUNTER_FACTUAL_MODES = (DB_COUNTER_FACTUAL_MODE, IN_MEMORY_COUNTER_FACTUAL_MODE, BITMAP_COUNTER_FACTUAL_MODE)
+counter_factual_mode = DB_COUNTER_FACTUAL_MODE
+
+# the in-memory counterfactual drift (a ColumnarDriftLog or a BitmapIndex), its outliners are the rows whose
+# counter_drift would be 1.
+counter_factual_drift_log = None
+
+# DB_COUNTER_FACTUAL_MODE: the outliners counts of the explanations did_att_survive checks (and of all the rows, under
+# the empty explanation), counted once by track_out_liners_counts and returned updated by every counterfactual write.
+counter_factual_out_liners_counts = None
+
+# the CountCube of the date window RollingTuningConfigurations is planning, the counterfactual drift is reset to it.
+window_drift_log = None
+
+# when set, the counterfactual analysis keeps the counts of the explanations it already found and updates them on
+# every zeroed group, instead of rerunning get_explanations_aux (the whole mining) after each surviving sub-explanation.
+INCREMENTAL_COUNTER_FACTUAL = True
+explanations_counts = None
+
+
+@PlannerTrace.traced('get_explanations_aux')
 def get_explanations_aux():
     return get_explanations_ordered_list(
         attributes=diff_attributes,
-        min_occurrences=0.01,
-        min_support=0.01,
-        min_confidence=0.51,
-        min_risk=1.1,
-        general_db_filter_query="date <= '2/1/2020' ",
-        outliners_sql_filter_query="counter_drift = 1",
-        max_length=3,
-        debug_print=False)
+        general_db_filter_query=general_db_filter_query,
+        outliners_sql_filter_query=counter_factual_outliners_sql_filter_query,
+        debug_print=False,
+        backend=mining_backend,
+        drift_log=counter_factual_drift_log,
+        use_cache=use_mining_cache,
+        with_attributes=True,
+        **explanations_thresholds)
 
 
-def did_att_survive(explanation):
-    min_support = 0.01
-    general_db_filter_query = "date <= '2/1/2020' "
-    outliners_sql_filter_query = "counter_drift = 1"
+def count_explanations(explanations: list[list[tuple]], covered_explanation=None) -> list[tuple]:
+    """
+    Counts the explanations on the current counterfactual drift.
+    :param explanations: every explanation is a list of (attribute, value) pairs
+    :param covered_explanation: if provided, only the rows that set_explanation_counter_drift_to_zero would zero for
+    this explanation are counted.
+    """
+    covered_attribute_values = list(covered_explanation) if covered_explanation else None
+    if counter_factual_drift_log is not None:
+        rows = None
+        if covered_attribute_values is not None:
+            rows = counter_factual_drift_log.rows_matching_any(covered_attribute_values)
+        return counter_factual_drift_log.count_explanations(explanations, rows)
+
+    filter_query = general_db_filter_query
+    filter_params = []
+    if covered_attribute_values is not None:
+        covered_condition, filter_params = explanation_sql(covered_attribute_values, ' OR ')
+        filter_query += " AND (" + covered_condition + ")"
+    return GetCountsOfExplanations(explanations, counter_factual_outliners_sql_filter_query, filter_query,
+                                   filter_params)
+
+
+@PlannerTrace.traced('get_explanations_after_counter_factual_run')
+def get_explanations_after_counter_factual_run(tracked_explanations) -> set:
+    """
+    :return: the explanations that survive the current counterfactual drift, either by re-mining or (when
+    INCREMENTAL_COUNTER_FACTUAL is set) from the incrementally updated counts of the tracked explanations.
+    """
+    global explanations_counts
+    if not INCREMENTAL_COUNTER_FACTUAL:
+        return set(get_explanations_aux())
 
-    query_addition = " AND "
-    for attribute_value in explanation:
-        attribute_key = get_DB_attribute_name_from_value(attribute_value)
-        query_addition += f'{attribute_key} = \'{attribute_value}\''
+    if explanations_counts is None:
+        tracked = {explanation: list(explanation) for explanation in tracked_explanations}
+        explanations_counts = ExplanationsCounts(tracked, count_explanations([[]] + list(tracked.values())))
 
-    new_query = general_db_filter_query+query_addition
-    total_outliners_count = GetTotalOutLinersCount(outliners_sql_filter_query, outliners_sql_filter_query)
-    att_outliners_count = GetTotalOutLinersCount(outliners_sql_filter_query, new_query)
-    return (att_outliners_count/total_outliners_count) >= min_support
+    return explanations_counts.get_surviving_explanations(diff_attributes, **explanations_thresholds)
 
 
-def get_DB_attribute_name_from_value(attr_value):
-    # we map all but id so if not mapped it is id.
-    if attr_value not in vals_attr_mappings:
-        return "id"
+@PlannerTrace.traced('reset_counter_factual_state')
+def reset_counter_factual_state():
+    """
+    Sets the counterfactual drift back to the logged drift (signal_1or2).
+    """
+    global counter_factual_drift_log, explanations_counts, counter_factual_out_liners_counts
+    explanations_counts = None
+    counter_factual_out_liners_counts = None
+    loaded_attributes = list(diff_attributes)
+    if window_drift_log is not None:
+        counter_factual_drift_log = window_drift_log.copy()
+    elif mining_backend == SUMMARY_BACKEND and counter_factual_mode == DB_COUNTER_FACTUAL_MODE:
+        # the summary never re-reads the rows the counterfactual writes update.
+        raise ValueError("SUMMARY_BACKEND needs the in_memory or the bitmap `counter_factual` mode.")
+    elif mining_backend == PARQUET_BACKEND:
+        # the exports are read only, the counterfactual drift can only be kept in memory.
+        if counter_factual_mode == DB_COUNTER_FACTUAL_MODE:
+            raise ValueError("PARQUET_BACKEND needs the in_memory or the bitmap `counter_factual` mode.")
+        drift_log = GetParquetDriftLog(loaded_attributes, drift_outliners_sql_filter_query, general_db_filter_query)
+        if counter_factual_mode == IN_MEMORY_COUNTER_FACTUAL_MODE:
+            counter_factual_drift_log = drift_log.copy()
+        else:
+            counter_factual_drift_log = BitmapIndex.from_drift_log(drift_log)
+    elif mining_backend in (CUBE_BACKEND, SUMMARY_BACKEND) and counter_factual_mode != DB_COUNTER_FACTUAL_MODE:
+        # in both in-memory modes the counterfactual drift is kept on the backend's CountCube, which has the same
+        # counterfactual methods, so the raw rows are never loaded.
+        if mining_backend == CUBE_BACKEND:
+            count_cube = GetCountCube(loaded_attributes, drift_outliners_sql_filter_query, general_db_filter_query)
+        else:
+            count_cube = GetSummaryCountCube(loaded_attributes, drift_outliners_sql_filter_query,
+                                             general_db_filter_query)
+        counter_factual_drift_log = count_cube.copy()
+    elif counter_factual_mode == IN_MEMORY_COUNTER_FACTUAL_MODE:
+        counter_factual_drift_log = GetColumnarDriftLog(loaded_attributes, drift_outliners_sql_filter_query,
+                                                        general_db_filter_query).copy()
+    elif counter_factual_mode == BITMAP_COUNTER_FACTUAL_MODE:
+        counter_factual_drift_log = GetBitmapIndex(loaded_attributes, drift_outliners_sql_filter_query,
+                                                   general_db_filter_query).copy()
     else:
-        return vals_attr_mappings[attr_value]
+        counter_factual_drift_log = None
+        reset_counter_factual_drift_col()
 
 
-def index_of(x, e_list_param):
-    try:
-        return len(x), e_list_param.index(x)
-    except:
-        return float('inf'), len(e_list_param)
-
-
-def powerset(iterable):
+def track_out_liners_counts(explanations):
     """
-    powerset([1,2,3]) --> () (1,) (2,) (3,) (1,2) (1,3) (2,3) (1,2,3)
-    :param iterable: the set to get the power sets of
-    :return: a list of all the possible subsets
+    Counts the outliners of the explanations on the counterfactual drift in the DB with one query, so did_att_survive
+    doesn't query them. Does nothing for the in-memory counterfactual drift, where these counts are cheap.
     """
-    s = list(iterable)
-    return list(chain.from_iterable(combinations(s, r) for r in range(1, len(s) + 1)))
+    global counter_factual_out_liners_counts
+    if counter_factual_drift_log is None:
+        explanations = [()] + list(explanations)
+        counts = count_explanations([list(explanation) for explanation in explanations])
+        counter_factual_out_liners_counts = {explanation: c[0] for explanation, c in zip(explanations, counts)}
+
+
+def set_explanation_counter_drift_to_zero(explanation):
+    global counter_factual_out_liners_counts
+    if counter_factual_drift_log is None:
+        # one transaction: the covered counts of the tracked explanations, the update and the updated outliners counts.
+        tracked = list(counter_factual_out_liners_counts) if counter_factual_out_liners_counts is not None else None
+        covered_counts, counts = set_explanation_counter_drift_to_zero_in_db(
+            list(explanation), counter_factual_outliners_sql_filter_query, general_db_filter_query,
+            explanations_counts.get_explanations_to_count() if explanations_counts is not None else None,
+            [list(e) for e in tracked] if tracked is not None else None)
+        if explanations_counts is not None:
+            explanations_counts.subtract_covered_rows(covered_counts)
+        if tracked is not None:
+            counter_factual_out_liners_counts = {e: c[0] for e, c in zip(tracked, counts)}
+        return
+
+    if explanations_counts is not None:
+        explanations_counts.subtract_covered_rows(
+            count_explanations(explanations_counts.get_explanations_to_count(), covered_explanation=explanation))
+
+    for attribute, value in explanation:
+        counter_factual_drift_log.set_out_liners_to_zero(attribute, value)
 
 
+def did_att_survive(explanation):
+    min_support = 0.01
+
+    if counter_factual_drift_log is not None:
+        total_outliners_count = counter_factual_drift_log.total_out_liners
+        att_outliners_count = counter_factual_drift_log.count_out_liners(list(explanation))
+    elif counter_factual_out_liners_counts is not None and explanation in counter_factual_out_liners_counts:
+        total_outliners_count = counter_factual_out_liners_counts[()]
+        att_outliners_count = counter_factual_out_liners_counts[explanation]
+    else:
+        total_outliners_count, att_outliners_count = GetExplanationOutLinersCounts(
+            list(explanation), counter_factual_outliners_sql_filter_query, general_db_filter_query)
+
+    if total_outliners_count == 0:
+        return False
+    return (att_outliners_count/total_outliners_count) >= min_support
+
+
+@PlannerTrace.traced('get_ordered_dic')
 def get_ordered_dic(e_list_param):
+    lattice = ExplanationLattice(e_list_param)
     finetune_dir = OrderedDict()
+    # the subgroups already added to every key, to not scan the key's list.
+    finetune_dir_subgroups = {}
     for i in e_list_param:
-        i_powersets = [j for j in powerset(i) if j in e_list_param]
-        if len(i_powersets) != 1:
-            i_powersets.remove(i)
-            i_powersets = sorted(i_powersets, key=lambda x: index_of(x, e_list_param))
-
-        if i_powersets[0] in finetune_dir:
-            if i not in finetune_dir[i_powersets[0]] and i != i_powersets[0]:
-                finetune_dir[i_powersets[0]].append(i)
+        # the coarsest, then highest ranked, explanation of the list that is a subset of i (or i itself).
+        key = lattice.get_coarsest_ancestor(i)
+
+        if key in finetune_dir:
+            if i not in finetune_dir_subgroups[key] and i != key:
+                finetune_dir[key].append(i)
+                finetune_dir_subgroups[key].add(i)
         else:
-            if i != i_powersets[0]:
-                finetune_dir[i_powersets[0]] = [i]
+            if i != key:
+                finetune_dir[key] = [i]
+                finetune_dir_subgroups[key] = {i}
             else:
-                finetune_dir[i_powersets[0]] = []
+                finetune_dir[key] = []
+                finetune_dir_subgroups[key] = set()
 
     for k in finetune_dir.keys():
         if not finetune_dir[k]:
@@ -88,12 +235,14 @@ def get_ordered_dic(e_list_param):
     return finetune_dir
 
 
-# TODO: reduce complexity by not rerunning DIFF agagin.
+@PlannerTrace.traced('run_counter_factual_analysis')
 def run_counter_factual_analysis(finetune_dir: dict):
-    reset_counter_factual_drift_col()
+    reset_counter_factual_state()
+    track_out_liners_counts(finetune_dir.keys())
 
     final_plan_keys = []
     survived_explanations_after_counter_factual_run = set(finetune_dir.keys())
+    keys_lattice = ExplanationLattice(list(finetune_dir.keys()))
 
     all_subgroups = set()
     for k, v in finetune_dir.items():
@@ -101,26 +250,15 @@ def run_counter_factual_analysis(finetune_dir: dict):
 
     survived_sub_groups = all_subgroups
     # iterate over te explanations ordered by risk.
-    for explanation in finetune_dir.keys():
+    for explanation in PlannerTrace.phase_per_item('counter_factual_iteration', finetune_dir.keys(), 'explanation'):
         if did_att_survive(explanation):  # in survived_explanations_after_counter_factual_run:
             final_plan_keys.append(explanation)
 
-            for attribute_value in explanation:
-                attribute_key = get_DB_attribute_name_from_value(attribute_value)
-                set_counter_drift_to_zero(attribute_key, attribute_value)
-
-            # Here now we have the update DB with 0 for counter_drift
-            # TODO: switch this with a simple check for the next element instead of the whole DIFF again.
-            # explanation_after_cfa = set(get_explanations_aux())
-
-            # survived_explanations_after_counter_factual_run is **tmp_keys**
-            # survived_explanations_after_counter_factual_run = explanation_after_cfa.intersection(finetune_dir.keys())
-            # survived_sub_groups = explanation_after_cfa.intersection(all_subgroups)
+            set_explanation_counter_drift_to_zero(explanation)
 
         # in case the explanation doesn't survive the CFA.
         # we still want to check regarding the sub-explanations.
         else:
-            # todo: add updated condition with better performance here
             survived_sub_explanations = set(finetune_dir[explanation]).intersection(survived_sub_groups)
 
             # not empty if a sub-explanation survived the CFA! - if not, do nothing.
@@ -133,18 +271,17 @@ def run_counter_factual_analysis(finetune_dir: dict):
 
                     # if one of the explanation subgroups is more coarse-grained.
                     # for example, if Rain,NY,resnet50 and Rain,NY both are explanations, only add the most coarse.
-                    if len(set(powerset(t_k)).intersection(survived_explanations_after_counter_factual_run)) > 1:
+                    if keys_lattice.has_ancestor_in(t_k, survived_explanations_after_counter_factual_run):
                         coarse_survived_subgroups_survived_keys_after_counter_factual_run.remove(t_k)
 
                 final_plan_keys += coarse_survived_subgroups_survived_keys_after_counter_factual_run
 
                 for t_k in coarse_survived_subgroups_survived_keys_after_counter_factual_run:
-                    for attribute_value in t_k:
-                        attribute_key = get_DB_attribute_name_from_value(attribute_value)
-                        set_counter_drift_to_zero(attribute_key, attribute_value)
+                    set_explanation_counter_drift_to_zero(t_k)
 
                 # Here now we have the update DB with 0 for counter_drift
-                explanation_after_cfa = set(get_explanations_aux())
+                explanation_after_cfa = get_explanations_after_counter_factual_run(
+                    all_subgroups.union(finetune_dir.keys()))
 
                 survived_explanations_after_counter_factual_run = explanation_after_cfa.intersection(finetune_dir.keys())
                 survived_sub_groups = explanation_after_cfa.intersection(all_subgroups)
@@ -158,12 +295,22 @@ def run_counter_factual_analysis(finetune_dir: dict):
     return final_finetune_plan
 
 
-def CreateTuningConfigurations(attributes: list[str]):
-    global diff_attributes
+def CreateTuningConfigurations(attributes: list[str], backend: str = SQL_BACKEND,
+                               counter_factual: str = DB_COUNTER_FACTUAL_MODE):
+    """
+    :return: the plan, an OrderedDict from ('original',) and from the explanations to fine-tune for (tuples of
+    (attribute, value) pairs) to their {'subgroups': [explanations]}.
+    """
+    global diff_attributes, mining_backend, counter_factual_mode
+    if counter_factual not in COUNTER_FACTUAL_MODES:
+        raise ValueError(f"`counter_factual` must be one of {COUNTER_FACTUAL_MODES}.")
+
     diff_attributes = attributes
+    mining_backend = backend
+    counter_factual_mode = counter_factual
 
-    print("starting planner - resetting DB settings")
-    reset_counter_factual_drift_col()
+    print("starting planner - resetting counterfactual drift")
+    reset_counter_factual_state()
 
     e_list_ = get_explanations_aux()
 
@@ -174,6 +321,89 @@ def CreateTuningConfigurations(attributes: list[str]):
     return finetune_plan
 
 
+def SweepTuningConfigurations(attributes: list[str], thresholds_grid: list[dict], backend: str = SQL_BACKEND,
+                              counter_factual: str = DB_COUNTER_FACTUAL_MODE, create_plans: bool = True) -> list[dict]:
+    """
+    CreateTuningConfigurations for every point of a thresholds grid. The explanations of all the points come from a
+    single counting pass (see sweep_explanations_ordered_lists), only the counterfactual analysis runs per point.
+    :param thresholds_grid: dicts overriding some of explanations_thresholds, example: [{'min_risk': 1.5}]
+    :param create_plans: whether to also run the counterfactual analysis, or only return the explanations.
+    :return: for every grid point, in the grid order, a dict with its 'thresholds', 'explanations' and (if
+    create_plans) 'plan'.
+    """
+    global diff_attributes, mining_backend, counter_factual_mode, explanations_thresholds
+    if counter_factual not in COUNTER_FACTUAL_MODES:
+        raise ValueError(f"`counter_factual` must be one of {COUNTER_FACTUAL_MODES}.")
+
+    diff_attributes = attributes
+    mining_backend = backend
+    counter_factual_mode = counter_factual
+
+    print("starting planner sweep - resetting counterfactual drift")
+    reset_counter_factual_state()
+
+    grid = [{**explanations_thresholds, **thresholds} for thresholds in thresholds_grid]
+    explanations_lists = sweep_explanations_ordered_lists(diff_attributes, grid,
+                                                          counter_factual_outliners_sql_filter_query,
+                                                          general_db_filter_query, backend=mining_backend,
+                                                          drift_log=counter_factual_drift_log, with_attributes=True)
+
+    sweep = []
+    default_thresholds = explanations_thresholds
+    try:
+        for thresholds, e_list_ in zip(grid, explanations_lists):
+            point = {'thresholds': thresholds, 'explanations': e_list_}
+            if create_plans:
+                # the counterfactual analysis re-evaluates the explanations with these thresholds.
+                explanations_thresholds = thresholds
+                point['plan'] = run_counter_factual_analysis(get_ordered_dic(e_list_))
+            sweep.append(point)
+    finally:
+        explanations_thresholds = default_thresholds
+
+    return sweep
+
+
+def RollingTuningConfigurations(attributes: list[str], windows: list[tuple], create_plans: bool = True) -> list[dict]:
+    """
+    CreateTuningConfigurations for every date window, instead of general_db_filter_query. The counts per
+    (date, attributes values) are loaded once from the incrementally updated DriftLogSummary, and every window is
+    mined and planned in memory on the sum of its date buckets (a CountCube) - no DB query per window.
+    :param windows: (first date, last date) pairs, both inclusive and None for unbounded, example:
+    ExplanationsExtractor.rolling_windows('2020-01-01', '2020-03-01', window_days=30, step_days=7)
+    :param create_plans: whether to also run the counterfactual analysis, or only return the explanations.
+    :return: for every window, in the windows order, a dict with its 'window', 'explanations' and (if create_plans)
+    'plan'.
+    """
+    global diff_attributes, mining_backend, counter_factual_mode, window_drift_log
+    diff_attributes = attributes
+
+    print("starting rolling planner - loading the date buckets")
+    date_buckets = GetDateBucketsCountCube(diff_attributes, drift_outliners_sql_filter_query)
+
+    rolling = []
+    # the windows are mined and planned on their CountCube, the modes of the next CreateTuningConfigurations calls are
+    # given back.
+    default_backend, default_counter_factual_mode = mining_backend, counter_factual_mode
+    mining_backend = CUBE_BACKEND
+    counter_factual_mode = IN_MEMORY_COUNTER_FACTUAL_MODE
+    try:
+        for first_date, last_date in windows:
+            window_drift_log = get_window_count_cube(date_buckets, diff_attributes, first_date, last_date)
+            reset_counter_factual_state()
+
+            e_list_ = get_explanations_aux()
+            window = {'window': (first_date, last_date), 'explanations': e_list_}
+            if create_plans:
+                window['plan'] = run_counter_factual_analysis(get_ordered_dic(e_list_))
+            rolling.append(window)
+    finally:
+        window_drift_log = None
+        mining_backend, counter_factual_mode = default_backend, default_counter_factual_mode
+
+    return rolling
+
+
 if __name__ == '__main__':
     reset_counter_factual_drift_col()
     explanation_attributes = ['weather', 'location', 'id', 'model_type']
@@ -1,11 +1,104 @@
+import os
+import sys
 import time
 
+_init_start_time = time.time()
+
+# the planner modules import each other by name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TuningPlanner'))
+
+import ExplanationsExtractor
+import PlannerTrace
+import TuningPlanner
+
+# everything above runs once per container. The connection pool and the loaded drift logs are module level state, so
+# warm invocations reuse them instead of paying the setup again.
+INIT_SECONDS = time.time() - _init_start_time
+
+# warm state older than this is dropped, so a long lived container doesn't plan on a stale copy of the drift log.
+WARM_STATE_MAX_AGE = 15 * 60
+
+_default_thresholds = dict(TuningPlanner.explanations_thresholds)
+_default_general_db_filter_query = TuningPlanner.general_db_filter_query
+_default_drift_outliners_sql_filter_query = TuningPlanner.drift_outliners_sql_filter_query
+
+_invocations = 0
+_warm_state_time = time.time()
+
+
+def explanation_to_json(explanation: tuple):
+    """
+    :return: the (attribute, value) pairs of a plan explanation as a dict, example: {'weather': 'rain'}, and 'original'
+    for the ('original',) key.
+    """
+    if explanation == ('original',):
+        return 'original'
+    return dict(explanation)
 
-def lambda_handler(event, context):
 
-    explanation_attributes = ['weather', 'location', 'id', 'model_type']
+def plan_to_json(finetune_plan) -> list[dict]:
+    """
+    :return: the plan as a JSON serializable list, in the plan order.
+    """
+    return [{'explanation': explanation_to_json(explanation),
+             'subgroups': [explanation_to_json(subgroup) for subgroup in configuration.get('subgroups', [])]}
+            for explanation, configuration in finetune_plan.items()]
+
+
+def lambda_handler(event, context):
+    """
+    Runs the tuning planner. All the event fields are optional:
+    attributes - the explanation attributes, example: ['weather', 'location', 'id', 'model_type']
+    thresholds - overrides of the planner's explanations_thresholds, example: {'min_risk': 1.5}
+    general_db_filter_query - example: "date <= '2/1/2020' "
+    outliners_sql_filter_query - the logged drift, example: "signal_1or2 = 1"
+    backend - one of ExplanationsExtractor.MINING_BACKENDS
+    counter_factual - one of TuningPlanner.COUNTER_FACTUAL_MODES, in_memory by default so warm invocations reuse the
+    loaded drift log (db writes counter_drift and reloads on every invocation)
+    refresh - drop the warm state before planning.
+    trace - add the summary of a PlannerTrace of the run (queries, phases, slowest statements) to the response.
+    """
+    global _invocations, _warm_state_time
     start_time = time.time()
+    event = event or {}
+
+    cold_start = _invocations == 0
+    _invocations += 1
+
+    if event.get('refresh') or start_time - _warm_state_time > WARM_STATE_MAX_AGE:
+        ExplanationsExtractor.clear_columnar_drift_logs()
+        _warm_state_time = start_time
+
+    TuningPlanner.explanations_thresholds = {**_default_thresholds, **event.get('thresholds', {})}
+    TuningPlanner.general_db_filter_query = event.get('general_db_filter_query', _default_general_db_filter_query)
+    TuningPlanner.drift_outliners_sql_filter_query = event.get('outliners_sql_filter_query',
+                                                               _default_drift_outliners_sql_filter_query)
+
+    if event.get('trace'):
+        PlannerTrace.start_trace()
+
+    plan_start_time = time.time()
+    try:
+        tuning_configurations = TuningPlanner.CreateTuningConfigurations(
+            event.get('attributes', ['weather', 'location', 'id', 'model_type']),
+            backend=event.get('backend', ExplanationsExtractor.SQL_BACKEND),
+            counter_factual=event.get('counter_factual', TuningPlanner.IN_MEMORY_COUNTER_FACTUAL_MODE))
+    finally:
+        trace = PlannerTrace.stop_trace()
+    plan_seconds = time.time() - plan_start_time
 
-    print(explanation_attributes)
+    res = {
+        'plan': plan_to_json(tuning_configurations),
+        'cold_start': cold_start,
+        'invocation': _invocations,
+        'timings': {
+            # the container's init is only paid by the cold invocation.
+            'init_seconds': INIT_SECONDS if cold_start else 0.0,
+            'planner_seconds': plan_seconds,
+            'handler_seconds': time.time() - start_time,
+        },
+    }
+    if trace is not None:
+        res['trace'] = trace.summary()
 
-    return (time.time() - start_time), explanation_attributes
+    return res
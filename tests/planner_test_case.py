@@ -0,0 +1,75 @@
+"""
+A TestCase over a synthetic drift_log_flex (Benchmarks/SyntheticDriftLog.py) in a temporary SQLite file, with the
+planner's module state reset before every test.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'TuningPlanner'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Benchmarks'))
+
+import ExplanationsExtractor
+import TuningPlanner
+from SyntheticDriftLog import SyntheticDriftLogConfig, SQLitePool, generate_drift_log
+
+ATTRIBUTES = ['weather', 'location', 'id', 'model_type']
+GENERAL_DB_FILTER_QUERY = "date <= '2020-02-01' "
+OUTLINERS_SQL_FILTER_QUERY = "signal_1or2 = 1"
+THRESHOLDS = {'min_occurrences': 0.01, 'min_support': 0.01, 'min_confidence': 0.51, 'min_risk': 1.1, 'max_length': 3}
+
+
+class PlannerTestCase(unittest.TestCase):
+    drift_log_config = SyntheticDriftLogConfig(rows=20000, days=40,
+                                               cardinalities={'weather': 4, 'location': 6, 'id': 50, 'model_type': 3})
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls.work_dir, 'drift_log.sqlite')
+        generate_drift_log(cls.db_path, cls.drift_log_config)
+        cnx = sqlite3.connect(cls.db_path)
+        try:
+            cls.prepare_drift_log(cnx)
+            cnx.commit()
+        finally:
+            cnx.close()
+
+        cls.pool = SQLitePool(cls.db_path, ExplanationsExtractor.schema_name)
+        ExplanationsExtractor.table_name = 'drift_log_flex'
+        ExplanationsExtractor.configure_db_pool(pool=cls.pool)
+        TuningPlanner.general_db_filter_query = GENERAL_DB_FILTER_QUERY
+        TuningPlanner.drift_outliners_sql_filter_query = OUTLINERS_SQL_FILTER_QUERY
+
+    @classmethod
+    def prepare_drift_log(cls, cnx: sqlite3.Connection):
+        """
+        Called once with a connection to the generated drift log, to change its rows before the tests.
+        """
+
+    @classmethod
+    def tearDownClass(cls):
+        ExplanationsExtractor.close_db_pool()
+        shutil.rmtree(cls.work_dir, ignore_errors=True)
+
+    def setUp(self):
+        ExplanationsExtractor.clear_columnar_drift_logs()
+        ExplanationsExtractor._drift_log_summaries.clear()
+        ExplanationsExtractor.SUMMARY_STORE_PATH = os.path.join(self.work_dir, 'summary.sqlite')
+        if os.path.exists(ExplanationsExtractor.SUMMARY_STORE_PATH):
+            os.remove(ExplanationsExtractor.SUMMARY_STORE_PATH)
+
+    def execute(self, query: str, params=()):
+        """
+        Runs a statement on the drift log outside of the planner, like another writer would.
+        """
+        cnx = sqlite3.connect(self.db_path)
+        try:
+            cnx.execute(query, params)
+            cnx.commit()
+        finally:
+            cnx.close()
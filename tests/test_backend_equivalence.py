@@ -0,0 +1,130 @@
+"""
+Every mining backend and every counterfactual mode must give the same item sets, explanations and plans, on a
+synthetic drift log (Benchmarks/SyntheticDriftLog.py) with NULL attribute values, for several thresholds.
+
+python -m pytest tests
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import unittest
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES, GENERAL_DB_FILTER_QUERY, OUTLINERS_SQL_FILTER_QUERY
+import ExplanationsExtractor
+import TuningPlanner
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+THRESHOLDS = [
+    {'min_occurrences': 0.01, 'min_support': 0.01, 'min_confidence': 0.51, 'min_risk': 1.1, 'max_length': 3},
+    {'min_occurrences': 0.001, 'min_support': 0.001, 'min_confidence': 0.1, 'min_risk': 1.0, 'max_length': 4},
+    {'min_occurrences': 0.02, 'min_support': 0.02, 'min_confidence': 0.6, 'min_risk': 1.3, 'max_length': 2},
+]
+
+# the attribute values replaced by NULL, id_7 is a planted drifting subgroup so NULL ids end up in the item sets.
+NULL_VALUES = {'weather': 'weather_0', 'id': 'id_7'}
+
+
+def export_drift_log_files(db_path: str, files_dir: str):
+    """
+    Writes the rows of the drift log as date partitions (files_dir/date=YYYY-MM-DD/part-0.parquet), the layout
+    DriftLogFiles reads.
+    """
+    columns = ATTRIBUTES + ['signal_1or2', 'counter_drift']
+    schema = pyarrow.schema([(attr, pyarrow.string()) for attr in ATTRIBUTES] +
+                            [('signal_1or2', pyarrow.int64()), ('counter_drift', pyarrow.int64())])
+    cnx = sqlite3.connect(db_path)
+    try:
+        for (date,) in cnx.execute("SELECT DISTINCT date FROM drift_log_flex").fetchall():
+            rows = cnx.execute("SELECT " + ', '.join(columns) + " FROM drift_log_flex WHERE date = ?",
+                               (date,)).fetchall()
+            partition_dir = os.path.join(files_dir, 'date=' + date)
+            os.makedirs(partition_dir)
+            table = pyarrow.table({column: [row[i] for row in rows] for i, column in enumerate(columns)},
+                                  schema=schema)
+            pyarrow.parquet.write_table(table, os.path.join(partition_dir, 'part-0.parquet'))
+    finally:
+        cnx.close()
+
+
+class BackendEquivalenceTest(PlannerTestCase):
+
+    @classmethod
+    def prepare_drift_log(cls, cnx):
+        for attr, value in NULL_VALUES.items():
+            cnx.execute("UPDATE drift_log_flex SET " + attr + " = NULL WHERE " + attr + " = ?", (value,))
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.backends = list(ExplanationsExtractor.MINING_BACKENDS)
+        if pyarrow is None:
+            cls.backends.remove(ExplanationsExtractor.PARQUET_BACKEND)
+        else:
+            files_dir = os.path.join(cls.work_dir, 'drift_log_files')
+            export_drift_log_files(cls.db_path, files_dir)
+            ExplanationsExtractor.DRIFT_LOG_FILES_DIR = files_dir
+
+    @classmethod
+    def tearDownClass(cls):
+        ExplanationsExtractor.DRIFT_LOG_FILES_DIR = None
+        super().tearDownClass()
+
+    def test_frequent_sets(self):
+        item_sets = []
+        for thresholds in THRESHOLDS:
+            args = (ATTRIBUTES, thresholds['min_occurrences'], thresholds['min_support'],
+                    thresholds['min_confidence'], thresholds['min_risk'], OUTLINERS_SQL_FILTER_QUERY,
+                    GENERAL_DB_FILTER_QUERY, thresholds['max_length'], False)
+            expected = ExplanationsExtractor.get_frequent_sets_from_DB(*args,
+                                                                       backend=ExplanationsExtractor.SQL_BACKEND)
+            for backend in self.backends:
+                with self.subTest(backend=backend, thresholds=thresholds):
+                    self.assertEqual(ExplanationsExtractor.get_frequent_sets_from_DB(*args, backend=backend), expected)
+            item_sets.extend(expected)
+
+        # the NULL values must be mined like any other value, also inside the larger item sets.
+        self.assertTrue(any(None in item_set.attributes.values() and
+                            sum(value != '-' for value in item_set.attributes.values()) > 1 for item_set in item_sets))
+
+    def test_explanations(self):
+        for thresholds in THRESHOLDS:
+            expected = ExplanationsExtractor.get_explanations_ordered_list(
+                ATTRIBUTES, outliners_sql_filter_query=OUTLINERS_SQL_FILTER_QUERY,
+                general_db_filter_query=GENERAL_DB_FILTER_QUERY, debug_print=False,
+                backend=ExplanationsExtractor.SQL_BACKEND, **thresholds)
+            self.assertTrue(expected)
+            for backend in self.backends:
+                with self.subTest(backend=backend, thresholds=thresholds):
+                    self.assertEqual(ExplanationsExtractor.get_explanations_ordered_list(
+                        ATTRIBUTES, outliners_sql_filter_query=OUTLINERS_SQL_FILTER_QUERY,
+                        general_db_filter_query=GENERAL_DB_FILTER_QUERY, debug_print=False, backend=backend,
+                        **thresholds), expected)
+
+    def test_tuning_configurations(self):
+        expected = None
+        for backend in self.backends:
+            for counter_factual in TuningPlanner.COUNTER_FACTUAL_MODES:
+                if counter_factual == TuningPlanner.DB_COUNTER_FACTUAL_MODE and backend in (
+                        ExplanationsExtractor.SUMMARY_BACKEND, ExplanationsExtractor.PARQUET_BACKEND):
+                    # the summary and the files don't follow the counter_drift column.
+                    continue
+
+                with self.subTest(backend=backend, counter_factual=counter_factual):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        plan = TuningPlanner.CreateTuningConfigurations(ATTRIBUTES, backend=backend,
+                                                                        counter_factual=counter_factual)
+                    if expected is None:
+                        expected = plan
+                        # the NULL id is planned as an id, not as a NULL weather.
+                        self.assertIn((('id', None),), expected)
+                    self.assertEqual(plan, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+The bitmap indexes saved in BITMAP_INDEX_DIR are loaded back without unpickling, with the same counts.
+"""
+import os
+import unittest
+
+import numpy as np
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES, GENERAL_DB_FILTER_QUERY, OUTLINERS_SQL_FILTER_QUERY
+import ExplanationsExtractor
+from BitmapIndex import BitmapIndex
+
+
+class BitmapIndexTest(PlannerTestCase):
+
+    @classmethod
+    def prepare_drift_log(cls, cnx):
+        cnx.execute("UPDATE drift_log_flex SET weather = NULL WHERE weather = 'weather_0'")
+
+    def setUp(self):
+        super().setUp()
+        ExplanationsExtractor.BITMAP_INDEX_DIR = os.path.join(self.work_dir, 'bitmap_indexes')
+
+    def tearDown(self):
+        ExplanationsExtractor.BITMAP_INDEX_DIR = None
+
+    def test_save_and_load(self):
+        index = ExplanationsExtractor.GetBitmapIndex(ATTRIBUTES, OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY)
+        [file_name] = os.listdir(ExplanationsExtractor.BITMAP_INDEX_DIR)
+        path = os.path.join(ExplanationsExtractor.BITMAP_INDEX_DIR, file_name)
+        # every array of the file loads without pickle.
+        with np.load(path, allow_pickle=False) as arrays:
+            for name in arrays.files:
+                arrays[name]
+
+        ExplanationsExtractor.clear_columnar_drift_logs()
+        loaded = ExplanationsExtractor.GetBitmapIndex(ATTRIBUTES, OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY)
+        self.assertIsNot(loaded, index)
+        self.assertEqual(loaded.dictionaries, index.dictionaries)
+        explanations = [[]] + [[(attr, value)] for attr in ATTRIBUTES for value in index.dictionaries[attr]] + [
+            [('weather', None), ('model_type', 'model_type_1')], [('location', 'location_3'), ('id', 'id_7')]]
+        self.assertEqual(loaded.count_explanations(explanations), index.count_explanations(explanations))
+
+    def test_not_json_values(self):
+        drift_log = ExplanationsExtractor.GetColumnarDriftLog(ATTRIBUTES, OUTLINERS_SQL_FILTER_QUERY,
+                                                              GENERAL_DB_FILTER_QUERY)
+        index = BitmapIndex.from_drift_log(drift_log)
+        index.dictionaries = dict(index.dictionaries, weather=[object()] + list(index.dictionaries['weather'][1:]))
+        path = os.path.join(self.work_dir, 'not_json.npz')
+        with self.assertRaises(TypeError):
+            index.save(path)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
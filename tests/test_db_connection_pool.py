@@ -0,0 +1,132 @@
+"""
+The shared pool of ExplanationsExtractor: connections are reused, and only pinged after being idle or lost.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'TuningPlanner'))
+
+from mysql.connector import errors
+import ExplanationsExtractor
+from DBConnectionPool import DBConnectionPool
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+
+    def execute(self, query: str, params=None):
+        if self.connection.fail_next_query:
+            self.connection.fail_next_query = False
+            raise errors.OperationalError("Lost connection to MySQL server during query")
+        self.connection.queries.append(query)
+        self.description = [('count',)]
+
+    def fetchone(self):
+        return 1,
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.pings = 0
+        self.queries = []
+        self.events = []
+        self.closed = False
+        self.fail_next_query = False
+
+    def ping(self, reconnect: bool = False, attempts: int = 1, delay: int = 0):
+        self.pings += 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        self.events.append('start_transaction')
+
+    def commit(self):
+        self.events.append('commit')
+
+    def rollback(self):
+        self.events.append('rollback')
+
+    def close(self):
+        self.closed = True
+
+
+class DBConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connections = []
+
+    def connect(self) -> FakeConnection:
+        self.connections.append(FakeConnection())
+        return self.connections[-1]
+
+    def test_reuses_connections_without_pinging(self):
+        pool = DBConnectionPool(2, ping_idle_seconds=60, connect=self.connect)
+        for _ in range(5):
+            pool.get_connection().close()
+
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(self.connections[0].pings, 0)
+
+    def test_pings_idle_connections(self):
+        pool = DBConnectionPool(2, ping_idle_seconds=0, connect=self.connect)
+        pool.get_connection().close()
+        pool.get_connection().close()
+
+        self.assertEqual(self.connections[0].pings, 1)
+
+    def test_keeps_pool_size_idle_connections(self):
+        pool = DBConnectionPool(2, ping_idle_seconds=60, connect=self.connect)
+        borrowed = [pool.get_connection() for _ in range(3)]
+        for cnx in borrowed:
+            cnx.close()
+
+        self.assertEqual([cnx.closed for cnx in self.connections], [False, False, True])
+        pool.close()
+        self.assertTrue(all(cnx.closed for cnx in self.connections))
+
+
+class DBConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        ExplanationsExtractor.configure_db_pool(pool=DBConnectionPool(1, ping_idle_seconds=60,
+                                                                      connect=lambda: self.connection))
+
+    def tearDown(self):
+        ExplanationsExtractor.close_db_pool()
+
+    def test_pings_lost_connections(self):
+        ExplanationsExtractor.run_query("SELECT 1")
+        self.connection.fail_next_query = True
+        with self.assertRaises(errors.OperationalError):
+            ExplanationsExtractor.run_query("SELECT 2")
+        self.assertEqual(self.connection.pings, 0)
+
+        ExplanationsExtractor.run_query("SELECT 3")
+        self.assertEqual(self.connection.pings, 1)
+        self.assertEqual(self.connection.queries, ["SELECT 1", "SELECT 3"])
+
+    def test_transactions_are_explicit(self):
+        ExplanationsExtractor.run_transaction([("UPDATE t SET a = 1", None), ("SELECT 1", None)])
+        self.connection.fail_next_query = True
+        with self.assertRaises(errors.OperationalError):
+            ExplanationsExtractor.run_transaction([("UPDATE t SET a = 2", None)])
+
+        self.assertEqual(self.connection.events, ['start_transaction', 'commit', 'start_transaction', 'rollback'])
+
+
+if __name__ == '__main__':
+    unittest.main()
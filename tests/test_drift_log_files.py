@@ -0,0 +1,29 @@
+"""
+PARQUET_BACKEND reads the exports of DRIFT_LOG_FILES_DIR, which the planner never writes the counterfactual drift to.
+"""
+import unittest
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES, GENERAL_DB_FILTER_QUERY, OUTLINERS_SQL_FILTER_QUERY, \
+    THRESHOLDS
+import ExplanationsExtractor
+import TuningPlanner
+
+
+class DriftLogFilesTest(PlannerTestCase):
+
+    def test_files_dir_not_set(self):
+        self.assertIsNone(ExplanationsExtractor.DRIFT_LOG_FILES_DIR)
+        with self.assertRaises(ValueError):
+            ExplanationsExtractor.get_frequent_sets_from_DB(
+                ATTRIBUTES, THRESHOLDS['min_occurrences'], THRESHOLDS['min_support'], THRESHOLDS['min_confidence'],
+                THRESHOLDS['min_risk'], OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY, THRESHOLDS['max_length'],
+                False, backend=ExplanationsExtractor.PARQUET_BACKEND)
+
+    def test_counter_factual_drift(self):
+        with self.assertRaises(ValueError):
+            TuningPlanner.CreateTuningConfigurations(ATTRIBUTES, backend=ExplanationsExtractor.PARQUET_BACKEND,
+                                                     counter_factual=TuningPlanner.DB_COUNTER_FACTUAL_MODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
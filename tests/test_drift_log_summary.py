@@ -0,0 +1,52 @@
+"""
+SUMMARY_BACKEND re-reads only the dates from the high-water mark on, and mines the same item sets as the SQL backend.
+"""
+import unittest
+from unittest import mock
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES, OUTLINERS_SQL_FILTER_QUERY, THRESHOLDS
+import ExplanationsExtractor
+import TuningPlanner
+
+GENERAL_DB_FILTER_QUERY = "date >= '2020-01-20' "
+
+
+class DriftLogSummaryTest(PlannerTestCase):
+
+    def frequent_sets(self, backend: str):
+        return ExplanationsExtractor.get_frequent_sets_from_DB(
+            ATTRIBUTES, THRESHOLDS['min_occurrences'], THRESHOLDS['min_support'], THRESHOLDS['min_confidence'],
+            THRESHOLDS['min_risk'], OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY, THRESHOLDS['max_length'],
+            False, backend=backend)
+
+    def test_appended_rows(self):
+        self.assertEqual(self.frequent_sets(ExplanationsExtractor.SUMMARY_BACKEND),
+                         self.frequent_sets(ExplanationsExtractor.SQL_BACKEND))
+
+        # rows appended to the last summarized date and to a new one, with a new drifting value.
+        for date in ['2020-02-09', '2020-02-10']:
+            self.execute("INSERT INTO drift_log_flex SELECT weather, location, id, 'model_type_9', 1, 1, ? "
+                         "FROM drift_log_flex WHERE date = '2020-01-25'", (date,))
+
+        with mock.patch.object(ExplanationsExtractor, 'execute_statement',
+                               wraps=ExplanationsExtractor.execute_statement) as execute_statement:
+            item_sets = self.frequent_sets(ExplanationsExtractor.SUMMARY_BACKEND)
+        groups_query, groups_params = [call.args[1:3] for call in execute_statement.call_args_list
+                                       if 'COUNT(*), date' in call.args[1]][0]
+        # only the dates from the high-water mark on are re-read, and they are bound.
+        self.assertEqual(sorted(groups_params), ['2020-02-09', '2020-02-10'])
+        self.assertNotIn('2020-02-09', groups_query)
+
+        self.assertEqual(item_sets, self.frequent_sets(ExplanationsExtractor.SQL_BACKEND))
+        self.assertIn(('model_type_9',), ExplanationsExtractor.item_sets_to_explanations(item_sets))
+
+    def test_counter_factual_drift(self):
+        with self.assertRaises(ValueError):
+            ExplanationsExtractor.GetUpdatedDriftLogSummary(ATTRIBUTES, "counter_drift = 1")
+        with self.assertRaises(ValueError):
+            TuningPlanner.CreateTuningConfigurations(ATTRIBUTES, backend=ExplanationsExtractor.SUMMARY_BACKEND,
+                                                     counter_factual=TuningPlanner.DB_COUNTER_FACTUAL_MODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
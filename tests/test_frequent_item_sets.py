@@ -0,0 +1,40 @@
+"""
+FrequentItemSets indexes and slices like the list of FrequentItemSet it replaces.
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'TuningPlanner'))
+
+from FrequentItemSetDataClass import FrequentItemSets
+
+RECORDS = [
+    (('weather',), ('weather_1',), 1.2, 0.1, 0.05, 0.6, True),
+    (('weather', 'id'), ('weather_1', None), 1.5, 0.02, 0.01, 0.7, True),
+    (('location',), ('location_3',), 2.0, 0.2, 0.1, 0.8, False),
+    (('id', 'location'), ('id_7', 'location_3'), 3.0, 0.01, 0.01, 0.9, True),
+]
+
+
+class FrequentItemSetsTest(unittest.TestCase):
+
+    def test_indexing_and_slicing(self):
+        item_sets = FrequentItemSets.from_records(['weather', 'location', 'id'], RECORDS)
+        as_list = item_sets.to_list()
+
+        self.assertEqual(item_sets[-1], as_list[-1])
+        for i in [slice(1, 3), slice(None, None, -1), slice(None, None, 2), slice(10, None), slice(-2, None)]:
+            with self.subTest(i=i):
+                sliced = item_sets[i]
+                self.assertIsInstance(sliced, FrequentItemSets)
+                self.assertEqual(sliced, as_list[i])
+                self.assertEqual(sliced.explanations(), [tuple(val for val in item_set.attributes.values()
+                                                               if val != '-') for item_set in reversed(as_list[i])])
+
+        with self.assertRaises(IndexError):
+            item_sets[len(RECORDS)]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+The grouped counts of the SQL backend bind the candidate values, whatever characters they contain.
+"""
+import unittest
+from unittest import mock
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES, GENERAL_DB_FILTER_QUERY, OUTLINERS_SQL_FILTER_QUERY, \
+    THRESHOLDS
+import ExplanationsExtractor
+
+# location_3 drifts, so its renamed value ends up in the candidates of the next levels.
+QUOTED_LOCATION = "location_3 'quoted' \\"
+
+
+class GroupedCountsTest(PlannerTestCase):
+
+    @classmethod
+    def prepare_drift_log(cls, cnx):
+        cnx.execute("UPDATE drift_log_flex SET location = ? WHERE location = 'location_3'", (QUOTED_LOCATION,))
+        cnx.execute("UPDATE drift_log_flex SET weather = NULL WHERE weather = 'weather_0'")
+
+    def test_candidate_values(self):
+        candidate_values = [(QUOTED_LOCATION, 'model_type_1'), (None, 'model_type_2'), ('location_1', 'model_type_2')]
+        with mock.patch.object(ExplanationsExtractor, 'execute_statement',
+                               wraps=ExplanationsExtractor.execute_statement) as execute_statement:
+            groups = ExplanationsExtractor.GetOutLinersAndInLinersCountGroupedByProvidedAttributes(
+                ['location', 'model_type'], OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY, candidate_values)
+        # the values are bound, never part of the query.
+        self.assertNotIn('quoted', execute_statement.call_args.args[1])
+        self.assertIn(QUOTED_LOCATION, execute_statement.call_args.args[2])
+
+        drift_log = ExplanationsExtractor.GetColumnarDriftLog(['location', 'model_type'], OUTLINERS_SQL_FILTER_QUERY,
+                                                              GENERAL_DB_FILTER_QUERY)
+
+        key = ExplanationsExtractor.group_values_sort_key
+        self.assertEqual(sorted(groups, key=key), sorted(drift_log.count_groups(['location', 'model_type'],
+                                                                                candidate_values), key=key))
+        self.assertIn(QUOTED_LOCATION, [group[2] for group in groups])
+
+    def test_frequent_sets(self):
+        args = (ATTRIBUTES, THRESHOLDS['min_occurrences'], THRESHOLDS['min_support'], THRESHOLDS['min_confidence'],
+                THRESHOLDS['min_risk'], OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY, THRESHOLDS['max_length'],
+                False)
+        item_sets = ExplanationsExtractor.get_frequent_sets_from_DB(*args, backend=ExplanationsExtractor.SQL_BACKEND)
+
+        self.assertEqual(item_sets, ExplanationsExtractor.get_frequent_sets_from_DB(
+            *args, backend=ExplanationsExtractor.NUMPY_BACKEND))
+        self.assertTrue(any(item_set.attributes['location'] == QUOTED_LOCATION and
+                            sum(value != '-' for value in item_set.attributes.values()) > 1 for item_set in item_sets))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+get_explanations_ordered_list(use_cache=True) never returns, nor caches, the mining of rows another writer changed.
+"""
+import unittest
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES, GENERAL_DB_FILTER_QUERY, OUTLINERS_SQL_FILTER_QUERY, \
+    THRESHOLDS
+import ExplanationsExtractor
+from MiningCache import MiningCache
+
+
+class MiningCacheTest(PlannerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ExplanationsExtractor._mining_cache = MiningCache(cache_dir=None)
+
+    def tearDown(self):
+        ExplanationsExtractor._mining_cache = None
+
+    def explanations(self, backend: str, use_cache: bool = True):
+        return ExplanationsExtractor.get_explanations_ordered_list(
+            ATTRIBUTES, outliners_sql_filter_query=OUTLINERS_SQL_FILTER_QUERY,
+            general_db_filter_query=GENERAL_DB_FILTER_QUERY, debug_print=False, backend=backend, use_cache=use_cache,
+            **THRESHOLDS)
+
+    def test_external_writes(self):
+        # the in-memory copies of these backends are loaded by the first call, and kept.
+        backends = [ExplanationsExtractor.NUMPY_BACKEND, ExplanationsExtractor.CUBE_BACKEND,
+                    ExplanationsExtractor.BITMAP_BACKEND]
+        for backend in backends:
+            self.explanations(backend)
+
+        for i, backend in enumerate(backends):
+            with self.subTest(backend=backend):
+                # a new drifting value, written behind the planner's back.
+                model_type = 'model_type_' + str(9 + i)
+                self.execute("INSERT INTO drift_log_flex SELECT weather, location, id, ?, 1, 1, date "
+                             "FROM drift_log_flex WHERE date = '2020-01-25'", (model_type,))
+
+                explanations = self.explanations(backend)
+                self.assertIn((model_type,), explanations)
+                self.assertEqual(explanations, self.explanations(ExplanationsExtractor.SQL_BACKEND, use_cache=False))
+                # and what was cached is the fresh result, for this backend and the SQL one.
+                self.assertEqual(self.explanations(backend), explanations)
+                self.assertEqual(self.explanations(ExplanationsExtractor.SQL_BACKEND), explanations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+The NULL values of different attributes are different explanations: zeroing the rows of a NULL id doesn't touch the
+rows of a NULL weather, in every counterfactual mode.
+"""
+import unittest
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES
+import ExplanationsExtractor
+import TuningPlanner
+
+NULL_ID = (('id', None),)
+NULL_WEATHER = (('weather', None),)
+
+
+class NullExplanationsTest(PlannerTestCase):
+
+    @classmethod
+    def prepare_drift_log(cls, cnx):
+        cnx.execute("UPDATE drift_log_flex SET weather = NULL WHERE weather = 'weather_0'")
+        cnx.execute("UPDATE drift_log_flex SET id = NULL WHERE id = 'id_7'")
+
+    def test_counter_drift_to_zero(self):
+        TuningPlanner.diff_attributes = ATTRIBUTES
+        TuningPlanner.mining_backend = ExplanationsExtractor.SQL_BACKEND
+        for counter_factual in TuningPlanner.COUNTER_FACTUAL_MODES:
+            with self.subTest(counter_factual=counter_factual):
+                TuningPlanner.counter_factual_mode = counter_factual
+                TuningPlanner.reset_counter_factual_state()
+                explanations = [list(NULL_ID), list(NULL_WEATHER), list(NULL_WEATHER + NULL_ID)]
+                id_counts, weather_counts, both_counts = TuningPlanner.count_explanations(explanations)
+                self.assertGreater(id_counts[0], 0)
+
+                TuningPlanner.set_explanation_counter_drift_to_zero(NULL_ID)
+                id_counts_after, weather_counts_after, _ = TuningPlanner.count_explanations(explanations)
+                self.assertEqual(id_counts_after, (0, id_counts[2], id_counts[2]))
+                # only the NULL weather rows that also have a NULL id lose their outliners.
+                self.assertEqual(weather_counts_after[0], weather_counts[0] - both_counts[0])
+                self.assertEqual(weather_counts_after[2], weather_counts[2])
+
+    def test_tuning_configurations(self):
+        plan = TuningPlanner.CreateTuningConfigurations(ATTRIBUTES, backend=ExplanationsExtractor.SQL_BACKEND,
+                                                        counter_factual=TuningPlanner.IN_MEMORY_COUNTER_FACTUAL_MODE)
+        # id_7 is a planted drifting subgroup, its NULL stays an id.
+        self.assertIn(NULL_ID, plan)
+        self.assertEqual(plan[NULL_ID], {'subgroups': [NULL_ID]})
+
+
+if __name__ == '__main__':
+    unittest.main()
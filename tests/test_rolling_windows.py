@@ -0,0 +1,57 @@
+"""
+RollingTuningConfigurations plans every window like CreateTuningConfigurations over the window's dates, and gives
+back the planner's modes afterwards.
+"""
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES
+import ExplanationsExtractor
+import TuningPlanner
+
+WINDOWS = [('2020-01-05', '2020-01-20'), ('2020-01-15', '2020-01-30')]
+
+
+class RollingWindowsTest(PlannerTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.general_db_filter_query = TuningPlanner.general_db_filter_query
+
+    def setUp(self):
+        super().setUp()
+        TuningPlanner.mining_backend = ExplanationsExtractor.SQL_BACKEND
+        TuningPlanner.counter_factual_mode = TuningPlanner.DB_COUNTER_FACTUAL_MODE
+
+    def tearDown(self):
+        TuningPlanner.general_db_filter_query = self.general_db_filter_query
+
+    def test_windows(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            rolling = TuningPlanner.RollingTuningConfigurations(ATTRIBUTES, WINDOWS)
+        self.assertEqual(TuningPlanner.mining_backend, ExplanationsExtractor.SQL_BACKEND)
+        self.assertEqual(TuningPlanner.counter_factual_mode, TuningPlanner.DB_COUNTER_FACTUAL_MODE)
+
+        for (first_date, last_date), window in zip(WINDOWS, rolling):
+            with self.subTest(window=window['window']):
+                TuningPlanner.general_db_filter_query = f"date >= '{first_date}' AND date <= '{last_date}' "
+                with contextlib.redirect_stdout(io.StringIO()):
+                    plan = TuningPlanner.CreateTuningConfigurations(ATTRIBUTES)
+                self.assertGreater(len(plan), 1)
+                self.assertEqual(window['plan'], plan)
+
+    def test_failed_window(self):
+        with mock.patch.object(TuningPlanner, 'get_explanations_aux', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), contextlib.redirect_stdout(io.StringIO()):
+                TuningPlanner.RollingTuningConfigurations(ATTRIBUTES, WINDOWS)
+
+        self.assertEqual(TuningPlanner.mining_backend, ExplanationsExtractor.SQL_BACKEND)
+        self.assertEqual(TuningPlanner.counter_factual_mode, TuningPlanner.DB_COUNTER_FACTUAL_MODE)
+        self.assertIsNone(TuningPlanner.window_drift_log)
+
+
+if __name__ == '__main__':
+    unittest.main()
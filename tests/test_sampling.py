@@ -0,0 +1,71 @@
+"""
+The approximate mode of get_frequent_sets_from_DB (sample_error) sizes its sample from the DriftLogSummary of the
+dates, and its estimated ratios stay within sample_error of the exact ones.
+"""
+import random
+import unittest
+from unittest import mock
+
+from planner_test_case import PlannerTestCase, ATTRIBUTES, GENERAL_DB_FILTER_QUERY, OUTLINERS_SQL_FILTER_QUERY, \
+    THRESHOLDS
+import ExplanationsExtractor
+
+SAMPLE_ERROR = 0.02
+
+
+class SamplingTest(PlannerTestCase):
+
+    def frequent_sets(self, **kwargs):
+        return ExplanationsExtractor.get_frequent_sets_from_DB(
+            ATTRIBUTES, THRESHOLDS['min_occurrences'], THRESHOLDS['min_support'], THRESHOLDS['min_confidence'],
+            THRESHOLDS['min_risk'], OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY, THRESHOLDS['max_length'],
+            False, **kwargs)
+
+    def test_strata_counts(self):
+        self.assertEqual(ExplanationsExtractor.GetSummaryStrataCounts(OUTLINERS_SQL_FILTER_QUERY,
+                                                                      GENERAL_DB_FILTER_QUERY),
+                         ExplanationsExtractor.GetStrataCounts(OUTLINERS_SQL_FILTER_QUERY, GENERAL_DB_FILTER_QUERY))
+
+        self.execute("INSERT INTO drift_log_flex SELECT weather, location, id, model_type, signal_1or2, counter_drift, "
+                     "'2020-02-20' FROM drift_log_flex WHERE date = '2020-01-25'")
+        with mock.patch.object(ExplanationsExtractor, 'GetDriftLogSummaryGroups',
+                               wraps=ExplanationsExtractor.GetDriftLogSummaryGroups) as get_groups:
+            strata_counts = ExplanationsExtractor.GetSummaryStrataCounts(OUTLINERS_SQL_FILTER_QUERY, "1 = 1")
+        # only the dates from the high-water mark on are read again.
+        self.assertEqual(get_groups.call_args.args[2], ['2020-02-09', '2020-02-20'])
+        self.assertEqual(strata_counts, ExplanationsExtractor.GetStrataCounts(OUTLINERS_SQL_FILTER_QUERY,
+                                                                              "date IS NOT NULL"))
+
+    def test_sample_bounds(self):
+        random.seed(0)
+        exact = {tuple(item_set.attributes.items()): item_set for item_set in self.frequent_sets()}
+        with mock.patch.object(ExplanationsExtractor, 'run_query',
+                               wraps=ExplanationsExtractor.run_query) as run_query:
+            item_sets = self.frequent_sets(sample_error=SAMPLE_ERROR, sample_confidence=0.99)
+        queries = [call.args[0] for call in run_query.call_args_list]
+        # no count of the strata in the DB, and a single pass for the sample.
+        self.assertFalse([query for query in queries if query.startswith("SELECT COUNT(*), COUNT(CASE WHEN")])
+        self.assertEqual(len([query for query in queries if 'RAND()' in query]), 1)
+
+        self.assertTrue(any(not item_set.verified for item_set in item_sets))
+        for item_set in item_sets:
+            with self.subTest(attributes=item_set.attributes):
+                exact_item_set = exact[tuple(item_set.attributes.items())]
+                if item_set.verified:
+                    self.assertEqual(item_set, exact_item_set)
+                else:
+                    self.assertAlmostEqual(item_set.support_ratio, exact_item_set.support_ratio, delta=SAMPLE_ERROR)
+
+    def test_counter_drift_outliners(self):
+        # the summary can't follow counter_drift, the strata are counted in the DB.
+        with mock.patch.object(ExplanationsExtractor, 'GetStrataCounts',
+                               wraps=ExplanationsExtractor.GetStrataCounts) as get_strata_counts:
+            ExplanationsExtractor.get_frequent_sets_from_DB(
+                ATTRIBUTES, THRESHOLDS['min_occurrences'], THRESHOLDS['min_support'], THRESHOLDS['min_confidence'],
+                THRESHOLDS['min_risk'], "counter_drift = 1", GENERAL_DB_FILTER_QUERY, THRESHOLDS['max_length'],
+                False, sample_error=SAMPLE_ERROR)
+        get_strata_counts.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()